@@ -2,7 +2,34 @@ import streamlit as st
 import pandas as pd
 import os
 import folium
-from streamlit_folium import st_folium
+from streamlit_folium import generate_leaflet_string, st_folium
+from nucleo.banco import FonteBanco, criar_motor
+from nucleo.busca import opcoes_filtro
+from nucleo.camadas import RecursosAgrupamento
+from nucleo.config import (
+    FONTE_DADOS, LOG_DESEMPENHO, MAPA_TILES, MAPA_VIEWPORT, MARGEM_VIEWPORT, PAINEL_DESEMPENHO, URL_BANCO
+)
+from nucleo.consulta_duckdb import FonteDuckDB
+from nucleo.desempenho import Medicoes, configurar_log, medicoes_do_fragmento
+from nucleo.espacial import chave_poligono_da_barragem, filtro_area, filtro_poligono, filtro_raio
+from nucleo.cores import COLUNAS_SITUACAO, mapa_css_tabela
+from nucleo.exportacao import FORMATOS, CacheExportacoes
+from nucleo.filtros import chave_filtros, contagem_da_opcao, intervalo_ativo, selecoes_ativas
+from nucleo.fontes import abrir_fonte_arquivo
+from nucleo.mapa import (
+    ZOOM_INICIAL, adicionar_poligonos, adicionar_pontos, adicionar_tiles, centro_pontos, colunas_mapa, conteudo_tiles,
+    grupo_area, grupos_camadas, mapa_base, pontos_mapa
+)
+from nucleo.poligonos import COLUNA_CHAVE, SEM_POLIGONO
+from nucleo.snapshot import AtualizadorSnapshot
+from nucleo.tabela import limites_pagina, pagina_estilizada, paginas_visiveis, total_paginas
+from nucleo.tiles import ServidorTiles, token_tiles
+from nucleo.viewport import caixa_de_limites, caixa_estimada, expandir_caixa
+
+# Medição das etapas deste rerun (registrada no log e no painel de desempenho)
+if LOG_DESEMPENHO:
+    configurar_log()
+medicoes = Medicoes(fonte=FONTE_DADOS)
 
 # Configuração da página
 logo_icon_path = os.path.join(os.path.dirname(__file__), "image", "app", "Logo.png")
@@ -17,37 +44,455 @@ st.set_page_config(
 st.markdown("<h1 style='text-align: center;'>Ferramenta de Comparação de Registros - SNISB vs SIOUT-RS</h1>", unsafe_allow_html=True)
 st.markdown("---")
 
-# Função para carregar os dados com cache
-@st.cache_data
-def carregar_dados():
-    """Carrega o arquivo de dados (CSV ou Excel) e retorna um DataFrame"""
+# Atualização do snapshot em segundo plano quando a origem muda (um por processo).
+# As sessões seguem na versão anterior até a nova ficar pronta; a troca é atômica.
+@st.cache_resource
+def obter_atualizador():
+    """Cria o atualizador do snapshot compartilhado entre sessões"""
+    return AtualizadorSnapshot()
+
+# Os recursos abaixo são por versão dos dados; mantêm a atual e a anterior (sessões em
+# andamento durante a troca) e liberam as mais antigas.
+
+# Dados do snapshot (DataFrame, polígonos ANA, índices dos filtros e espacial, cache de resultados):
+# carregados uma vez por processo e compartilhados entre as sessões, sem cópia por usuário
+@st.cache_resource(max_entries=2)
+def obter_fonte_arquivo(versao):
+    """Abre a fonte sobre a versão do snapshot (conversões feitas na carga, arrays somente leitura)"""
+    return abrir_fonte_arquivo(versao)
+
+# Arquivos exportados por estado de filtros e formato, compartilhados entre sessões
+@st.cache_resource(max_entries=2)
+def obter_cache_exportacoes(versao):
+    """Cria o cache de arquivos exportados para a versão dos dados"""
+    return CacheExportacoes()
+
+# Banco de dados: engine com pool de conexões, um por processo (compartilhado entre sessões)
+@st.cache_resource
+def obter_fonte_banco(url):
+    """Cria a fonte de dados consultada no banco (PostgreSQL/PostGIS ou SQLite)"""
+    return FonteBanco(criar_motor(url))
+
+# DuckDB sobre o snapshot: um motor por versão dos dados (compartilhado entre sessões)
+@st.cache_resource(max_entries=2)
+def obter_fonte_duckdb(versao):
+    """Abre a fonte DuckDB sobre a tabela Arrow do snapshot (None se não há dados)"""
+    if versao is None:
+        return None
+    return FonteDuckDB(versao=versao)
+
+# Cores das células de situação: uma entrada por valor distinto, calculada na carga
+@st.cache_resource(max_entries=2)
+def obter_css_tabela(versao, _fonte):
+    """Mapeia cada valor das colunas de situação para o estilo CSS da célula"""
+    return mapa_css_tabela({c: _fonte.opcoes(c) for c in COLUNAS_SITUACAO if c in _fonte.colunas})
+
+# Servidor local dos tiles vetoriais do mapa (um por processo, compartilhado entre sessões)
+@st.cache_resource
+def obter_servidor_tiles():
+    """Sobe o servidor HTTP dos tiles MVT (None se a porta não está disponível)"""
     try:
-        # Tentar carregar CSV primeiro (sem limite de caracteres)
-        csv_path = os.path.join(os.path.dirname(__file__), "RELATORIO_FINAL_SNISB_SIOUT.csv")
-        xlsx_path = os.path.join(os.path.dirname(__file__), "RELATORIO_FINAL_SNISB_SIOUT.xlsx")
-        
-        # Configurar pandas para não truncar strings longas
-        pd.set_option('display.max_colwidth', None)
-        
-        if os.path.exists(csv_path):
-            # Carregar CSV (preferencial - sem limite de 32.767 caracteres)
-            df = pd.read_csv(csv_path, dtype={'POLIGONO_ANA': str}, encoding='utf-8-sig')
-            return df
-        elif os.path.exists(xlsx_path):
-            # Fallback para Excel (pode ter polígonos truncados)
-            df = pd.read_excel(xlsx_path, dtype={'POLIGONO_ANA': str})
-            return df
+        return ServidorTiles().iniciar()
+    except OSError:
+        return None
+
+# Configuração das colunas da tabela (igual para todas as páginas)
+@st.cache_data
+def configuracao_colunas(colunas):
+    """Largura padrão das colunas exibidas na tabela"""
+    return {col: st.column_config.TextColumn(width="medium") for col in colunas}
+
+# Chave do widget de cada filtro de múltipla escolha
+CHAVES_FILTROS = {
+    'CODIGO_SNISB': 'filtro_codigo_snisb',
+    'SITUACAO_CADASTRO_SNISB': 'filtro_cadastro_snisb',
+    'SITUACAO_MASSA_DAGUA': 'filtro_massa_dagua',
+    'SITUACAO_COMPARACAO_SIOUT': 'filtro_comparacao_siout',
+    'USO_SNISB': 'filtro_uso_snisb',
+    'TIPO_DE_MATERIAL': 'filtro_tipo_material',
+    'EMPREENDEDOR_SNISB': 'filtro_empreendedor_snisb',
+}
+
+def filtros_espaciais(fonte):
+    """Filtros espaciais a partir dos widgets na sessão: (filtros, nomes dos ativos)"""
+    estado = st.session_state
+    espaciais, nomes = [], []
+    if estado.get('raio_latitude') is not None and estado.get('raio_longitude') is not None and estado.get('raio_km', 0.0) > 0:
+        espaciais.append(filtro_raio(estado['raio_latitude'], estado['raio_longitude'], estado['raio_km']))
+        nomes.append('RAIO')
+    if estado.get('codigo_referencia_poligono') is not None:
+        # Polígono ANA da barragem de referência (sem polígono válido, nenhuma barragem atende)
+        chave_referencia = chave_poligono_da_barragem(fonte, estado['codigo_referencia_poligono'])
+        espaciais.append(filtro_poligono(chave_referencia, estado.get('distancia_poligono_km', 10.0)))
+        nomes.append('POLIGONO')
+    if estado.get('filtro_area'):
+        espaciais.append(estado['filtro_area'])
+        nomes.append('AREA')
+    return espaciais, nomes
+
+def ir_para_pagina(pagina):
+    """Troca a página da tabela (callback dos botões de paginação)"""
+    st.session_state.pagina_atual = pagina
+
+# A tabela é um fragmento: trocar de página reexecuta só ela (a página é lida pelas posições
+# já filtradas), sem refazer filtros, mapa e exportações
+@st.fragment
+def tabela_paginada(resultado, css_tabela):
+    """Página atual dos registros filtrados, com os botões de paginação"""
+    with medicoes_do_fragmento(medicoes, 'tabela', LOG_DESEMPENHO) as medicoes_tabela:
+        total_filtrado = len(resultado)
+        
+        # Sistema de paginação (a página atual volta ao limite quando os filtros reduzem o total)
+        numero_paginas = total_paginas(total_filtrado)
+        st.session_state.pagina_atual = min(st.session_state.get('pagina_atual', 1), numero_paginas)
+        inicio, fim = limites_pagina(st.session_state.pagina_atual, total_filtrado)
+        
+        # Mostrar informação da paginação
+        st.markdown(f"<p style='text-align: center;'><small>Exibindo registros {inicio + 1} a {fim} de {total_filtrado:,}</small></p>", unsafe_allow_html=True)
+        
+        with medicoes_tabela.etapa('tabela', linhas=fim - inicio):
+            # Só a página atual é lida e estilizada (cores pré-calculadas por valor)
+            df_pagina, pagina_tabela = pagina_estilizada(resultado, inicio, fim, css_tabela)
+            st.dataframe(
+                pagina_tabela,
+                width='stretch',
+                height=600,
+                column_config=configuracao_colunas(tuple(df_pagina.columns))
+            )
+        
+        # Controles de paginação abaixo da tabela (próximo ao dataset)
+        botoes_paginas = paginas_visiveis(st.session_state.pagina_atual, numero_paginas)
+        
+        # Estilo CSS para os botões de paginação
+        st.markdown("""
+        <style>
+        /* Botões de paginação - Secondary */
+        div[data-testid="column"] button[kind="secondary"] {
+            background-color: #f8f9fa !important;
+            color: #495057 !important;
+            border: 1px solid #dee2e6 !important;
+            padding: 0.25rem 0.5rem !important;
+            font-size: 0.875rem !important;
+            height: 2rem !important;
+        }
+        
+        /* Botões de paginação - Primary (página selecionada) */
+        button[kind="primary"], div[data-testid="column"] button[kind="primary"] {
+            background-color: #cfe2ff !important;
+            color: #084298 !important;
+            border: 1px solid #9ec5fe !important;
+            padding: 0.25rem 0.5rem !important;
+            font-size: 0.875rem !important;
+            font-weight: 600 !important;
+            height: 2rem !important;
+        }
+        
+        button[kind="primary"]:hover {
+            background-color: #b6d4fe !important;
+            color: #052c65 !important;
+        }
+        
+        .stButton button[kind="primary"] p {
+            color: #084298 !important;
+        }
+        </style>
+        """, unsafe_allow_html=True)
+        
+        # Criar colunas centralizadas para os botões de paginação
+        total_botoes = len(botoes_paginas) + 2  # +2 para botões anterior/próximo
+        espaco_lateral = (10 - total_botoes) / 2 if total_botoes < 10 else 0.5
+        
+        colunas_layout = [espaco_lateral] + [0.5] + [0.8] * len(botoes_paginas) + [0.5] + [espaco_lateral]
+        colunas = st.columns(colunas_layout)
+        
+        col_offset = 1  # Começar após o espaço lateral
+        
+        # Botão Anterior
+        with colunas[col_offset]:
+            st.button("◀", key="prev", disabled=(st.session_state.pagina_atual == 1), use_container_width=True,
+                      on_click=ir_para_pagina, args=(st.session_state.pagina_atual - 1,))
+        
+        # Botões de número de página
+        for idx, pagina in enumerate(botoes_paginas, start=1):
+            with colunas[col_offset + idx]:
+                if pagina == '...':
+                    st.markdown("<p style='text-align: center; margin-top: 0.25rem;'>...</p>", unsafe_allow_html=True)
+                else:
+                    st.button(
+                        str(pagina),
+                        key=f"page_{pagina}",
+                        type="primary" if pagina == st.session_state.pagina_atual else "secondary",
+                        use_container_width=True,
+                        on_click=ir_para_pagina,
+                        args=(pagina,)
+                    )
+        
+        # Botão Próximo
+        with colunas[col_offset + len(botoes_paginas) + 1]:
+            st.button("▶", key="next", disabled=(st.session_state.pagina_atual == numero_paginas), use_container_width=True,
+                      on_click=ir_para_pagina, args=(st.session_state.pagina_atual + 1,))
+
+# As exportações são um fragmento: gerar um formato reexecuta só o popover, sem refazer
+# filtros, tabela e mapa
+@st.fragment
+def exportacao(resultado, chave_exportacao, tem_filtros, cache_exportacoes, poligonos):
+    """Botão de download dos registros filtrados nos formatos de FORMATOS"""
+    with medicoes_do_fragmento(medicoes, 'exportacao', LOG_DESEMPENHO) as medicoes_exportacao:
+        col1, col2, col3 = st.columns([1, 1, 1])
+        
+        with col2:
+            # Texto do botão
+            texto_botao = "Baixar Dados Filtrados" if tem_filtros else "Baixar Todos os Dados"
+        
+            # Usar popover para mostrar opções de formato
+            with st.popover(texto_botao, use_container_width=True):
+                st.markdown("**Escolha o formato do arquivo:**")
+        
+                timestamp = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
+                prefixo = "dados_filtrados" if tem_filtros else "dados_completos"
+        
+                # Arquivos gerados apenas quando o formato é pedido; o mesmo recorte
+                # de filtros reaproveita o arquivo já gerado
+                for formato, info in FORMATOS.items():
+                    caminho_arquivo = cache_exportacoes.caminho(chave_exportacao, formato)
+        
+                    if caminho_arquivo is None:
+                        if st.button(f"Gerar {info['rotulo']}", use_container_width=True, key=f"gerar_{formato}"):
+                            with st.spinner("Gerando arquivo..."), medicoes_exportacao.etapa('exportacao', formato=formato) as etapa_exportacao:
+                                caminho_arquivo = cache_exportacoes.gerar(chave_exportacao, formato, resultado, poligonos)
+                                etapa_exportacao.update(linhas=len(resultado), bytes=os.path.getsize(caminho_arquivo))
+        
+                    if caminho_arquivo is not None:
+                        with open(caminho_arquivo, 'rb') as arquivo:
+                            st.download_button(
+                                label=info['rotulo'],
+                                data=arquivo,
+                                file_name=f"{prefixo}_{timestamp}.{formato}",
+                                mime=info['mime'],
+                                use_container_width=True,
+                                key=f"download_{formato}",
+                                # Baixar não muda nada na página: sem rerun
+                                on_click='ignore'
+                            )
+                        metricas = cache_exportacoes.metricas.get(caminho_arquivo)
+                        if metricas:
+                            st.caption(f"{metricas['linhas']:,} registros · {metricas['bytes'] / 2 ** 20:.1f} MB · gerado em {metricas['segundos']:.1f} s")
+
+# O mapa é um fragmento: mover, dar zoom ou ligar camadas reexecuta só ele (camadas da área
+# visível), sem refazer filtros, tabela e exportações; só uma área desenhada reexecuta o app
+@st.fragment
+def mapa_localizacao(fonte, resultado, chave_mapa, versao_dados, raio=None):
+    """Mapa das barragens filtradas e dos polígonos ANA.
+
+    chave_mapa: chave do estado dos filtros; raio: (latitude, longitude, km) do filtro de raio, se ativo.
+    """
+    with medicoes_do_fragmento(medicoes, 'mapa', LOG_DESEMPENHO) as medicoes_mapa:
+        # Adicionar CSS para o spinner de carregamento
+        st.markdown("""
+        <style>
+        @keyframes spin {
+            0% { transform: rotate(0deg); }
+            100% { transform: rotate(360deg); }
+        }
+        .loading-spinner {
+            text-align: center;
+            padding: 40px;
+        }
+        .loading-spinner::after {
+            content: "";
+            display: inline-block;
+            width: 40px;
+            height: 40px;
+            border: 4px solid #f3f3f3;
+            border-top: 4px solid #3498db;
+            border-radius: 50%;
+            animation: spin 1s linear infinite;
+        }
+        </style>
+        """, unsafe_allow_html=True)
+        
+        # Mostrar spinner de carregamento
+        loading_placeholder = st.empty()
+        loading_placeholder.markdown('<div class="loading-spinner"></div>', unsafe_allow_html=True)
+        
+        # Coordenadas, campos do popup e chave do polígono ANA
+        colunas_lidas = colunas_mapa(fonte.colunas)
+        
+        # Tiles vetoriais: o HTML do mapa só leva a URL das camadas (se o servidor local subiu)
+        servidor_tiles = obter_servidor_tiles() if MAPA_TILES else None
+        if MAPA_TILES and servidor_tiles is None:
+            st.warning("Servidor de tiles indisponível (porta em uso); o mapa será montado com as camadas no HTML.")
+        
+        with medicoes_mapa.etapa('consulta_mapa') as etapa_consulta:
+            if MAPA_VIEWPORT and servidor_tiles is None:
+                # O mapa base (centro, tiles, legenda) só muda com os filtros; mover ou dar zoom
+                # troca apenas as camadas, recarregadas para a área visível
+                estado_mapa = st.session_state.get('estado_mapa')
+                if estado_mapa is None or estado_mapa['filtros'] != chave_mapa:
+                    estado_mapa = {
+                        'filtros': chave_mapa,
+                        'centro': centro_pontos(pontos_mapa(resultado, ['LATITUDE', 'LONGITUDE'])),
+                        # Nova chave do componente: a vista anterior não vale para os novos filtros
+                        'versao': estado_mapa['versao'] + 1 if estado_mapa else 0,
+                    }
+                    st.session_state['estado_mapa'] = estado_mapa
+                chave_componente = f"mapa_barragens_{estado_mapa['versao']}"
+                centro_mapa = estado_mapa['centro']
+            
+                # Limites e zoom devolvidos pelo mapa (estimados até a primeira resposta), com margem
+                vista = st.session_state.get(chave_componente) or {}
+                zoom_mapa = vista.get('zoom') or ZOOM_INICIAL
+                caixa = caixa_de_limites(vista.get('bounds'))
+                if caixa is None and centro_mapa is not None:
+                    caixa = caixa_estimada(centro_mapa, zoom_mapa)
+                if caixa is not None:
+                    caixa = expandir_caixa(caixa, MARGEM_VIEWPORT)
+            
+                df_mapa = pontos_mapa(resultado, colunas_lidas, caixa)
+                chaves_poligonos = resultado.chaves_poligonos()
+            else:
+                chave_componente = 'mapa_barragens'
+                caixa = None
+                zoom_mapa = ZOOM_INICIAL
+                df_mapa = pontos_mapa(resultado, colunas_lidas)
+                centro_mapa = centro_pontos(df_mapa)
+                chaves_poligonos = df_mapa[COLUNA_CHAVE] if COLUNA_CHAVE in df_mapa.columns else []
+        
+            etapa_consulta['pontos'] = len(df_mapa)
+        
+        if centro_mapa is not None:
+            mapa = mapa_base(centro_mapa)
+            grupo_poligonos, grupo_pontos = grupos_camadas()
+            
+            # Polígonos ANA: fragmentos GeoJSON já simplificados para o zoom atual (no modo
+            # viewport só os da área visível) ou tiles vetoriais gerados sob demanda
+            with st.spinner('Carregando polígonos ANA...'), medicoes_mapa.etapa('poligonos') as etapa_poligonos:
+                # Truncados/inválidos já foram marcados na carga
+                chaves_validas, chaves_invalidas = fonte.poligonos.chaves_unicas(chaves_poligonos)
+                etapa_poligonos.update(poligonos=len(chaves_validas), invalidos=len(chaves_invalidas))
+                if servidor_tiles is not None:
+                    # Conteúdo dos tiles deste estado de filtros: montado uma vez, tiles gerados sob demanda
+                    token = token_tiles(versao_dados, chave_mapa)
+                    servidor_tiles.registrar(token, lambda: conteudo_tiles(fonte.poligonos, chaves_validas, df_mapa))
+                    adicionar_tiles(
+                        grupo_poligonos, grupo_pontos,
+                        servidor_tiles.url_camada(token, 'poligonos'), servidor_tiles.url_camada(token, 'barragens')
+                    )
+                else:
+                    etapa_poligonos.update(adicionar_poligonos(grupo_poligonos, fonte.poligonos, chaves_validas, zoom_mapa, caixa))
+            
+            # Pontos das barragens: uma única camada com a cor resolvida no navegador
+            if servidor_tiles is None:
+                with st.spinner('Carregando pontos das barragens...'), medicoes_mapa.etapa('pontos', pontos=len(df_mapa)) as etapa_pontos:
+                    etapa_pontos.update(adicionar_pontos(grupo_pontos, df_mapa))
+            
+            grupos_mapa = [grupo_poligonos, grupo_pontos]
+            
+            # Contorno dos filtros espaciais de área e de raio
+            grupo_filtros = grupo_area(
+                st.session_state.get('filtro_area'), raio
+            )
+            if grupo_filtros is not None:
+                grupos_mapa.append(grupo_filtros)
+            
+            # Controle de camadas (permite ligar/desligar sem recarregar)
+            controle_camadas = folium.LayerControl(position='topright', collapsed=False)
+            if MAPA_VIEWPORT and servidor_tiles is None:
+                # Grupos enviados à parte, a cada movimento; o JS do agrupamento vai no mapa base
+                RecursosAgrupamento().add_to(mapa)
+            else:
+                for grupo in grupos_mapa:
+                    grupo.add_to(mapa)
+                controle_camadas.add_to(mapa)
+            
+            # Remover spinner e exibir mapa
+            loading_placeholder.empty()
+            # Chave onde o mapa devolve a vista e os desenhos (lida pelos filtros no próximo rerun)
+            st.session_state['componente_mapa'] = chave_componente
+            with medicoes_mapa.etapa('mapa') as etapa_mapa:
+                if MAPA_VIEWPORT and servidor_tiles is None:
+                    vista_atual = st_folium(
+                        mapa,
+                        key=chave_componente,
+                        width=None,
+                        height=650,
+                        returned_objects=['bounds', 'zoom', 'all_drawings'],
+                        feature_group_to_add=grupos_mapa,
+                        layer_control=controle_camadas
+                    )
+                else:
+                    vista_atual = st_folium(mapa, key=chave_componente, width=None, height=650, returned_objects=['all_drawings'])
+            if PAINEL_DESEMPENHO:
+                # Gera o HTML de novo só para medir (fora da etapa, que mede o custo real)
+                etapa_mapa['bytes_html'] = len(generate_leaflet_string(mapa)) + (
+                    sum(len(generate_leaflet_string(grupo)) for grupo in grupos_mapa)
+                    if MAPA_VIEWPORT and servidor_tiles is None else 0
+                )
+            
+            # Área nova desenhada no mapa: os filtros mudam, então o app inteiro é reexecutado
+            desenhos = (vista_atual or {}).get('all_drawings') or []
+            if desenhos and desenhos[-1].get('geometry') != st.session_state.get('ultimo_desenho'):
+                st.rerun(scope='app')
         else:
+            st.info("Nenhuma coordenada válida encontrada nos dados filtrados.")
+
+# Carregar os dados: snapshot local (padrão), DuckDB sobre o snapshot (SIOUT_FONTE=duckdb)
+# ou banco de dados (SIOUT_FONTE=banco).
+# A versão da origem invalida os caches quando o arquivo muda ou o banco é reimportado.
+# Configurar pandas para não truncar strings longas
+pd.set_option('display.max_colwidth', None)
+
+with medicoes.etapa('carga'):
+    fonte = None
+    if FONTE_DADOS == 'banco':
+        try:
+            fonte = obter_fonte_banco(URL_BANCO)
+            versao_dados = fonte.versao()
+            if versao_dados is None:
+                st.error("O banco não contém os dados importados. Execute: python -m nucleo.banco")
+                fonte = None
+        except Exception as e:
+            st.error(f"Erro ao conectar ao banco de dados: {e}")
+            fonte = None
+    elif FONTE_DADOS == 'duckdb':
+        versao_dados = obter_atualizador().versao()
+        try:
+            fonte = obter_fonte_duckdb(versao_dados)
+        except Exception as e:
+            st.error(f"Erro ao abrir o motor DuckDB: {e}")
+    else:
+        # O CSV/XLSX é apenas a origem: a versão do snapshot Arrow só muda quando ela muda
+        versao_dados = obter_atualizador().versao()
+        if versao_dados is None:
             st.error("Arquivo de dados não encontrado. Procure por RELATORIO_FINAL_SNISB_SIOUT.csv ou .xlsx")
-            return None
-    except Exception as e:
-        st.error(f"Erro ao carregar o arquivo: {e}")
-        return None
+        else:
+            try:
+                fonte = obter_fonte_arquivo(versao_dados)
+            except Exception as e:
+                st.error(f"Erro ao carregar o arquivo: {e}")
 
-# Carregar os dados
-df = carregar_dados()
+# Nova versão do relatório: aviso enquanto é processada e, em cada sessão, quando entra no lugar da anterior
+if FONTE_DADOS != 'banco':
+    atualizador = obter_atualizador()
+    if atualizador.atualizando:
+        st.caption("🔄 Nova versão do relatório em processamento; até a troca são exibidos os dados da versão anterior.")
+    elif atualizador.erro is not None:
+        st.warning(f"Não foi possível atualizar os dados: {atualizador.erro}")
+    versao_sessao = st.session_state.get('versao_dados')
+    if versao_sessao is not None and versao_sessao != versao_dados:
+        alteracoes = (atualizador.ultima_atualizacao or {}).get('alteracoes')
+        if alteracoes:
+            st.toast(f"Dados atualizados: {alteracoes['novas']:,} registros novos, {alteracoes['alteradas']:,} alterados "
+                     f"e {alteracoes['removidas']:,} removidos")
+        else:
+            st.toast("Dados atualizados")
+    st.session_state['versao_dados'] = versao_dados
 
-if df is not None:
+if fonte is not None:
+    poligonos_ana = fonte.poligonos
+    css_tabela = obter_css_tabela(versao_dados, fonte)
+    cache_exportacoes = obter_cache_exportacoes(versao_dados)
+    
     # Tabs para diferentes visualizações
     tab1, tab2 = st.tabs(["Visualizar Dados", "Ajuda/Glossário"])
     
@@ -60,10 +505,8 @@ if df is not None:
         col_data1, col_data2, col_data3 = st.columns([1, 1, 1])
         
         # Converter coluna de data se existir
-        if 'DATA_DO_CADASTRO' in df.columns:
-            df['DATA_DO_CADASTRO'] = pd.to_datetime(df['DATA_DO_CADASTRO'], errors='coerce')
-            data_min = df['DATA_DO_CADASTRO'].min()
-            data_max = df['DATA_DO_CADASTRO'].max()
+        if 'DATA_DO_CADASTRO' in fonte.colunas:
+            data_min, data_max = fonte.intervalo_datas()
             
             with col_data2:
                 col_inicio, col_fim = st.columns(2)
@@ -87,6 +530,48 @@ if df is not None:
                         label_visibility="visible"
                     )
         
+        with col_data3:
+            st.markdown("<p style='margin-bottom: 5px;'><small>&nbsp;</small></p>", unsafe_allow_html=True)
+            restringir_opcoes = st.toggle(
+                "Só opções com registros nos demais filtros",
+                key="restringir_opcoes",
+                help="As opções de cada filtro se limitam aos valores presentes nos registros que atendem aos demais filtros"
+            )
+        
+        # Último retângulo/polígono desenhado no mapa (ferramenta de desenho no canto esquerdo)
+        componente_mapa = st.session_state.get('componente_mapa')
+        vista_mapa = (st.session_state.get(componente_mapa) if componente_mapa else None) or {}
+        desenhos = vista_mapa.get('all_drawings') or []
+        if desenhos and desenhos[-1].get('geometry') != st.session_state.get('ultimo_desenho'):
+            st.session_state['ultimo_desenho'] = desenhos[-1].get('geometry')
+            st.session_state['filtro_area'] = filtro_area(desenhos[-1]['geometry'])
+        
+        # Opções dos seletores (calculadas uma vez por versão dos dados) com a contagem de registros
+        # de cada uma sob os demais filtros, lidos do estado dos widgets; com a restrição ligada,
+        # cada seletor mostra só as opções que ainda têm registros
+        selecoes_sessao = selecoes_ativas(
+            {coluna: st.session_state.get(chave, []) for coluna, chave in CHAVES_FILTROS.items()}, fonte.colunas
+        )
+        intervalo_sessao = None
+        if 'DATA_DO_CADASTRO' in fonte.colunas:
+            intervalo_sessao = intervalo_ativo(data_inicio, data_fim, data_min, data_max)
+        tem_coordenadas = 'LATITUDE' in fonte.colunas and 'LONGITUDE' in fonte.colunas
+        espaciais_sessao, nomes_espaciais = filtros_espaciais(fonte) if tem_coordenadas else ([], [])
+        
+        def contagens_seletor(coluna):
+            """Registros de cada opção da coluna sob os demais filtros (em cache por estado dos filtros)"""
+            return fonte.contagens(coluna, selecoes_sessao, intervalo_sessao, espaciais_sessao)
+        
+        def opcoes_seletor(coluna, termo=None):
+            """Opções do seletor da coluna: as escolhidas mais as disponíveis (ou as que casam com a busca)"""
+            presentes = contagens_seletor(coluna) > 0 if restringir_opcoes else None
+            return opcoes_filtro(fonte, coluna, st.session_state.get(CHAVES_FILTROS[coluna], []), presentes, termo)
+        
+        def rotulo_seletor(coluna):
+            """Rótulo das opções com a contagem de registros: 'valor (1,234)'"""
+            opcoes, contagens = fonte.opcoes(coluna), contagens_seletor(coluna)
+            return lambda valor: f"{valor} ({contagem_da_opcao(opcoes, contagens, valor):,})"
+        
         st.markdown("")
         
         # Segunda linha: Filtros de Características Físicas (4 filtros na mesma linha)
@@ -95,57 +580,69 @@ if df is not None:
         
         with col_fis1:
             st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Situação Cadastro SNISB</small></p>", unsafe_allow_html=True)
-            if 'SITUACAO_CADASTRO_SNISB' in df.columns:
-                opcoes_cadastro = sorted(df['SITUACAO_CADASTRO_SNISB'].dropna().unique().tolist())
+            if 'SITUACAO_CADASTRO_SNISB' in fonte.colunas:
+                opcoes_cadastro = opcoes_seletor('SITUACAO_CADASTRO_SNISB')
                 filtro_cadastro = st.multiselect(
                     "Situação Cadastro SNISB",
                     opcoes_cadastro,
                     default=[],
+                    format_func=rotulo_seletor('SITUACAO_CADASTRO_SNISB'),
                     label_visibility="collapsed",
-                    placeholder="Selecione..."
+                    placeholder="Selecione...",
+                    key="filtro_cadastro_snisb"
                 )
             else:
                 filtro_cadastro = []
         
         with col_fis2:
             st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Situação Massa D'água</small></p>", unsafe_allow_html=True)
-            if 'SITUACAO_MASSA_DAGUA' in df.columns:
-                opcoes_massa = sorted(df['SITUACAO_MASSA_DAGUA'].dropna().unique().tolist())
+            if 'SITUACAO_MASSA_DAGUA' in fonte.colunas:
+                opcoes_massa = opcoes_seletor('SITUACAO_MASSA_DAGUA')
                 filtro_massa = st.multiselect(
                     "Situação Massa D'água",
                     opcoes_massa,
                     default=[],
+                    format_func=rotulo_seletor('SITUACAO_MASSA_DAGUA'),
                     label_visibility="collapsed",
-                    placeholder="Selecione..."
+                    placeholder="Selecione...",
+                    key="filtro_massa_dagua"
                 )
             else:
                 filtro_massa = []
         
         with col_fis3:
             st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Situação Comparação SIOUT</small></p>", unsafe_allow_html=True)
-            if 'SITUACAO_COMPARACAO_SIOUT' in df.columns:
-                opcoes_comparacao = sorted(df['SITUACAO_COMPARACAO_SIOUT'].dropna().unique().tolist())
+            if 'SITUACAO_COMPARACAO_SIOUT' in fonte.colunas:
+                opcoes_comparacao = opcoes_seletor('SITUACAO_COMPARACAO_SIOUT')
                 filtro_comparacao = st.multiselect(
                     "Situação Comparação SIOUT",
                     opcoes_comparacao,
                     default=[],
+                    format_func=rotulo_seletor('SITUACAO_COMPARACAO_SIOUT'),
                     label_visibility="collapsed",
-                    placeholder="Selecione..."
+                    placeholder="Selecione...",
+                    key="filtro_comparacao_siout"
                 )
             else:
                 filtro_comparacao = []
         
         with col_fis4:
             st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Código SNISB</small></p>", unsafe_allow_html=True)
-            if 'CODIGO_SNISB' in df.columns:
-                # Obter lista de códigos únicos
-                codigos_unicos = sorted(df['CODIGO_SNISB'].dropna().astype(str).unique().tolist())
+            if 'CODIGO_SNISB' in fonte.colunas:
+                # Só os códigos escolhidos e os que casam com a busca vão para o navegador
+                busca_codigo = st.text_input(
+                    "Buscar código SNISB",
+                    key="busca_codigo_snisb",
+                    placeholder="🔍 Buscar código...",
+                    label_visibility="collapsed"
+                )
+                codigos_unicos = opcoes_seletor('CODIGO_SNISB', busca_codigo)
                 
-                # Campo de busca com multiseleção
                 filtro_codigo = st.multiselect(
                     "Código SNISB",
                     codigos_unicos,
                     default=[],
+                    format_func=rotulo_seletor('CODIGO_SNISB'),
                     label_visibility="collapsed",
                     placeholder="Selecione...",
                     key="filtro_codigo_snisb"
@@ -161,12 +658,13 @@ if df is not None:
         
         with col_uso1:
             st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Finalidade de Uso (SNISB)</small></p>", unsafe_allow_html=True)
-            if 'USO_SNISB' in df.columns:
-                opcoes_uso = sorted(df['USO_SNISB'].dropna().unique().tolist())
+            if 'USO_SNISB' in fonte.colunas:
+                opcoes_uso = opcoes_seletor('USO_SNISB')
                 filtro_uso = st.multiselect(
                     "Finalidade de Uso",
                     opcoes_uso,
                     default=[],
+                    format_func=rotulo_seletor('USO_SNISB'),
                     label_visibility="collapsed",
                     placeholder="Selecione...",
                     key="filtro_uso_snisb"
@@ -176,12 +674,13 @@ if df is not None:
         
         with col_uso2:
             st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Tipo de Material</small></p>", unsafe_allow_html=True)
-            if 'TIPO_DE_MATERIAL' in df.columns:
-                opcoes_material = sorted(df['TIPO_DE_MATERIAL'].dropna().unique().tolist())
+            if 'TIPO_DE_MATERIAL' in fonte.colunas:
+                opcoes_material = opcoes_seletor('TIPO_DE_MATERIAL')
                 filtro_material = st.multiselect(
                     "Tipo de Material",
                     opcoes_material,
                     default=[],
+                    format_func=rotulo_seletor('TIPO_DE_MATERIAL'),
                     label_visibility="collapsed",
                     placeholder="Selecione...",
                     key="filtro_tipo_material"
@@ -191,14 +690,20 @@ if df is not None:
         
         with col_uso3:
             st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Empreendedor</small></p>", unsafe_allow_html=True)
-            if 'EMPREENDEDOR_SNISB' in df.columns:
-                # Obter lista de empreendedores únicos
-                empreendedores_unicos = sorted(df['EMPREENDEDOR_SNISB'].dropna().astype(str).unique().tolist())
+            if 'EMPREENDEDOR_SNISB' in fonte.colunas:
+                busca_empreendedor = st.text_input(
+                    "Buscar empreendedor",
+                    key="busca_empreendedor_snisb",
+                    placeholder="🔍 Buscar empreendedor...",
+                    label_visibility="collapsed"
+                )
+                empreendedores_unicos = opcoes_seletor('EMPREENDEDOR_SNISB', busca_empreendedor)
                 
                 filtro_empreendedor = st.multiselect(
                     "Empreendedor",
                     empreendedores_unicos,
                     default=[],
+                    format_func=rotulo_seletor('EMPREENDEDOR_SNISB'),
                     label_visibility="collapsed",
                     placeholder="Selecione...",
                     key="filtro_empreendedor_snisb"
@@ -206,526 +711,116 @@ if df is not None:
             else:
                 filtro_empreendedor = []
         
-        # Aplicar os filtros
-        df_filtrado = df.copy()
-        
-        # Verificar se algum filtro está ativo
-        filtros_ativos = []
-        
-        # Filtro de data
-        if 'DATA_DO_CADASTRO' in df.columns:
-            data_inicio_dt = pd.to_datetime(data_inicio)
-            data_fim_dt = pd.to_datetime(data_fim)
-            
-            # Verificar se o filtro de data está ativo (diferente do range completo)
-            if data_inicio_dt > data_min or data_fim_dt < data_max:
-                df_filtrado = df_filtrado[
-                    (df_filtrado['DATA_DO_CADASTRO'] >= data_inicio_dt) & 
-                    (df_filtrado['DATA_DO_CADASTRO'] <= data_fim_dt)
-                ]
-                filtros_ativos.append('DATA_DO_CADASTRO')
-        
-        # Filtro de Código SNISB
-        if filtro_codigo:
-            if 'CODIGO_SNISB' in df_filtrado.columns:
-                df_filtrado = df_filtrado[df_filtrado['CODIGO_SNISB'].astype(str).isin(filtro_codigo)]
-                filtros_ativos.append('CODIGO_SNISB')
-        
-        if filtro_cadastro:
-            df_filtrado = df_filtrado[df_filtrado['SITUACAO_CADASTRO_SNISB'].isin(filtro_cadastro)]
-            filtros_ativos.append('SITUACAO_CADASTRO_SNISB')
-        
-        if filtro_massa:
-            df_filtrado = df_filtrado[df_filtrado['SITUACAO_MASSA_DAGUA'].isin(filtro_massa)]
-            filtros_ativos.append('SITUACAO_MASSA_DAGUA')
-        
-        if filtro_comparacao:
-            df_filtrado = df_filtrado[df_filtrado['SITUACAO_COMPARACAO_SIOUT'].isin(filtro_comparacao)]
-            filtros_ativos.append('SITUACAO_COMPARACAO_SIOUT')
-        
-        # Filtro de Uso SNISB
-        if filtro_uso:
-            if 'USO_SNISB' in df_filtrado.columns:
-                df_filtrado = df_filtrado[df_filtrado['USO_SNISB'].isin(filtro_uso)]
-                filtros_ativos.append('USO_SNISB')
-        
-        # Filtro de Tipo de Material
-        if filtro_material:
-            if 'TIPO_DE_MATERIAL' in df_filtrado.columns:
-                df_filtrado = df_filtrado[df_filtrado['TIPO_DE_MATERIAL'].isin(filtro_material)]
-                filtros_ativos.append('TIPO_DE_MATERIAL')
-        
-        # Filtro de Empreendedor
-        if filtro_empreendedor:
-            if 'EMPREENDEDOR_SNISB' in df_filtrado.columns:
-                df_filtrado = df_filtrado[df_filtrado['EMPREENDEDOR_SNISB'].astype(str).isin(filtro_empreendedor)]
-                filtros_ativos.append('EMPREENDEDOR_SNISB')
+        # Quarta linha: Filtros espaciais (combinados por E com os demais)
+        if tem_coordenadas:
+            st.markdown("")
+            st.markdown("<p style='text-align: center; margin-bottom: 5px;'><small>Filtros Espaciais</small></p>", unsafe_allow_html=True)
+            col_esp1, col_esp2, col_esp3 = st.columns(3)
+            
+            with col_esp1:
+                st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Raio em torno de um ponto</small></p>", unsafe_allow_html=True)
+                col_lat, col_lon, col_raio = st.columns(3)
+                with col_lat:
+                    raio_latitude = st.number_input("Latitude", min_value=-90.0, max_value=90.0, value=None, format="%.5f", placeholder="-30.03", key="raio_latitude")
+                with col_lon:
+                    raio_longitude = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=None, format="%.5f", placeholder="-51.23", key="raio_longitude")
+                with col_raio:
+                    raio_km = st.number_input("Raio (km)", min_value=0.0, value=0.0, step=5.0, key="raio_km")
+            
+            with col_esp2:
+                st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Distância do polígono ANA de uma barragem</small></p>", unsafe_allow_html=True)
+                col_ref, col_dist = st.columns([2, 1])
+                with col_ref:
+                    tem_referencia = COLUNA_CHAVE in fonte.colunas and 'CODIGO_SNISB' in fonte.colunas
+                    busca_referencia = st.text_input(
+                        "Buscar código de referência",
+                        key="busca_codigo_referencia",
+                        placeholder="🔍 Buscar código...",
+                        label_visibility="collapsed"
+                    )
+                    codigo_referencia = st.selectbox(
+                        "Código SNISB de referência",
+                        opcoes_filtro(
+                            fonte, 'CODIGO_SNISB', [c for c in [st.session_state.get('codigo_referencia_poligono')] if c is not None],
+                            termo=busca_referencia
+                        ) if tem_referencia else [],
+                        index=None,
+                        placeholder="Selecione...",
+                        key="codigo_referencia_poligono"
+                    )
+                with col_dist:
+                    distancia_km = st.number_input("Distância (km)", min_value=0.0, value=10.0, step=5.0, key="distancia_poligono_km")
+            
+            with col_esp3:
+                st.markdown("<p style='text-align: center; margin-bottom: 0;'><small>Área desenhada no mapa</small></p>", unsafe_allow_html=True)
+                if st.session_state.get('filtro_area'):
+                    st.caption("Filtrando pela área desenhada no mapa")
+                    st.button("Limpar área", key="limpar_area", on_click=lambda: st.session_state.update(filtro_area=None))
+                else:
+                    st.caption("Desenhe um retângulo ou polígono no mapa para filtrar as barragens da área")
+        
+        # Aplicar os filtros pelo índice pré-computado (sem cópias intermediárias do DataFrame)
+        # Filtro de data: ativo só se o período for diferente do range completo
+        intervalo_datas = None
+        if 'DATA_DO_CADASTRO' in fonte.colunas:
+            intervalo_datas = intervalo_ativo(data_inicio, data_fim, data_min, data_max)
+        
+        # Filtros de seleção múltipla (lógica OU dentro de cada filtro, E entre filtros)
+        selecoes = selecoes_ativas({
+            'CODIGO_SNISB': filtro_codigo,
+            'SITUACAO_CADASTRO_SNISB': filtro_cadastro,
+            'SITUACAO_MASSA_DAGUA': filtro_massa,
+            'SITUACAO_COMPARACAO_SIOUT': filtro_comparacao,
+            'USO_SNISB': filtro_uso,
+            'TIPO_DE_MATERIAL': filtro_material,
+            'EMPREENDEDOR_SNISB': filtro_empreendedor,
+        }, fonte.colunas)
+        filtros_ativos = (['DATA_DO_CADASTRO'] if intervalo_datas is not None else []) + list(selecoes)
+        
+        # Filtros espaciais (consultas à STRtree das barragens), lidos dos widgets junto com as contagens
+        espaciais = espaciais_sessao
+        filtros_ativos += nomes_espaciais
+        if tem_coordenadas and codigo_referencia is not None and filtro_poligono(SEM_POLIGONO, distancia_km) in espaciais:
+            st.warning(f"A barragem {codigo_referencia} não possui polígono ANA; o filtro de distância não retorna registros.")
+        
+        # Resultado dos filtros: só posições (snapshot) ou consultas sob demanda (banco).
+        # Reruns com o mesmo estado de filtros (paginação, camadas do mapa) reutilizam o cache.
+        with medicoes.etapa('filtros', filtros=len(filtros_ativos)) as etapa_filtros:
+            resultado = fonte.filtrar(selecoes, intervalo_datas, espaciais)
+            total_filtrado = len(resultado)
+            etapa_filtros['linhas'] = total_filtrado
         
         # Definir texto baseado se há filtros ativos
         tem_filtros = len(filtros_ativos) > 0
         titulo_tabela = "Dados Filtrados" if tem_filtros else "Tabela Completa"
         
         # Mostrar contador de registros filtrados
-        st.markdown(f"<p style='text-align: center;'>Mostrando <strong>{len(df_filtrado):,}</strong> registros de um total de <strong>{len(df):,}</strong></p>", unsafe_allow_html=True)
+        st.markdown(f"<p style='text-align: center;'>Mostrando <strong>{total_filtrado:,}</strong> registros de um total de <strong>{fonte.total:,}</strong></p>", unsafe_allow_html=True)
         
         st.markdown("---")
         st.markdown(f"<h3 style='text-align: center;'>{titulo_tabela}</h3>", unsafe_allow_html=True)
         
-        if len(df_filtrado) > 0:
-            # Sistema de paginação
-            registros_por_pagina = 50
-            total_paginas = (len(df_filtrado) - 1) // registros_por_pagina + 1
-            
-            # Inicializar página atual no session_state
-            if 'pagina_atual' not in st.session_state:
-                st.session_state.pagina_atual = 1
-            
-            # Calcular índices para a página atual
-            inicio = (st.session_state.pagina_atual - 1) * registros_por_pagina
-            fim = min(inicio + registros_por_pagina, len(df_filtrado))
-            
-            # Mostrar informação da paginação
-            st.markdown(f"<p style='text-align: center;'><small>Exibindo registros {inicio + 1} a {fim} de {len(df_filtrado):,}</small></p>", unsafe_allow_html=True)
-            
-            # Obter dados da página atual
-            df_pagina = df_filtrado.iloc[inicio:fim].copy()
-            
-            # Aplicar estilização na tabela
-            def colorir_situacao(val):
-                """Aplica cores baseadas no valor da situação"""
-                if pd.isna(val):
-                    return ''
-                val_str = str(val).lower()
-                if 'totalmente compatível' in val_str or 'selecionado' in val_str or 'compatível com polígono' in val_str:
-                    return 'background-color: #d4edda; color: #155724'
-                elif 'parcialmente' in val_str or 'apenas geograficamente' in val_str:
-                    return 'background-color: #fff3cd; color: #856404'
-                elif 'incompatível' in val_str or 'descartado' in val_str:
-                    return 'background-color: #f8d7da; color: #721c24'
-                return ''
-            
-            # Aplicar estilização se as colunas existirem
-            colunas_estilo = []
-            if 'SITUACAO_CADASTRO_SNISB' in df_pagina.columns:
-                colunas_estilo.append('SITUACAO_CADASTRO_SNISB')
-            if 'SITUACAO_MASSA_DAGUA' in df_pagina.columns:
-                colunas_estilo.append('SITUACAO_MASSA_DAGUA')
-            if 'SITUACAO_COMPARACAO_SIOUT' in df_pagina.columns:
-                colunas_estilo.append('SITUACAO_COMPARACAO_SIOUT')
-            
-            if colunas_estilo:
-                styled_df = df_pagina.style.map(colorir_situacao, subset=colunas_estilo)
-                st.dataframe(styled_df, width='stretch', height=600, column_config={
-                    col: st.column_config.TextColumn(width="medium") for col in df_pagina.columns
-                })
-            else:
-                st.dataframe(df_pagina, width='stretch', height=600, column_config={
-                    col: st.column_config.TextColumn(width="medium") for col in df_pagina.columns
-                })
-            
-            # Controles de paginação abaixo da tabela (próximo ao dataset)
-            # Função para gerar os números de página
-            def gerar_paginas_visiveis(pagina_atual, total_paginas):
-                """Gera lista de páginas visíveis com reticências"""
-                paginas = []
-                
-                # Sempre mostrar primeira página
-                paginas.append(1)
-                
-                # Mostrar páginas ao redor da atual
-                inicio_range = max(2, pagina_atual - 2)
-                fim_range = min(total_paginas - 1, pagina_atual + 2)
-                
-                # Adicionar reticências antes se necessário
-                if inicio_range > 2:
-                    paginas.append('...')
-                
-                # Adicionar páginas do range
-                for p in range(inicio_range, fim_range + 1):
-                    paginas.append(p)
-                
-                # Adicionar reticências depois se necessário
-                if fim_range < total_paginas - 1:
-                    paginas.append('...')
-                
-                # Sempre mostrar última página se houver mais de uma
-                if total_paginas > 1:
-                    paginas.append(total_paginas)
-                
-                return paginas
-            
-            paginas_visiveis = gerar_paginas_visiveis(st.session_state.pagina_atual, total_paginas)
-            
-            # Estilo CSS para os botões de paginação
-            st.markdown("""
-            <style>
-            /* Botões de paginação - Secondary */
-            div[data-testid="column"] button[kind="secondary"] {
-                background-color: #f8f9fa !important;
-                color: #495057 !important;
-                border: 1px solid #dee2e6 !important;
-                padding: 0.25rem 0.5rem !important;
-                font-size: 0.875rem !important;
-                height: 2rem !important;
-            }
-            
-            /* Botões de paginação - Primary (página selecionada) */
-            button[kind="primary"], div[data-testid="column"] button[kind="primary"] {
-                background-color: #cfe2ff !important;
-                color: #084298 !important;
-                border: 1px solid #9ec5fe !important;
-                padding: 0.25rem 0.5rem !important;
-                font-size: 0.875rem !important;
-                font-weight: 600 !important;
-                height: 2rem !important;
-            }
-            
-            button[kind="primary"]:hover {
-                background-color: #b6d4fe !important;
-                color: #052c65 !important;
-            }
-            
-            .stButton button[kind="primary"] p {
-                color: #084298 !important;
-            }
-            </style>
-            """, unsafe_allow_html=True)
-            
-            # Criar colunas centralizadas para os botões de paginação
-            total_botoes = len(paginas_visiveis) + 2  # +2 para botões anterior/próximo
-            espaco_lateral = (10 - total_botoes) / 2 if total_botoes < 10 else 0.5
-            
-            colunas_layout = [espaco_lateral] + [0.5] + [0.8] * len(paginas_visiveis) + [0.5] + [espaco_lateral]
-            colunas = st.columns(colunas_layout)
-            
-            col_offset = 1  # Começar após o espaço lateral
-            
-            # Botão Anterior
-            with colunas[col_offset]:
-                if st.button("◀", key="prev", disabled=(st.session_state.pagina_atual == 1), use_container_width=True):
-                    st.session_state.pagina_atual -= 1
-                    st.rerun()
-            
-            # Botões de número de página
-            for idx, pagina in enumerate(paginas_visiveis, start=1):
-                with colunas[col_offset + idx]:
-                    if pagina == '...':
-                        st.markdown("<p style='text-align: center; margin-top: 0.25rem;'>...</p>", unsafe_allow_html=True)
-                    else:
-                        if st.button(
-                            str(pagina),
-                            key=f"page_{pagina}",
-                            type="primary" if pagina == st.session_state.pagina_atual else "secondary",
-                            use_container_width=True
-                        ):
-                            st.session_state.pagina_atual = pagina
-                            st.rerun()
-            
-            # Botão Próximo
-            with colunas[col_offset + len(paginas_visiveis) + 1]:
-                if st.button("▶", key="next", disabled=(st.session_state.pagina_atual == total_paginas), use_container_width=True):
-                    st.session_state.pagina_atual += 1
-                    st.rerun()
+        if total_filtrado > 0:
+            tabela_paginada(resultado, css_tabela)
             
             # Botão de download abaixo da paginação
             st.markdown("")
             
-            col1, col2, col3 = st.columns([1, 1, 1])
-            
-            with col2:
-                # Texto do botão
-                texto_botao = "Baixar Dados Filtrados" if tem_filtros else "Baixar Todos os Dados"
-                
-                # Usar popover para mostrar opções de formato
-                with st.popover(texto_botao, use_container_width=True):
-                    st.markdown("**Escolha o formato do arquivo:**")
-                    
-                    from io import BytesIO, StringIO
-                    
-                    timestamp = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
-                    prefixo = "dados_filtrados" if tem_filtros else "dados_completos"
-                    
-                    # Botão Excel
-                    buffer_xlsx = BytesIO()
-                    with pd.ExcelWriter(buffer_xlsx, engine='openpyxl') as writer:
-                        df_filtrado.to_excel(writer, index=False, sheet_name='Dados')
-                    buffer_xlsx.seek(0)
-                    
-                    st.download_button(
-                        label="Excel (.xlsx)",
-                        data=buffer_xlsx,
-                        file_name=f"{prefixo}_{timestamp}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True,
-                        key="download_xlsx"
-                    )
-                    
-                    # Botão CSV
-                    buffer_csv = StringIO()
-                    df_filtrado.to_csv(buffer_csv, index=False, encoding='utf-8-sig', sep=';')
-                    dados_csv = buffer_csv.getvalue().encode('utf-8-sig')
-                    
-                    st.download_button(
-                        label="CSV (.csv)",
-                        data=dados_csv,
-                        file_name=f"{prefixo}_{timestamp}.csv",
-                        mime="text/csv",
-                        use_container_width=True,
-                        key="download_csv"
-                    )
-                    
-                    # Botão JSON
-                    buffer_json = StringIO()
-                    df_filtrado.to_json(buffer_json, orient='records', force_ascii=False, indent=2, date_format='iso')
-                    dados_json = buffer_json.getvalue().encode('utf-8')
-                    
-                    st.download_button(
-                        label="JSON (.json)",
-                        data=dados_json,
-                        file_name=f"{prefixo}_{timestamp}.json",
-                        mime="application/json",
-                        use_container_width=True,
-                        key="download_json"
-                    )
+            exportacao(
+                resultado, chave_filtros(selecoes, intervalo_datas, espaciais), tem_filtros,
+                cache_exportacoes, poligonos_ana
+            )
             
             # Mapa de localização
             st.markdown("---")
             st.markdown("<h3 style='text-align: center;'>Mapa de Localização</h3>", unsafe_allow_html=True)
             st.markdown("")
             
-            # Adicionar CSS para o spinner de carregamento
-            st.markdown("""
-            <style>
-            @keyframes spin {
-                0% { transform: rotate(0deg); }
-                100% { transform: rotate(360deg); }
-            }
-            .loading-spinner {
-                text-align: center;
-                padding: 40px;
-            }
-            .loading-spinner::after {
-                content: "";
-                display: inline-block;
-                width: 40px;
-                height: 40px;
-                border: 4px solid #f3f3f3;
-                border-top: 4px solid #3498db;
-                border-radius: 50%;
-                animation: spin 1s linear infinite;
-            }
-            </style>
-            """, unsafe_allow_html=True)
-            
-            # Mostrar spinner de carregamento
-            loading_placeholder = st.empty()
-            loading_placeholder.markdown('<div class="loading-spinner"></div>', unsafe_allow_html=True)
-            
-            # Verificar se existem colunas de latitude e longitude
-            tem_coordenadas = 'LATITUDE' in df_filtrado.columns and 'LONGITUDE' in df_filtrado.columns
-            
             if tem_coordenadas:
-                # Preparar dados do mapa usando colunas LATITUDE e LONGITUDE diretamente
-                colunas_mapa = ['LATITUDE', 'LONGITUDE']
-                colunas_popup = ['CODIGO_SNISB', 'SITUACAO_CADASTRO_SNISB', 'SITUACAO_MASSA_DAGUA', 'SITUACAO_COMPARACAO_SIOUT']
-                for col in colunas_popup:
-                    if col in df_filtrado.columns:
-                        colunas_mapa.append(col)
-                
-                # Adicionar coluna POLIGONO_ANA se existir (para uso posterior)
-                if 'POLIGONO_ANA' in df_filtrado.columns:
-                    colunas_mapa.append('POLIGONO_ANA')
-                
-                df_mapa = df_filtrado[colunas_mapa].copy()
-                
-                # Renomear para lowercase para consistência
-                df_mapa = df_mapa.rename(columns={'LATITUDE': 'latitude', 'LONGITUDE': 'longitude'})
-                
-                # Converter para numérico e remover valores inválidos
-                df_mapa['latitude'] = pd.to_numeric(df_mapa['latitude'], errors='coerce')
-                df_mapa['longitude'] = pd.to_numeric(df_mapa['longitude'], errors='coerce')
-                df_mapa = df_mapa.dropna(subset=['latitude', 'longitude'])
-                
-                # Validar coordenadas do Brasil (aproximado)
-                df_mapa = df_mapa[
-                    (df_mapa['latitude'] >= -34) & (df_mapa['latitude'] <= 6) &
-                    (df_mapa['longitude'] >= -74) & (df_mapa['longitude'] <= -28)
-                ]
-                
-                if len(df_mapa) > 0:
-                    # Calcular centro do mapa
-                    center_lat = df_mapa['latitude'].mean()
-                    center_lon = df_mapa['longitude'].mean()
-                    
-                    # Criar mapa Folium com imagem de satélite Esri (como base fixa, sem aparecer no controle)
-                    mapa = folium.Map(
-                        location=[center_lat, center_lon],
-                        zoom_start=7,
-                        tiles=None  # Não usar tiles padrão
-                    )
-                    
-                    # Adicionar tiles de satélite como base sem controle
-                    folium.TileLayer(
-                        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-                        attr='Esri World Imagery',
-                        name='Satélite Esri',
-                        overlay=False,
-                        control=False  # Não mostrar no controle de camadas
-                    ).add_to(mapa)
-                    
-                    # Criar grupos de camadas para controle independente (apenas as camadas controláveis)
-                    grupo_poligonos = folium.FeatureGroup(name='🗺️ Polígonos ANA', show=True)
-                    grupo_pontos = folium.FeatureGroup(name='🔵 Pontos das Barragens', show=True)
-                    
-                    # Adicionar polígonos ANA ao grupo
-                    with st.spinner('Carregando polígonos ANA...'):
-                            from shapely import wkt
-                            import json
-                            
-                            # Obter polígonos únicos apenas dos registros filtrados
-                            poligonos_unicos = df_mapa[df_mapa['POLIGONO_ANA'].notna()]['POLIGONO_ANA'].unique()
-                            
-                            # Criar um único FeatureCollection para todos os polígonos (mais eficiente)
-                            features = []
-                            poligonos_validos = 0
-                            poligonos_invalidos = 0
-                            
-                            for poligono_wkt in poligonos_unicos:
-                                try:
-                                    # Verificar se o polígono está completo (termina com ))
-                                    if not str(poligono_wkt).endswith('))'):
-                                        poligonos_invalidos += 1
-                                        continue
-                                    
-                                    # Converter WKT para geometria Shapely
-                                    geom = wkt.loads(poligono_wkt)
-                                    
-                                    # Simplificar geometria agressivamente para melhor performance
-                                    geom_simplified = geom.simplify(0.002, preserve_topology=True)
-                                    
-                                    # Criar feature GeoJSON
-                                    feature = {
-                                        "type": "Feature",
-                                        "geometry": geom_simplified.__geo_interface__,
-                                        "properties": {"tipo": "Polígono ANA"}
-                                    }
-                                    features.append(feature)
-                                    poligonos_validos += 1
-                                except Exception:
-                                    # Ignorar polígonos com erro de parsing
-                                    poligonos_invalidos += 1
-                                    continue
-                            
-                            # Adicionar todos os polígonos de uma vez como FeatureCollection
-                            if features:
-                                feature_collection = {
-                                    "type": "FeatureCollection",
-                                    "features": features
-                                }
-                                
-                                folium.GeoJson(
-                                    feature_collection,
-                                    style_function=lambda x: {
-                                        'fillColor': '#4A90E2',
-                                        'color': '#2E5C8A',
-                                        'weight': 1,
-                                        'fillOpacity': 0.45,
-                                        'interactive': False
-                                    }
-                                ).add_to(grupo_poligonos)
-                            
-                    # Adicionar grupo de polígonos ao mapa
-                    grupo_poligonos.add_to(mapa)
-                    
-                    # Adicionar pontos das barragens ao grupo
-                    with st.spinner('Carregando pontos das barragens...'):
-                            # Processar todos os pontos de uma vez (mais eficiente)
-                            for idx, row in df_mapa.iterrows():
-                                # Definir cor baseada na situação do cadastro SNISB
-                                situacao_cadastro = str(row.get('SITUACAO_CADASTRO_SNISB', '')).lower()
-                                situacao_comparacao = str(row.get('SITUACAO_COMPARACAO_SIOUT', '')).lower()
-                                
-                                # Hierarquia de cores:
-                                if 'descartado' in situacao_cadastro:
-                                    cor = '#DC143C'
-                                elif 'totalmente compatível' in situacao_comparacao:
-                                    cor = '#28A745'
-                                elif 'compatível parcialmente' in situacao_comparacao:
-                                    cor = '#FFC107'
-                                elif 'compatível apenas geograficamente' in situacao_comparacao:
-                                    cor = '#FF8C00'
-                                elif 'incompatível' in situacao_comparacao:
-                                    cor = '#8B0000'
-                                elif 'selecionado para validação' in situacao_cadastro:
-                                    cor = '#007BFF'
-                                else:
-                                    cor = '#808080'
-                                
-                                # Criar conteúdo do popup (simplificado)
-                                popup_html = f"""<div style='font-family: Arial; font-size: 11px; min-width: 200px;'>
-                                    <b>Código:</b> {row.get('CODIGO_SNISB', 'N/A')}<br>
-                                    <b>Cadastro SNISB:</b> {row.get('SITUACAO_CADASTRO_SNISB', 'N/A')}<br>
-                                    <b>Massa D'água:</b> {row.get('SITUACAO_MASSA_DAGUA', 'N/A')}<br>
-                                    <b>Comparação SIOUT:</b> {row.get('SITUACAO_COMPARACAO_SIOUT', 'N/A')}
-                                </div>"""
-                                
-                                folium.CircleMarker(
-                                    location=[row['latitude'], row['longitude']],
-                                    radius=5,
-                                    color='#FFFFFF',
-                                    fill=True,
-                                    fillColor=cor,
-                                    fillOpacity=0.7,
-                                    weight=1,
-                                    popup=folium.Popup(popup_html, max_width=250, lazy=True)
-                                ).add_to(grupo_pontos)
-                    
-                    # Adicionar grupo de pontos ao mapa
-                    grupo_pontos.add_to(mapa)
-                    
-                    # Adicionar controle de camadas (permite ligar/desligar sem recarregar)
-                    folium.LayerControl(position='topright', collapsed=False).add_to(mapa)
-                    
-                    # Adicionar CSS customizado para deixar o controle de camadas mais transparente
-                    custom_css = """
-                    <style>
-                    .leaflet-control-layers {
-                        background-color: rgba(255, 255, 255, 0.85) !important;
-                        border: 1px solid grey !important;
-                        border-radius: 5px !important;
-                    }
-                    .leaflet-control-layers-expanded {
-                        padding: 6px 8px 6px 6px !important;
-                    }
-                    </style>
-                    """
-                    mapa.get_root().html.add_child(folium.Element(custom_css))
-                    
-                    # Adicionar legenda
-                    legenda_html = """
-                    <div style="position: fixed; 
-                                bottom: 30px; right: 30px; width: 200px; 
-                                background-color: rgba(255, 255, 255, 0.9); z-index:9999; 
-                                border:1px solid grey; border-radius: 5px;
-                                padding: 8px; font-size: 10px;
-                                font-family: Arial;">
-                        <h4 style="margin: 0 0 6px 0; text-align: center; font-size: 11px;">Legenda</h4>
-                        <p style="margin: 3px 0;"><span style="background-color: #28A745; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Totalmente Compatível</p>
-                        <p style="margin: 3px 0;"><span style="background-color: #FFC107; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Parcialmente Compatível</p>
-                        <p style="margin: 3px 0;"><span style="background-color: #FF8C00; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Compatível Geo</p>
-                        <p style="margin: 3px 0;"><span style="background-color: #8B0000; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Incompatível</p>
-                        <p style="margin: 3px 0;"><span style="background-color: #DC143C; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Descartado</p>
-                        <hr style="margin: 6px 0; border: 0; border-top: 1px solid #ccc;">
-                        <p style="margin: 3px 0;"><span style="background-color: #4A90E2; width: 12px; height: 12px; display: inline-block; border: 1px solid #2E5C8A;"></span> Polígonos ANA</p>
-                    </div>
-                    """
-                    mapa.get_root().html.add_child(folium.Element(legenda_html))
-                    
-                    # Remover spinner e exibir mapa
-                    loading_placeholder.empty()
-                    st_folium(mapa, width=None, height=650, returned_objects=[])
-                else:
-                    st.info("Nenhuma coordenada válida encontrada nos dados filtrados.")
+                mapa_localizacao(
+                    fonte, resultado, chave_filtros(selecoes, intervalo_datas, espaciais), versao_dados,
+                    (raio_latitude, raio_longitude, raio_km) if 'RAIO' in filtros_ativos else None
+                )
             else:
                 st.info("Colunas LATITUDE e LONGITUDE não encontradas no dataset.")
         else:
@@ -804,7 +899,9 @@ if df is not None:
             
             **ID_SIOUT**: Identificador único do registro no Sistema de Outorgas (SIOUT-RS).
             
-            **POLIGONO_ANA**: Geometria do polígono da massa d'água da ANA em formato WKT (Well-Known Text) onde a barragem está localizada.
+            **ID_POLIGONO_ANA**: Chave do polígono da massa d'água da ANA onde a barragem está localizada (vazia/-1 quando não há polígono). Na tabela, cada polígono é referenciado por essa chave.
+            
+            **POLIGONO_ANA**: Geometria do polígono da massa d'água da ANA em formato WKT (Well-Known Text), incluída nos arquivos exportados.
             """)
         
         with st.expander("Situações e Status"):
@@ -885,21 +982,31 @@ if df is not None:
             
             **4. Mapa Interativo**
             - Localizado no final da página
-            - Mostra todas as barragens e polígonos ANA dos dados filtrados
+            - Mostra as barragens e polígonos ANA dos dados filtrados na área visível; ao mover ou aproximar o mapa, os dados da nova área são carregados
             - Use o controle de camadas (canto superior direito) para exibir/ocultar pontos e polígonos
             - Zoom e navegação disponíveis (arraste, scroll, botões +/-)
             - Clique nos pontos para ver informações detalhadas
+            - Com muitos pontos, as barragens são agrupadas por cor em bolhas com a contagem; aproxime o zoom para ver os pontos individuais
             - Imagem de satélite Esri como base do mapa
             
             **5. Download de Dados**
             - Clique no botão "Baixar Dados" (centralizado)
-            - Escolha o formato: Excel (.xlsx), CSV (.csv) ou JSON (.json)
+            - Escolha o formato: Excel (.xlsx), CSV (.csv), JSON (.json) ou Parquet (.parquet)
+            - Clique em "Gerar" no formato desejado e, em seguida, no botão de download
+            - Arquivos já gerados para os mesmos filtros ficam disponíveis para baixar novamente sem espera
+            - No Excel, os polígonos ANA ficam na planilha "Poligonos", ligados aos registros pela coluna ID_POLIGONO_ANA (polígonos maiores que o limite de uma célula são divididos em colunas POLIGONO_ANA_2, POLIGONO_ANA_3, ...)
             - O arquivo contém apenas os dados filtrados
             
             **6. Filtro por Código SNISB**
             - Digite ou selecione um código específico
             - Sistema autocompleta enquanto você digita
             - Útil para localizar barragens específicas rapidamente
+            
+            **7. Filtros Espaciais**
+            - Raio: informe latitude, longitude e o raio em km
+            - Distância do polígono ANA: escolha a barragem de referência e a distância em km
+            - Área: desenhe um retângulo ou polígono no mapa (ferramenta no canto esquerdo); use "Limpar área" para remover
+            - Combinam-se com os demais filtros (lógica AND)
             """)
         
         with st.expander("Perguntas Frequentes"):
@@ -922,7 +1029,7 @@ if df is not None:
             R: São faixas pré-definidas que classificam as barragens por porte. Altura em metros e capacidade em metros cúbicos (m³).
             
             **P: O mapa mostra todas as barragens?**
-            R: Não, o mapa mostra apenas as barragens que atendem aos filtros aplicados. Se não houver filtros, mostra todas.
+            R: Não, o mapa mostra apenas as barragens que atendem aos filtros aplicados, carregadas conforme a área visível. Se não houver filtros, mostra todas ao percorrer o mapa.
             
             **P: Por que o mapa não aparece?**
             R: Pode ser porque os registros filtrados não têm coordenadas válidas de latitude/longitude.
@@ -937,7 +1044,7 @@ if df is not None:
             R: Sim, selecione "Todos" em cada filtro ou recarregue a página (F5).
             """)
 
-else:
+elif FONTE_DADOS != 'banco':
     st.error("Não foi possível carregar os dados. Verifique se o arquivo 'RELATORIO_FINAL_SNISB_SIOUT.csv' ou 'RELATORIO_FINAL_SNISB_SIOUT.xlsx' está na pasta correta.")
 
 # Rodapé com logo Zetta
@@ -966,3 +1073,20 @@ if os.path.exists(logo_path):
     )
 else:
     st.markdown("<p style='text-align: center; color: #666; font-size: 12px;'>Desenvolvido por Agência Zetta</p>", unsafe_allow_html=True)
+
+# Desempenho do rerun: uma linha JSON no log e, em desenvolvimento, o painel na barra lateral
+# (com os contadores do cache de filtros, acumulados no processo)
+extras_desempenho = {'cache_filtros': fonte.cache.estatisticas()} if fonte is not None else {}
+registro_desempenho = (medicoes.emitir if LOG_DESEMPENHO else medicoes.registro)(**extras_desempenho)
+if PAINEL_DESEMPENHO:
+    with st.sidebar:
+        st.markdown("### Desempenho do rerun")
+        st.metric("Tempo total", f"{registro_desempenho['total_ms']:,.0f} ms")
+        st.dataframe(pd.DataFrame(registro_desempenho['etapas']), hide_index=True, width='stretch')
+        cache_filtros = registro_desempenho.get('cache_filtros')
+        if cache_filtros and cache_filtros['taxa_acertos'] is not None:
+            st.caption(
+                f"Cache de filtros: {cache_filtros['taxa_acertos']:.0%} de acertos "
+                f"({cache_filtros['acertos']:,} acertos, {cache_filtros['falhas']:,} falhas, "
+                f"{cache_filtros['itens']}/{cache_filtros['tamanho_maximo']} itens)"
+            )
@@ -0,0 +1 @@
+"""Benchmarks da ferramenta de comparação SNISB vs SIOUT-RS com dados sintéticos."""
@@ -0,0 +1,212 @@
+"""Relatório SNISB x SIOUT sintético para os benchmarks.
+
+Mesmo esquema de 23 colunas do RELATORIO_FINAL_SNISB_SIOUT, com polígonos
+ANA em WKT compartilhados entre registros na proporção pedida (no relatório
+real, 4.214 polígonos distintos para 10.129 registros). Os polígonos são
+estrelados em torno de um centro (sempre válidos), com número de vértices
+log-normal; cada barragem fica dentro do seu polígono, ou espalhada pelo RS
+quando não tem polígono. A geração é determinística pela semente.
+
+    python -m benchmarks.dados_sinteticos 100000 [destino.csv]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import shapely
+
+COLUNAS = [
+    'CODIGO_SNISB', 'DATA_DO_CADASTRO', 'CODIGO_BARRAGEM_ENTIDADE', 'CODIGO_SIOUT', 'AUTORIZACAO_NUM',
+    'AUTORIZACAO_SIOUT', 'USO_SNISB', 'USO_SIOUT', 'EMPREENDEDOR_SNISB', 'EMPREENDEDOR_SIOUT',
+    'SITUACAO_CADASTRO_SNISB', 'SITUACAO_COMPARACAO_SIOUT', 'SITUACAO_MASSA_DAGUA', 'GID',
+    'ALTURA_MAX_FUNDACAO', 'ALTURA_MAX_NIVEL_TERRENO', 'CAPACIDADE_TOTAL', 'COROAMENTO', 'TIPO_DE_MATERIAL',
+    'LATITUDE', 'LONGITUDE', 'ID_SIOUT', 'POLIGONO_ANA',
+]
+
+# Caixa (oeste, sul, leste, norte) do Rio Grande do Sul
+CAIXA_RS = (-57.6, -33.7, -49.7, -27.1)
+
+# Polígonos distintos por registro no relatório real (4.214 de 10.129)
+PROPORCAO_POLIGONOS = 4214 / 10129
+
+# Registros sem polígono ANA e polígonos com WKT truncado (como no XLSX)
+FRACAO_SEM_POLIGONO = 0.08
+FRACAO_TRUNCADOS = 0.001
+
+# Mediana de vértices por polígono e raio mediano (graus, ~450 m)
+MEDIANA_VERTICES = 32
+RAIO_MEDIANO = 0.004
+
+# Valores categóricos e suas frequências
+SITUACOES_CADASTRO = {
+    'Selecionado para validação': 0.7,
+    'Descartado por duplicidade': 0.2,
+    'Descartado por hierarquia': 0.1,
+}
+SITUACOES_COMPARACAO = {
+    'Totalmente compatível': 0.15,
+    'Compatível parcialmente': 0.3,
+    'Compatível apenas geograficamente': 0.2,
+    'Incompatível': 0.05,
+    'Não aplicado': 0.3,
+}
+SITUACOES_MASSA = {'Compatível com polígono ANA': 0.7, 'Não aplicado': 0.3}
+USOS = {
+    'Irrigação': 0.55,
+    'Dessedentação Animal': 0.25,
+    'Abastecimento Humano': 0.08,
+    'Industrial': 0.04,
+    'Regularização de Vazão': 0.04,
+    'Outros': 0.04,
+}
+MATERIAIS = {'Terra': 0.8, 'Concreto': 0.05, 'CCR': 0.02, 'Sem Informação': 0.13}
+
+
+def _escolher(rng, opcoes, quantidade):
+    return rng.choice(list(opcoes), quantidade, p=list(opcoes.values()))
+
+
+def _com_nulos(rng, valores, fracao):
+    valores = pd.Series(valores)
+    return valores.mask(rng.random(len(valores)) < fracao)
+
+
+def gerar_poligonos(rng, quantidade, mediana_vertices=MEDIANA_VERTICES):
+    """(centros_x, centros_y, raios, wkt) de polígonos estrelados no RS"""
+    oeste, sul, leste, norte = CAIXA_RS
+    centros_x = rng.uniform(oeste, leste, quantidade)
+    centros_y = rng.uniform(sul, norte, quantidade)
+    raios = rng.lognormal(np.log(RAIO_MEDIANO), 0.8, quantidade)
+    vertices = np.clip(rng.lognormal(np.log(mediana_vertices), 0.7, quantidade), 6, 4000).astype(np.int64)
+
+    # Vértices de todos os anéis de uma vez, com os ângulos ordenados dentro de cada anel
+    anel = np.repeat(np.arange(quantidade), vertices)
+    angulos = rng.uniform(0, 2 * np.pi, len(anel))
+    angulos = angulos[np.lexsort((angulos, anel))]
+    distancias = raios[anel] * rng.uniform(0.55, 1.0, len(anel))
+    x = centros_x[anel] + distancias * np.cos(angulos) / np.cos(np.radians(centros_y[anel]))
+    y = centros_y[anel] + distancias * np.sin(angulos)
+
+    poligonos = shapely.polygons(shapely.linearrings(np.column_stack([x, y]), indices=anel))
+    return centros_x, centros_y, raios, shapely.to_wkt(poligonos, rounding_precision=8)
+
+
+def gerar_relatorio(linhas, proporcao_poligonos=PROPORCAO_POLIGONOS, fracao_sem_poligono=FRACAO_SEM_POLIGONO,
+                    mediana_vertices=MEDIANA_VERTICES, semente=0):
+    """DataFrame sintético com as 23 colunas do relatório"""
+    rng = np.random.default_rng(semente)
+
+    # Polígonos: cada polígono distinto aparece ao menos uma vez; os demais registros se
+    # concentram nos primeiros (represas grandes com várias barragens cadastradas)
+    com_poligono = rng.random(linhas) >= fracao_sem_poligono
+    total_com = int(com_poligono.sum())
+    distintos = min(max(int(round(linhas * proporcao_poligonos)), 1), total_com)
+    ids = np.concatenate([
+        np.arange(distintos),
+        (distintos * rng.random(total_com - distintos) ** 2).astype(np.int64),
+    ])
+    ids = rng.permutation(ids)
+    centros_x, centros_y, raios, wkt = gerar_poligonos(rng, distintos, mediana_vertices)
+    truncados = rng.random(distintos) < FRACAO_TRUNCADOS
+    wkt[truncados] = [texto[:len(texto) // 2] for texto in wkt[truncados]]
+
+    poligono_ana = np.full(linhas, None, dtype=object)
+    poligono_ana[com_poligono] = wkt[ids]
+
+    # Barragem dentro do seu polígono; sem polígono, em qualquer ponto do RS
+    oeste, sul, leste, norte = CAIXA_RS
+    longitudes = rng.uniform(oeste, leste, linhas)
+    latitudes = rng.uniform(sul, norte, linhas)
+    deslocamento = raios[ids] * 0.3
+    longitudes[com_poligono] = centros_x[ids] + rng.uniform(-1, 1, total_com) * deslocamento
+    latitudes[com_poligono] = centros_y[ids] + rng.uniform(-1, 1, total_com) * deslocamento
+    sem_coordenada = rng.random(linhas) < 0.002
+    latitudes[sem_coordenada] = np.nan
+
+    datas = pd.Timestamp('2000-01-01') + pd.to_timedelta(rng.integers(0, 9131, linhas), unit='D')
+    empreendedores = np.array([f'EMPREENDEDOR {i:07d}' for i in range(max(linhas // 3, 1))], dtype=object)
+    empreendedor_snisb = empreendedores[rng.integers(0, len(empreendedores), linhas)]
+    empreendedor_siout = np.where(
+        rng.random(linhas) < 0.6, empreendedor_snisb, empreendedores[rng.integers(0, len(empreendedores), linhas)]
+    )
+    anos = rng.integers(2000, 2025, linhas).astype(str)
+    numeros = rng.integers(1, 99999, linhas).astype(str)
+
+    df = pd.DataFrame({
+        'CODIGO_SNISB': rng.permutation(linhas) + 100000,
+        'DATA_DO_CADASTRO': _com_nulos(rng, datas.strftime('%Y-%m-%d'), 0.01),
+        'CODIGO_BARRAGEM_ENTIDADE': _com_nulos(rng, np.char.add('RS-', np.arange(linhas).astype(str)), 0.1),
+        'CODIGO_SIOUT': _com_nulos(rng, rng.integers(1, 10 * linhas, linhas), 0.3),
+        'AUTORIZACAO_NUM': _com_nulos(rng, np.char.add(np.char.add(numeros, '/'), anos), 0.3),
+        'AUTORIZACAO_SIOUT': _com_nulos(rng, np.char.add(np.char.add(numeros, '/'), anos), 0.4),
+        'USO_SNISB': _escolher(rng, USOS, linhas),
+        'USO_SIOUT': _com_nulos(rng, _escolher(rng, USOS, linhas), 0.3),
+        'EMPREENDEDOR_SNISB': empreendedor_snisb,
+        'EMPREENDEDOR_SIOUT': _com_nulos(rng, empreendedor_siout, 0.3),
+        'SITUACAO_CADASTRO_SNISB': _escolher(rng, SITUACOES_CADASTRO, linhas),
+        'SITUACAO_COMPARACAO_SIOUT': _escolher(rng, SITUACOES_COMPARACAO, linhas),
+        'SITUACAO_MASSA_DAGUA': _escolher(rng, SITUACOES_MASSA, linhas),
+        'GID': np.arange(1, linhas + 1),
+        'ALTURA_MAX_FUNDACAO': _com_nulos(rng, rng.lognormal(1.5, 0.5, linhas).round(2), 0.2),
+        'ALTURA_MAX_NIVEL_TERRENO': _com_nulos(rng, rng.lognormal(1.4, 0.5, linhas).round(2), 0.2),
+        'CAPACIDADE_TOTAL': _com_nulos(rng, rng.lognormal(11, 1.5, linhas).round(0), 0.2),
+        'COROAMENTO': _com_nulos(rng, rng.lognormal(1.2, 0.4, linhas).round(1), 0.3),
+        'TIPO_DE_MATERIAL': _escolher(rng, MATERIAIS, linhas),
+        'LATITUDE': latitudes.round(8),
+        'LONGITUDE': longitudes.round(8),
+        'ID_SIOUT': _com_nulos(rng, rng.integers(1, 10 * linhas, linhas), 0.3),
+        'POLIGONO_ANA': poligono_ana,
+    })
+    return df[COLUNAS]
+
+
+def alterar_relatorio(df, fracao=0.01, semente=1):
+    """Nova versão do relatório: uma fração das linhas alterada, metade disso removida e
+    outro tanto de linhas novas, com polígonos novos em parte das alteradas e das novas"""
+    rng = np.random.default_rng(semente)
+    df = df.copy()
+    quantidade = max(int(len(df) * fracao), 1)
+    alteradas = rng.choice(len(df), quantidade, replace=False)
+    coluna = df.columns.get_loc('SITUACAO_COMPARACAO_SIOUT')
+    df.iloc[alteradas, coluna] = _escolher(rng, SITUACOES_COMPARACAO, quantidade)
+    com_poligono_novo = alteradas[:quantidade // 4]
+    df.iloc[com_poligono_novo, df.columns.get_loc('POLIGONO_ANA')] = gerar_poligonos(rng, len(com_poligono_novo))[3]
+
+    removidas = rng.choice(np.setdiff1d(np.arange(len(df)), alteradas), quantidade // 2, replace=False)
+    novas = gerar_relatorio(quantidade, semente=semente).sample(quantidade // 2, random_state=semente)
+    novas['CODIGO_SNISB'] = df['CODIGO_SNISB'].max() + 1 + np.arange(len(novas))
+    novas['GID'] = df['GID'].max() + 1 + np.arange(len(novas))
+    return pd.concat([df.drop(df.index[removidas]), novas], ignore_index=True)
+
+
+def preparar_origem(diretorio, linhas, proporcao_poligonos=PROPORCAO_POLIGONOS, mediana_vertices=MEDIANA_VERTICES,
+                    semente=0):
+    """Caminho do CSV sintético, gerado só se ainda não existe no diretório"""
+    nome = f'relatorio_{linhas}_{proporcao_poligonos:.4f}_{mediana_vertices}_{semente}.csv'
+    caminho = os.path.join(diretorio, nome)
+    if not os.path.exists(caminho):
+        os.makedirs(diretorio, exist_ok=True)
+        df = gerar_relatorio(linhas, proporcao_poligonos, mediana_vertices=mediana_vertices, semente=semente)
+        temporario = caminho + '.tmp'
+        df.to_csv(temporario, index=False, encoding='utf-8-sig')
+        os.replace(temporario, caminho)
+    return caminho
+
+
+def preparar_origem_alterada(origem, fracao=0.01):
+    """Caminho da nova versão do CSV sintético (alterar_relatorio), gerada só se ainda não existe"""
+    caminho = origem[:-len('.csv')] + f'_alterado_{fracao:g}.csv'
+    if not os.path.exists(caminho):
+        df = pd.read_csv(origem, dtype={'POLIGONO_ANA': str}, encoding='utf-8-sig')
+        temporario = caminho + '.tmp'
+        alterar_relatorio(df, fracao).to_csv(temporario, index=False, encoding='utf-8-sig')
+        os.replace(temporario, caminho)
+    return caminho
+
+
+if __name__ == '__main__':
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    destino = sys.argv[2] if len(sys.argv) > 2 else f'relatorio_sintetico_{quantidade}.csv'
+    gerar_relatorio(quantidade).to_csv(destino, index=False, encoding='utf-8-sig')
+    print(f"{quantidade:,} registros gravados em {destino}")
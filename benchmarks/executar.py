@@ -0,0 +1,375 @@
+"""Benchmarks do caminho quente com relatórios sintéticos.
+
+    python -m benchmarks.executar [--linhas 10000 100000 1000000] [--fontes arquivo duckdb]
+                                  [--formatos csv parquet] [--saida resultados.json]
+                                  [--comparar resultados_anteriores.json]
+
+Para cada tamanho: gera (ou reaproveita) o CSV sintético, mede a construção,
+a atualização incremental e a leitura do snapshot e dos índices, cada combinação de filtros (sem cache e
+com cache, com a taxa de acertos do cache), a busca e a contagem das opções dos filtros, a paginação com o estilo da tabela, cada formato de exportação e
+a montagem do mapa fora do navegador (HTML embutido, modo viewport e tiles
+vetoriais). As medições vão para um JSON com o ambiente (commit e versões
+das bibliotecas), uma linha por medição, para comparar versões do código.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import metadata
+
+import pyarrow as pa
+from streamlit.elements.lib.pandas_styler_utils import marshall_styler
+from streamlit.proto.ArrowData_pb2 import ArrowData
+from streamlit_folium import generate_leaflet_string
+
+from benchmarks.dados_sinteticos import (
+    MEDIANA_VERTICES, PROPORCAO_POLIGONOS, preparar_origem, preparar_origem_alterada
+)
+from nucleo.busca import COLUNAS_BUSCA, IndiceBusca, opcoes_filtro
+from nucleo.config import MARGEM_VIEWPORT, TAMANHO_CACHE_FILTROS
+from nucleo.cores import COLUNAS_SITUACAO, mapa_css_tabela
+from nucleo.espacial import IndiceEspacial, filtro_area, filtro_poligono, filtro_raio
+from nucleo.exportacao import EXPORTADORES, medir_exportacao
+from nucleo.filtros import COLUNAS_FILTRO, CacheFiltros, IndiceFiltros
+from nucleo.fontes import abrir_fonte_arquivo
+from nucleo.mapa import (
+    ZOOM_INICIAL, adicionar_poligonos, adicionar_pontos, centro_pontos, colunas_mapa, conteudo_tiles, grupos_camadas,
+    mapa_base, pontos_mapa
+)
+from nucleo.poligonos import COLUNA_CHAVE, SEM_POLIGONO
+from nucleo.snapshot import construir_snapshot, ler_poligonos, ler_snapshot
+from nucleo.tabela import REGISTROS_POR_PAGINA, pagina_estilizada
+from nucleo.viewport import caixa_estimada, expandir_caixa
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_DADOS = os.path.join(DIRETORIO_BENCHMARKS, '.dados')
+DIRETORIO_RESULTADOS = os.path.join(DIRETORIO_BENCHMARKS, 'resultados')
+
+TAMANHOS = (10000, 100000, 1000000)
+
+# Zoom do modo viewport (no zoom de abertura do app, 7, a tela já cobre quase todo o RS)
+ZOOM_VIEWPORT = 10
+BIBLIOTECAS = ('pandas', 'numpy', 'pyarrow', 'shapely', 'duckdb', 'folium', 'streamlit', 'streamlit-folium')
+
+
+def medir(funcao, repeticoes=1):
+    """(último valor, estatísticas em ms) de `repeticoes` execuções"""
+    tempos = []
+    valor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        valor = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return valor, {
+        'ms_mediana': round(statistics.median(tempos), 3),
+        'ms_min': round(min(tempos), 3),
+        'ms_max': round(max(tempos), 3),
+        'repeticoes': repeticoes,
+    }
+
+
+def ambiente():
+    """Commit, máquina e versões das bibliotecas da execução"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRETORIO_BENCHMARKS, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versoes = {}
+    for nome in BIBLIOTECAS:
+        try:
+            versoes[nome] = metadata.version(nome)
+        except metadata.PackageNotFoundError:
+            versoes[nome] = None
+    return {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'processadores': os.cpu_count(),
+        'versoes': versoes,
+    }
+
+
+def abrir_fonte(nome, destino):
+    """Fonte de dados como o app a monta (`arquivo` ou `duckdb`)"""
+    if nome == 'duckdb':
+        from nucleo.consulta_duckdb import FonteDuckDB
+        return FonteDuckDB(destino)
+    return abrir_fonte_arquivo(destino=destino)
+
+
+def cenarios_filtros(fonte):
+    """Combinações de filtros com valores presentes nos dados: {nome: (selecoes, intervalo, espaciais)}"""
+    cadastro = fonte.opcoes('SITUACAO_CADASTRO_SNISB')
+    comparacao = fonte.opcoes('SITUACAO_COMPARACAO_SIOUT')
+    usos = fonte.opcoes('USO_SNISB')
+    codigos = fonte.opcoes('CODIGO_SNISB')
+    empreendedores = fonte.opcoes('EMPREENDEDOR_SNISB')
+    data_min, data_max = fonte.intervalo_datas()
+    periodo = (data_min + (data_max - data_min) / 2, data_max)
+
+    # Polígono de referência: o da barragem com o código mediano
+    chaves = fonte.filtrar({'CODIGO_SNISB': [codigos[len(codigos) // 2]]}).pontos([COLUNA_CHAVE])[COLUNA_CHAVE]
+    chave = int(chaves.iloc[0]) if len(chaves) else SEM_POLIGONO
+    area = filtro_area({
+        'type': 'Polygon',
+        'coordinates': [[[-54.0, -31.0], [-52.0, -31.0], [-52.0, -29.0], [-54.0, -29.0], [-54.0, -31.0]]],
+    })
+
+    return {
+        'sem_filtros': ({}, None, ()),
+        'situacao_cadastro': ({'SITUACAO_CADASTRO_SNISB': cadastro[:1]}, None, ()),
+        'comparacao_e_uso': ({'SITUACAO_COMPARACAO_SIOUT': comparacao[:2], 'USO_SNISB': usos[:1]}, None, ()),
+        'codigos_snisb': ({'CODIGO_SNISB': codigos[::max(len(codigos) // 10, 1)][:10]}, None, ()),
+        'empreendedores': ({'EMPREENDEDOR_SNISB': empreendedores[:3]}, None, ()),
+        'periodo': ({}, periodo, ()),
+        'raio_50km': ({}, None, (filtro_raio(-30.0, -53.0, 50),)),
+        'poligono_10km': ({}, None, (filtro_poligono(chave, 10),)),
+        'area_desenhada': ({}, None, (area,)),
+        'combinados': (
+            {'SITUACAO_CADASTRO_SNISB': cadastro[:1], 'SITUACAO_COMPARACAO_SIOUT': comparacao[:2]},
+            periodo,
+            (filtro_raio(-30.0, -53.0, 200),),
+        ),
+    }
+
+
+def renderizar_pagina(resultado, inicio, css):
+    """Página estilizada convertida como o st.dataframe faz (Arrow + estilos do Styler)"""
+    df_pagina, estilizada = pagina_estilizada(resultado, inicio, inicio + REGISTROS_POR_PAGINA, css)
+    pa.Table.from_pandas(df_pagina)
+    if estilizada is not df_pagina:
+        marshall_styler(ArrowData(), estilizada, 'benchmark')
+    return len(df_pagina)
+
+
+def montar_mapa(fonte, resultado, modo, zoom=ZOOM_INICIAL):
+    """HTML do mapa (o que o st_folium envia ao navegador) e contagens.
+
+    modo: 'completo' (todos os pontos e polígonos no HTML), 'viewport' (só a
+    área visível em torno do centro, no zoom dado) ou 'tiles' (conteúdo dos
+    tiles vetoriais e alguns tiles gerados).
+    """
+    poligonos = fonte.poligonos
+    colunas = colunas_mapa(fonte.colunas)
+    caixa = None
+    if modo == 'viewport':
+        centro = centro_pontos(pontos_mapa(resultado, ['LATITUDE', 'LONGITUDE']))
+        if centro is None:
+            return {'pontos': 0}
+        caixa = expandir_caixa(caixa_estimada(centro, zoom), MARGEM_VIEWPORT)
+    df_mapa = pontos_mapa(resultado, colunas, caixa)
+    if len(df_mapa) == 0:
+        return {'pontos': 0}
+    chaves = resultado.chaves_poligonos() if modo == 'viewport' else df_mapa[COLUNA_CHAVE]
+    chaves_validas, _ = poligonos.chaves_unicas(chaves)
+
+    if modo == 'tiles':
+        conteudo = conteudo_tiles(poligonos, chaves_validas, df_mapa)
+        # Tiles do RS no zoom 7 e um tile de detalhe no zoom 12
+        tiles = [(7, x, y) for x in range(42, 47) for y in range(73, 78)] + [(12, 1438, 2380)]
+        total_bytes = sum(len(conteudo.gerar(camada, *tile)) for tile in tiles for camada in ('poligonos', 'barragens'))
+        return {'pontos': len(df_mapa), 'poligonos': len(chaves_validas), 'tiles': len(tiles), 'bytes_tiles': total_bytes}
+
+    # Mesmo mapa do app (nucleo.mapa), com os grupos adicionados ao mapa base
+    mapa = mapa_base(centro_pontos(df_mapa), zoom)
+    grupo_poligonos, grupo_pontos = grupos_camadas()
+    tamanhos = adicionar_poligonos(grupo_poligonos, poligonos, chaves_validas, zoom, caixa)
+    tamanhos.update(adicionar_pontos(grupo_pontos, df_mapa))
+    grupo_poligonos.add_to(mapa)
+    grupo_pontos.add_to(mapa)
+    html = generate_leaflet_string(mapa)
+    return {'pontos': len(df_mapa), 'poligonos': len(chaves_validas), **tamanhos, 'bytes_html': len(html)}
+
+
+class Benchmark:
+    """Executa as medições de um tamanho de relatório e acumula os registros"""
+
+    def __init__(self, args, diretorio_trabalho):
+        self.args = args
+        self.diretorio_trabalho = diretorio_trabalho
+        self.medicoes = []
+
+    def registrar(self, linhas, fonte, grupo, caso, estatisticas, **extras):
+        registro = {'linhas': linhas, 'fonte': fonte, 'grupo': grupo, 'caso': caso, **estatisticas, **extras}
+        self.medicoes.append(registro)
+        detalhes = ' '.join(f'{chave}={valor}' for chave, valor in extras.items())
+        print(f"{linhas:>9,} {fonte:<8} {grupo:<11} {caso:<22} {estatisticas['ms_mediana']:>11.2f} ms  {detalhes}",
+              flush=True)
+
+    def executar(self, linhas):
+        args = self.args
+        origem = preparar_origem(args.dados, linhas, args.proporcao_poligonos, args.mediana_vertices, args.semente)
+        destino = os.path.join(self.diretorio_trabalho, f'snapshot_{linhas}')
+
+        # Carga: conversão do CSV (uma vez por versão da origem) e leitura do snapshot (a cada processo)
+        meta, estatisticas = medir(lambda: construir_snapshot(origem, destino))
+        self.registrar(linhas, '-', 'carga', 'snapshot_construcao', estatisticas,
+                       poligonos_unicos=meta['poligonos_unicos'], poligonos_validos=meta['poligonos_validos'],
+                       poligonos_truncados=meta['poligonos_truncados'], bytes_origem=os.path.getsize(origem))
+        # Atualização incremental (nova versão da origem com 1% das linhas alteradas), sobre uma cópia
+        alterada = preparar_origem_alterada(origem)
+        copia = destino + '_atualizacao'
+        shutil.copytree(destino, copia)
+        meta, estatisticas = medir(lambda: construir_snapshot(alterada, copia))
+        self.registrar(linhas, '-', 'carga', 'snapshot_atualizacao', estatisticas,
+                       poligonos_reaproveitados=meta['poligonos_reaproveitados'], **meta['alteracoes'])
+        shutil.rmtree(copia)
+        df, estatisticas = medir(lambda: ler_snapshot(destino), args.repeticoes)
+        self.registrar(linhas, '-', 'carga', 'snapshot_leitura', estatisticas)
+        poligonos, estatisticas = medir(lambda: ler_poligonos(destino), args.repeticoes)
+        self.registrar(linhas, '-', 'carga', 'poligonos_leitura', estatisticas)
+        _, estatisticas = medir(lambda: IndiceFiltros(df), args.repeticoes)
+        self.registrar(linhas, '-', 'carga', 'indice_filtros', estatisticas)
+        _, estatisticas = medir(lambda: IndiceEspacial(df['LATITUDE'], df['LONGITUDE'], poligonos), args.repeticoes)
+        self.registrar(linhas, '-', 'carga', 'indice_espacial', estatisticas)
+
+        for nome_fonte in args.fontes:
+            fonte, estatisticas = medir(lambda: abrir_fonte(nome_fonte, destino))
+            self.registrar(linhas, nome_fonte, 'carga', 'fonte', estatisticas)
+            self.executar_fonte(linhas, nome_fonte, fonte)
+
+    def executar_fonte(self, linhas, nome_fonte, fonte):
+        args = self.args
+        css = mapa_css_tabela({c: fonte.opcoes(c) for c in COLUNAS_SITUACAO if c in fonte.colunas})
+        cenarios = cenarios_filtros(fonte)
+
+        resultados = {}
+        for caso, (selecoes, intervalo, espaciais) in cenarios.items():
+            def filtrar_sem_cache():
+                fonte.cache = CacheFiltros(TAMANHO_CACHE_FILTROS)
+                resultado = fonte.filtrar(selecoes, intervalo, espaciais)
+                len(resultado)
+                return resultado
+
+            resultado, estatisticas = medir(filtrar_sem_cache, args.repeticoes)
+            self.registrar(linhas, nome_fonte, 'filtros', caso, estatisticas, resultado=len(resultado))
+            antes = fonte.cache.estatisticas()
+            _, estatisticas = medir(lambda: len(fonte.filtrar(selecoes, intervalo, espaciais)), args.repeticoes)
+            depois = fonte.cache.estatisticas()
+            acertos, falhas = depois['acertos'] - antes['acertos'], depois['falhas'] - antes['falhas']
+            self.registrar(linhas, nome_fonte, 'filtros', f'{caso}_cache', estatisticas,
+                           # Sem filtros o resultado não passa pelo cache: taxa None
+                           taxa_acertos=round(acertos / (acertos + falhas), 3) if acertos + falhas else None)
+            resultados[caso] = resultado
+
+        # Opções dos filtros: índice de busca, busca por prefixo e por trecho e contagens de cada opção sob os demais filtros
+        for coluna in COLUNAS_BUSCA:
+            opcoes = fonte.opcoes(coluna)
+            _, estatisticas = medir(lambda: IndiceBusca(opcoes))
+            self.registrar(linhas, nome_fonte, 'opcoes', f'busca_indice_{coluna.lower()}', estatisticas, opcoes=len(opcoes))
+            exemplo = str(opcoes[len(opcoes) // 2])
+            for tipo, termo in (('prefixo', exemplo[:4]), ('trecho', exemplo[-4:])):
+                sugestoes, estatisticas = medir(lambda: opcoes_filtro(fonte, coluna, termo=termo), args.repeticoes)
+                self.registrar(linhas, nome_fonte, 'opcoes', f'busca_{tipo}_{coluna.lower()}', estatisticas,
+                               sugestoes=len(sugestoes))
+
+        for caso in ('sem_filtros', 'combinados'):
+            selecoes, intervalo, espaciais = cenarios[caso]
+
+            def contar_opcoes():
+                return [fonte.contagens(c, selecoes, intervalo, espaciais) for c in COLUNAS_FILTRO if c in fonte.colunas]
+
+            def contar_opcoes_sem_cache():
+                fonte.cache = CacheFiltros(TAMANHO_CACHE_FILTROS)
+                return contar_opcoes()
+
+            _, estatisticas = medir(contar_opcoes_sem_cache, args.repeticoes)
+            self.registrar(linhas, nome_fonte, 'opcoes', f'contagens_{caso}', estatisticas)
+            _, estatisticas = medir(contar_opcoes, args.repeticoes)
+            self.registrar(linhas, nome_fonte, 'opcoes', f'contagens_{caso}_cache', estatisticas)
+
+        # Paginação: primeira, do meio e última página, com o estilo da tabela
+        for caso in ('sem_filtros', 'situacao_cadastro'):
+            resultado = resultados[caso]
+            for posicao, inicio in (('primeira', 0), ('meio', len(resultado) // 2), ('ultima', len(resultado) - 1)):
+                inicio = max(inicio - inicio % REGISTROS_POR_PAGINA, 0)
+                _, estatisticas = medir(lambda: renderizar_pagina(resultado, inicio, css), args.repeticoes)
+                self.registrar(linhas, nome_fonte, 'paginacao', f'{caso}_{posicao}', estatisticas)
+
+        # Mapa fora do navegador: modos do app, sem filtros e com filtro
+        for caso in ('sem_filtros', 'situacao_cadastro'):
+            for modo in ('completo', 'viewport', 'tiles'):
+                zoom = ZOOM_VIEWPORT if modo == 'viewport' else 7
+                contagens, estatisticas = medir(lambda: montar_mapa(fonte, resultados[caso], modo, zoom))
+                self.registrar(linhas, nome_fonte, 'mapa', f'{caso}_{modo}', estatisticas, **contagens)
+
+        # Exportação de todos os registros em cada formato
+        for formato in args.formatos:
+            caminho = os.path.join(self.diretorio_trabalho, f'exportacao_{linhas}_{nome_fonte}.{formato}')
+            if args.memoria:
+                metricas = medir_exportacao(formato, resultados['sem_filtros'], fonte.poligonos, caminho)
+                estatisticas = {'ms_mediana': metricas['segundos'] * 1000, 'ms_min': metricas['segundos'] * 1000,
+                                'ms_max': metricas['segundos'] * 1000, 'repeticoes': 1}
+                extras = {'bytes': metricas['bytes'], 'pico_memoria_mb': metricas['pico_memoria_mb']}
+            else:
+                _, estatisticas = medir(
+                    lambda: EXPORTADORES[formato](resultados['sem_filtros'], fonte.poligonos, caminho)
+                )
+                extras = {'bytes': os.path.getsize(caminho)}
+            os.remove(caminho)
+            self.registrar(linhas, nome_fonte, 'exportacao', formato, estatisticas, **extras)
+
+
+def comparar(medicoes, caminho_anterior):
+    """Imprime a razão entre as medianas atuais e as de uma execução anterior"""
+    with open(caminho_anterior, encoding='utf-8') as arquivo:
+        anteriores = {
+            (m['linhas'], m['fonte'], m['grupo'], m['caso']): m['ms_mediana'] for m in json.load(arquivo)['medicoes']
+        }
+    print(f"\nComparação com {caminho_anterior} (atual / anterior):")
+    for m in medicoes:
+        anterior = anteriores.get((m['linhas'], m['fonte'], m['grupo'], m['caso']))
+        if anterior:
+            razao = m['ms_mediana'] / anterior
+            alerta = '  <-- mais lento' if razao > 1.2 else ''
+            print(f"{m['linhas']:>9,} {m['fonte']:<8} {m['grupo']:<11} {m['caso']:<22} {razao:>6.2f}x{alerta}")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--linhas', type=int, nargs='+', default=list(TAMANHOS))
+    parser.add_argument('--fontes', nargs='+', default=['arquivo'], choices=['arquivo', 'duckdb'])
+    parser.add_argument('--formatos', nargs='+', default=list(EXPORTADORES), choices=list(EXPORTADORES))
+    parser.add_argument('--proporcao-poligonos', type=float, default=PROPORCAO_POLIGONOS,
+                        help='polígonos distintos por registro (4214/10129 no relatório real)')
+    parser.add_argument('--mediana-vertices', type=int, default=MEDIANA_VERTICES)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--memoria', action='store_true', help='pico de memória das exportações (mais lento)')
+    parser.add_argument('--dados', default=DIRETORIO_DADOS, help='diretório dos CSVs sintéticos (reaproveitados)')
+    parser.add_argument('--saida', help='arquivo JSON de resultados (padrão: benchmarks/resultados/<data>_<commit>.json)')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior')
+    args = parser.parse_args(argumentos)
+
+    info = ambiente()
+    with tempfile.TemporaryDirectory(prefix='siout_benchmark_') as diretorio_trabalho:
+        benchmark = Benchmark(args, diretorio_trabalho)
+        for linhas in args.linhas:
+            benchmark.executar(linhas)
+
+    parametros = {chave: valor for chave, valor in vars(args).items() if chave not in ('saida', 'comparar', 'dados')}
+    saida = args.saida or os.path.join(
+        DIRETORIO_RESULTADOS, f"{info['data'].replace(':', '')}_{info['commit'] or 'sem_commit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump({'ambiente': info, 'parametros': parametros, 'medicoes': benchmark.medicoes}, arquivo,
+                  ensure_ascii=False, indent=1)
+    print(f"\nResultados gravados em {saida}")
+
+    if args.comparar:
+        comparar(benchmark.medicoes, args.comparar)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
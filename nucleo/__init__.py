@@ -0,0 +1 @@
+"""Núcleo de dados da ferramenta de comparação SNISB vs SIOUT-RS."""
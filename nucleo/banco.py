@@ -0,0 +1,308 @@
+"""Fonte de dados em banco (PostgreSQL/PostGIS, ou SQLite para testes locais).
+
+Com ``SIOUT_FONTE=banco`` o app não carrega o relatório inteiro: cada
+interação vira consultas parametrizadas (contagem, página, pontos do mapa,
+lotes da exportação) com os filtros aplicados no próprio banco, sobre
+índices nas colunas de situação, nos filtros e na data de cadastro.
+
+Os polígonos ficam em uma tabela à parte, um registro por polígono único,
+com os fragmentos GeoJSON já simplificados (os mesmos do snapshot). No
+PostGIS a geometria é guardada com índice GiST e o recorte espacial usa
+``ST_Intersects``; no SQLite o mesmo recorte é feito pelas colunas de
+envelope (MINX, MINY, MAXX, MAXY).
+
+Importação do snapshot para o banco configurado em SIOUT_DATABASE_URL:
+
+    python -m nucleo.banco
+"""
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import shapely
+from sqlalchemy import DateTime, bindparam, create_engine, inspect, text
+
+from nucleo.config import EXCEDENTE_POOL_BANCO, TAMANHO_POOL_BANCO, URL_BANCO
+from nucleo.consultas import COLUNA_LINHA, FonteSQL
+from nucleo.filtros import COLUNA_DATA, COLUNAS_FILTRO
+from nucleo.poligonos import COLUNA_CHAVE, SEM_POLIGONO, TOLERANCIAS
+from nucleo.viewport import COLUNA_LATITUDE, COLUNA_LONGITUDE
+
+TABELA_DADOS = 'relatorio_snisb_siout'
+TABELA_POLIGONOS = 'poligonos_ana'
+TABELA_META = 'siout_meta'
+
+# SIRGAS 2000
+SRID = 4674
+
+# Máximo de chaves por cláusula IN nas consultas de polígonos
+LOTE_CHAVES = 5000
+
+
+def criar_motor(url=URL_BANCO):
+    """Engine SQLAlchemy com pool de conexões verificadas antes do uso"""
+    if not url:
+        raise ValueError("Defina SIOUT_DATABASE_URL (no ambiente ou no arquivo .env)")
+    opcoes = {'pool_pre_ping': True}
+    if not url.startswith('sqlite'):
+        opcoes.update(
+            pool_size=TAMANHO_POOL_BANCO,
+            max_overflow=EXCEDENTE_POOL_BANCO,
+            pool_recycle=1800,
+        )
+    return create_engine(url, **opcoes)
+
+
+def _postgis(motor):
+    return motor.dialect.name == 'postgresql'
+
+
+def _coluna_geojson(tolerancia):
+    return f'GEOJSON_{tolerancia:g}'
+
+
+def _consulta(sql, parametros):
+    """text() com listas expandidas em IN (...) e datas com o tipo DateTime do dialeto"""
+    parametros_tipados = []
+    for nome, valor in parametros.items():
+        if isinstance(valor, (list, tuple)):
+            parametros_tipados.append(bindparam(nome, expanding=True))
+        elif isinstance(valor, datetime):
+            parametros_tipados.append(bindparam(nome, type_=DateTime()))
+    return text(sql).bindparams(*parametros_tipados)
+
+
+class PoligonosBanco:
+    """Provedor de polígonos com a mesma interface do ArmazemPoligonos"""
+
+    def __init__(self, fonte):
+        self.fonte = fonte
+
+    def _por_chaves(self, colunas, chaves, condicao='', parametros=None):
+        """Linhas da tabela de polígonos para as chaves, em consultas de até LOTE_CHAVES"""
+        citar = self.fonte.citar
+        lista = ', '.join(citar(c) for c in colunas)
+        partes = []
+        for inicio in range(0, len(chaves), LOTE_CHAVES):
+            sql = (f'SELECT {lista} FROM {citar(TABELA_POLIGONOS)} '
+                   f'WHERE {citar(COLUNA_CHAVE)} IN :chaves{condicao}')
+            partes.append(self.fonte.ler(sql, {
+                'chaves': [int(c) for c in chaves[inicio:inicio + LOTE_CHAVES]],
+                **(parametros or {}),
+            }))
+        if not partes:
+            return pd.DataFrame(columns=colunas)
+        return pd.concat(partes, ignore_index=True)
+
+    def chaves_unicas(self, chaves):
+        """Chaves distintas presentes nas linhas, separadas em (válidas, inválidas)"""
+        chaves = np.unique(np.asarray(chaves, dtype=np.int64))
+        chaves = chaves[chaves != SEM_POLIGONO]
+        validas = self._por_chaves([COLUNA_CHAVE], chaves, f' AND {self.fonte.citar("VALIDO")}')
+        mascara = np.isin(chaves, validas[COLUNA_CHAVE].to_numpy(dtype=np.int64))
+        return chaves[mascara], chaves[~mascara]
+
+    def _na_caixa(self, caixa):
+        """Condição dos polígonos que intersectam a caixa (ST_Intersects no PostGIS, envelope no SQLite)"""
+        citar = self.fonte.citar
+        parametros = dict(zip(('oeste', 'sul', 'leste', 'norte'), map(float, caixa)))
+        if _postgis(self.fonte.motor):
+            return f' AND ST_Intersects(geom, ST_MakeEnvelope(:oeste, :sul, :leste, :norte, {SRID}))', parametros
+        return (f' AND {citar("MAXX")} >= :oeste AND {citar("MINX")} <= :leste'
+                f' AND {citar("MAXY")} >= :sul AND {citar("MINY")} <= :norte'), parametros
+
+    def feature_collection(self, chaves, tolerancia, caixa=None):
+        """FeatureCollection (texto JSON) dos polígonos das chaves.
+
+        caixa: (oeste, sul, leste, norte) opcional; só entram os polígonos que a intersectam.
+        """
+        coluna = _coluna_geojson(tolerancia)
+        condicao, parametros = self._na_caixa(caixa) if caixa is not None else ('', {})
+        fragmentos = self._por_chaves([coluna], np.asarray(chaves, dtype=np.int64), condicao, parametros)[coluna]
+        return '{"type": "FeatureCollection", "features": [' + ', '.join(f for f in fragmentos if f) + ']}'
+
+    def geometrias_na_caixa(self, chaves, caixa):
+        """(chaves, geometrias) dos polígonos válidos das chaves que intersectam a caixa"""
+        condicao, parametros = self._na_caixa(caixa)
+        tabela = self._por_chaves([COLUNA_CHAVE, 'WKT'], np.asarray(chaves, dtype=np.int64),
+                                  f' AND {self.fonte.citar("VALIDO")}{condicao}', parametros)
+        return tabela[COLUNA_CHAVE].to_numpy(dtype=np.int64), shapely.from_wkt(tabela['WKT'].to_numpy(dtype=object))
+
+    def geometria(self, chave):
+        """Geometria do polígono, ou None se a chave não tem polígono válido"""
+        tabela = self._por_chaves(['WKT'], [int(chave)], f' AND {self.fonte.citar("VALIDO")}')
+        if tabela.empty:
+            return None
+        return shapely.from_wkt(tabela['WKT'].iloc[0])
+
+    def wkt_por_linha(self, chaves):
+        """WKT original para cada linha (None quando não há polígono)"""
+        chaves = np.asarray(chaves, dtype=np.int64)
+        resultado = np.full(len(chaves), None, dtype=object)
+        tem_poligono = chaves != SEM_POLIGONO
+        unicas = np.unique(chaves[tem_poligono])
+        tabela = self._por_chaves([COLUNA_CHAVE, 'WKT'], unicas)
+        wkt = pd.Series(tabela['WKT'].to_numpy(dtype=object), index=tabela[COLUNA_CHAVE].to_numpy(dtype=np.int64))
+        resultado[tem_poligono] = wkt.reindex(chaves[tem_poligono]).to_numpy(dtype=object)
+        return resultado
+
+
+class FonteBanco(FonteSQL):
+    """Fonte de dados consultada no banco, sem o relatório em memória"""
+
+    def __init__(self, motor):
+        super().__init__()
+        self.motor = motor
+        self.tabela = self.citar(TABELA_DADOS)
+        self.poligonos = PoligonosBanco(self)
+        self._versao = None
+
+    def citar(self, nome):
+        """Identificador entre aspas no dialeto do banco (colunas em maiúsculas)"""
+        return self.motor.dialect.identifier_preparer.quote(nome)
+
+    def condicao_linhas(self, nome):
+        # Posições em um único parâmetro de texto: array no PostgreSQL, JSON no SQLite
+        if _postgis(self.motor):
+            return f'{self.citar(COLUNA_LINHA)} = ANY(CAST({self.marcador.format(nome)} AS BIGINT[]))'
+        return f'{self.citar(COLUNA_LINHA)} IN (SELECT value FROM json_each({self.marcador.format(nome)}))'
+
+    def parametro_linhas(self, linhas):
+        texto = ','.join(str(int(linha)) for linha in linhas)
+        return '{' + texto + '}' if _postgis(self.motor) else '[' + texto + ']'
+
+    def ler(self, sql, parametros, tamanho_lote=None):
+        """DataFrame (ou iterador de lotes) da consulta parametrizada"""
+        consulta = _consulta(sql, parametros)
+        if tamanho_lote is None:
+            with self.motor.connect() as conexao:
+                return self._tipar(pd.read_sql(consulta, conexao, params=parametros))
+        return self._ler_lotes(consulta, parametros, tamanho_lote)
+
+    def _ler_lotes(self, consulta, parametros, tamanho_lote):
+        with self.motor.connect().execution_options(stream_results=True) as conexao:
+            for lote in pd.read_sql(consulta, conexao, params=parametros, chunksize=tamanho_lote):
+                yield self._tipar(lote)
+
+    def _tipar(self, df):
+        # O SQLite devolve datas como texto
+        if COLUNA_DATA in df.columns:
+            df[COLUNA_DATA] = pd.to_datetime(df[COLUNA_DATA], errors='coerce')
+        return df
+
+    def escalar(self, sql, parametros=None):
+        """Primeiro valor da primeira linha da consulta"""
+        parametros = parametros or {}
+        with self.motor.connect() as conexao:
+            return conexao.execute(_consulta(sql, parametros), parametros).scalar()
+
+    def linhas(self, sql, parametros=None):
+        """Todas as linhas da consulta, como tuplas"""
+        parametros = parametros or {}
+        with self.motor.connect() as conexao:
+            return [tuple(linha) for linha in conexao.execute(_consulta(sql, parametros), parametros)]
+
+    def versao(self):
+        """(banco, data da importação) usada como chave de cache; None se não importado"""
+        if not inspect(self.motor).has_table(TABELA_META):
+            return None
+        importado_em = self.escalar(
+            f"SELECT {self.citar('VALOR')} FROM {self.citar(TABELA_META)} WHERE {self.citar('CHAVE')} = 'importado_em'"
+        )
+        versao = (self.motor.url.render_as_string(hide_password=True), importado_em)
+        if versao != self._versao:
+            self._versao = versao
+            self._invalidar()
+        return versao
+
+    @property
+    def colunas(self):
+        return self._memorizar('colunas', lambda: [
+            c['name'] for c in inspect(self.motor).get_columns(TABELA_DADOS) if c['name'] != COLUNA_LINHA
+        ])
+
+
+def _tabela_poligonos(armazem):
+    """Um registro por polígono único: WKT, validade, envelope e fragmentos GeoJSON"""
+    limites = shapely.bounds(armazem.geometrias)
+    tabela = pd.DataFrame({
+        COLUNA_CHAVE: np.arange(len(armazem), dtype=np.int32),
+        'WKT': armazem.wkt,
+        'VALIDO': armazem.validos,
+        'MINX': limites[:, 0],
+        'MINY': limites[:, 1],
+        'MAXX': limites[:, 2],
+        'MAXY': limites[:, 3],
+    })
+    for tolerancia in TOLERANCIAS:
+        tabela[_coluna_geojson(tolerancia)] = armazem.fragmentos(tolerancia)
+    return tabela
+
+
+def importar(motor, df, armazem, tamanho_lote=5000):
+    """Grava o relatório tipado e os polígonos no banco e cria os índices"""
+    dados = df.copy()
+    dados.insert(0, COLUNA_LINHA, np.arange(len(dados), dtype=np.int64))
+
+    citar = motor.dialect.identifier_preparer.quote
+    with motor.begin() as conexao:
+        dados.to_sql(TABELA_DADOS, conexao, if_exists='replace', index=False, chunksize=tamanho_lote)
+        _tabela_poligonos(armazem).to_sql(TABELA_POLIGONOS, conexao, if_exists='replace', index=False,
+                                          chunksize=tamanho_lote)
+
+        for coluna in [COLUNA_LINHA, COLUNA_DATA, COLUNA_CHAVE] + COLUNAS_FILTRO:
+            if coluna in dados.columns:
+                conexao.execute(text(
+                    f'CREATE INDEX {citar(f"ix_{TABELA_DADOS}_{coluna.lower()}")} '
+                    f'ON {citar(TABELA_DADOS)} ({citar(coluna)})'
+                ))
+        if {COLUNA_LATITUDE, COLUNA_LONGITUDE} <= set(dados.columns):
+            # Consultas do mapa pela área visível
+            conexao.execute(text(
+                f'CREATE INDEX {citar(f"ix_{TABELA_DADOS}_coordenadas")} '
+                f'ON {citar(TABELA_DADOS)} ({citar(COLUNA_LATITUDE)}, {citar(COLUNA_LONGITUDE)})'
+            ))
+        conexao.execute(text(
+            f'CREATE UNIQUE INDEX {citar(f"ix_{TABELA_POLIGONOS}_chave")} '
+            f'ON {citar(TABELA_POLIGONOS)} ({citar(COLUNA_CHAVE)})'
+        ))
+
+        if _postgis(motor):
+            conexao.execute(text('CREATE EXTENSION IF NOT EXISTS postgis'))
+            conexao.execute(text(f'ALTER TABLE {citar(TABELA_POLIGONOS)} ADD COLUMN geom geometry(Geometry, {SRID})'))
+            conexao.execute(text(
+                f'UPDATE {citar(TABELA_POLIGONOS)} SET geom = ST_GeomFromText({citar("WKT")}, {SRID}) '
+                f'WHERE {citar("VALIDO")}'
+            ))
+            conexao.execute(text(
+                f'CREATE INDEX {citar(f"ix_{TABELA_POLIGONOS}_geom")} ON {citar(TABELA_POLIGONOS)} USING GIST (geom)'
+            ))
+        else:
+            conexao.execute(text(
+                f'CREATE INDEX {citar(f"ix_{TABELA_POLIGONOS}_envelope")} '
+                f'ON {citar(TABELA_POLIGONOS)} ({citar("MINX")}, {citar("MAXX")}, {citar("MINY")}, {citar("MAXY")})'
+            ))
+
+        # Marca da importação: muda a versão e invalida os caches do app
+        pd.DataFrame({
+            'CHAVE': ['importado_em', 'linhas', 'poligonos_unicos'],
+            'VALOR': [pd.Timestamp.now().isoformat(), str(len(dados)), str(len(armazem))],
+        }).to_sql(TABELA_META, conexao, if_exists='replace', index=False)
+
+    if _postgis(motor):
+        with motor.connect().execution_options(isolation_level='AUTOCOMMIT') as conexao:
+            conexao.execute(text(f'ANALYZE {citar(TABELA_DADOS)}'))
+            conexao.execute(text(f'ANALYZE {citar(TABELA_POLIGONOS)}'))
+    return len(dados)
+
+
+if __name__ == '__main__':
+    from nucleo.snapshot import carregar_poligonos, carregar_snapshot
+
+    df_snapshot = carregar_snapshot()
+    if df_snapshot is None:
+        sys.exit("Dados não encontrados")
+    motor_banco = criar_motor()
+    linhas = importar(motor_banco, df_snapshot, carregar_poligonos())
+    print(f"{linhas:,} registros importados em {motor_banco.url.render_as_string(hide_password=True)}")
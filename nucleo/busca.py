@@ -0,0 +1,110 @@
+"""Busca nas opções dos filtros de alta cardinalidade (Código SNISB e Empreendedor).
+
+Em vez de enviar ao navegador milhares de opções, o seletor recebe apenas
+as já escolhidas e as que casam com o termo digitado. O índice de uma coluna
+é montado uma vez por versão dos dados: os textos normalizados (sem acentos,
+caixa e espaços repetidos) ficam ordenados para a busca por prefixo (busca
+binária) e cada trigrama aponta para as opções que o contêm, para a busca
+por trecho no meio do texto.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+COLUNAS_BUSCA = ('CODIGO_SNISB', 'EMPREENDEDOR_SNISB')
+
+# Opções enviadas ao seletor além das já escolhidas
+LIMITE_SUGESTOES = 50
+
+
+def normalizar(texto):
+    """Texto em minúsculas, sem acentos e com espaços simples"""
+    texto = str(texto)
+    if not texto.isascii():
+        texto = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', texto).strip().casefold()
+
+
+class IndiceBusca:
+    """Prefixos (textos ordenados) e trigramas das opções de uma coluna"""
+
+    def __init__(self, opcoes):
+        self.opcoes = list(opcoes)
+        normalizados = [normalizar(o) for o in self.opcoes]
+        self.ordem = np.argsort(np.array(normalizados, dtype=str), kind='stable').astype(np.int32)
+        self.ordenados = np.array(normalizados, dtype=str)[self.ordem]
+
+        self.trigramas = self._indexar_trigramas(normalizados)
+        self.normalizados = normalizados
+
+    @staticmethod
+    def _indexar_trigramas(normalizados):
+        """trigrama -> posições (ordenadas, sem repetição) das opções que o contêm"""
+        textos = pd.Series(normalizados, dtype=object)
+        comprimentos = textos.str.len().to_numpy()
+        trigramas, posicoes = [], []
+        for inicio in range(int(comprimentos.max(initial=0)) - 2):
+            vivas = np.flatnonzero(comprimentos >= inicio + 3)
+            trigramas.append(textos.iloc[vivas].str.slice(inicio, inicio + 3).to_numpy())
+            posicoes.append(vivas)
+        if not trigramas:
+            return {}
+        codigos, unicos = pd.factorize(np.concatenate(trigramas))
+        # Pares (trigrama, opção) distintos, agrupados por trigrama
+        pares = np.sort(codigos.astype(np.int64) * len(normalizados) + np.concatenate(posicoes))
+        pares = pares[np.r_[True, pares[1:] != pares[:-1]]]
+        codigos, posicoes = np.divmod(pares, len(normalizados))
+        limites = np.searchsorted(codigos, np.arange(len(unicos) + 1))
+        return {t: posicoes[limites[k]:limites[k + 1]].astype(np.int32) for k, t in enumerate(unicos)}
+
+    def _prefixo(self, termo):
+        """Posições das opções que começam com o termo (na ordem das opções)"""
+        de = np.searchsorted(self.ordenados, termo, side='left')
+        ate = np.searchsorted(self.ordenados, termo + '\U0010ffff', side='left')
+        return np.sort(self.ordem[de:ate])
+
+    def _trecho(self, termo):
+        """Posições das opções que contêm o termo (candidatas pelos trigramas, conferidas no texto)"""
+        candidatas = None
+        for trigrama in {termo[i:i + 3] for i in range(len(termo) - 2)}:
+            posicoes = self.trigramas.get(trigrama)
+            if posicoes is None:
+                return np.array([], dtype=np.int32)
+            candidatas = posicoes if candidatas is None else np.intersect1d(candidatas, posicoes, assume_unique=True)
+        return np.array([p for p in candidatas if termo in self.normalizados[p]], dtype=np.int32)
+
+    def buscar(self, termo, limite=LIMITE_SUGESTOES, presentes=None):
+        """Opções que casam com o termo: primeiro as que começam com ele, depois as que o contêm.
+
+        presentes: máscara booleana alinhada às opções (só as marcadas são devolvidas).
+        Sem termo, devolve as primeiras opções.
+        """
+        termo = normalizar(termo or '')
+        if not termo:
+            posicoes = np.arange(len(self.opcoes))
+        else:
+            posicoes = self._prefixo(termo)
+            if len(termo) >= 3:
+                posicoes = np.concatenate([posicoes, np.setdiff1d(self._trecho(termo), posicoes, assume_unique=True)])
+        if presentes is not None:
+            posicoes = posicoes[presentes[posicoes]]
+        return [self.opcoes[p] for p in posicoes[:limite]]
+
+
+def opcoes_filtro(fonte, coluna, selecionados=(), presentes=None, termo=None, limite=LIMITE_SUGESTOES):
+    """Opções de um seletor: as escolhidas mais as sugestões.
+
+    Nas COLUNAS_BUSCA as sugestões vêm da busca pelo termo (limitadas); nas
+    demais, todas as opções. presentes: máscara alinhada a ``fonte.opcoes(coluna)``
+    (por exemplo, ``fonte.contagens(...) > 0``) para restringir às opções com
+    registros nos demais filtros.
+    """
+    if coluna in COLUNAS_BUSCA:
+        sugestoes = fonte.busca(coluna).buscar(termo, limite, presentes)
+    else:
+        opcoes = fonte.opcoes(coluna)
+        sugestoes = opcoes if presentes is None else [o for o, p in zip(opcoes, presentes) if p]
+    conhecidas = set(sugestoes)
+    return [v for v in selecionados if v not in conhecidas] + sugestoes
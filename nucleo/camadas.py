@@ -0,0 +1,270 @@
+"""Camadas Leaflet que recebem dados já serializados.
+
+O ``folium.GeoJson`` padrão faz ``json.loads`` do conteúdo, aplica a
+``style_function`` em Python para cada feature e serializa tudo de novo.
+Estas camadas injetam o JSON pronto no HTML do mapa, com o estilo
+resolvido no navegador.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from folium.elements import JSCSSMixin
+from folium.plugins import MarkerCluster
+from jinja2 import Template
+
+# Campos exibidos no popup dos pontos: (coluna, rótulo)
+CAMPOS_POPUP = [
+    ('CODIGO_SNISB', 'Código'),
+    ('SITUACAO_CADASTRO_SNISB', 'Cadastro SNISB'),
+    ('SITUACAO_MASSA_DAGUA', "Massa D'água"),
+    ('SITUACAO_COMPARACAO_SIOUT', 'Comparação SIOUT'),
+]
+
+
+def _json_para_script(texto):
+    """Evita que um '</' dentro dos dados feche a tag <script> do mapa"""
+    return texto.replace('</', '<\\/')
+
+
+class CamadaGeoJSON(MacroElement):
+    """Camada GeoJSON com estilo fixo, a partir de um FeatureCollection em texto"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(
+            {{ this.dados }},
+            {
+                style: {{ this.estilo }},
+                interactive: {{ this.interativo }}
+            }
+        ).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, geojson, estilo, interativo=False):
+        super().__init__()
+        self._name = 'CamadaGeoJSON'
+        self.dados = _json_para_script(geojson)
+        self.estilo = json.dumps(estilo)
+        self.interativo = 'true' if interativo else 'false'
+
+
+def dados_pontos(df_mapa, indices_cor, paleta):
+    """Serializa os pontos em arrays colunares compactos para a CamadaPontos.
+
+    Os campos do popup são codificados como (códigos, categorias), de modo
+    que cada texto distinto aparece uma única vez no HTML.
+    """
+    campos = []
+    for coluna, rotulo in CAMPOS_POPUP:
+        if coluna in df_mapa.columns:
+            codigos, categorias = pd.factorize(df_mapa[coluna], use_na_sentinel=True)
+            categorias = [str(c) for c in categorias]
+        else:
+            codigos, categorias = np.full(len(df_mapa), -1), []
+        campos.append({'rotulo': rotulo, 'codigos': codigos.tolist(), 'categorias': categorias})
+
+    dados = {
+        'lat': df_mapa['latitude'].round(6).tolist(),
+        'lon': df_mapa['longitude'].round(6).tolist(),
+        'cor': np.asarray(indices_cor).tolist(),
+        'paleta': list(paleta),
+        'campos': campos,
+    }
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':'))
+
+
+class CamadaPontos(MacroElement):
+    """Todos os pontos das barragens em uma única camada desenhada em canvas.
+
+    Cor e popup são resolvidos no navegador a partir dos arrays colunares;
+    o HTML do popup só é montado quando o ponto é clicado.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function(dados, grupo) {
+            var renderizador = L.canvas({padding: 0.5});
+            function escapar(texto) {
+                return String(texto).replace(/[&<>"']/g, function(c) {
+                    return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+                });
+            }
+            function estilo(i) {
+                return {
+                    renderer: renderizador,
+                    radius: 5,
+                    color: '#FFFFFF',
+                    weight: 1,
+                    fill: true,
+                    fillColor: dados.paleta[dados.cor[i]],
+                    fillOpacity: 0.7
+                };
+            }
+            function popup(i) {
+                return function() {
+                    var html = "<div style='font-family: Arial; font-size: 11px; min-width: 200px;'>";
+                    for (var j = 0; j < dados.campos.length; j++) {
+                        var campo = dados.campos[j];
+                        var codigo = campo.codigos[i];
+                        html += (j ? '<br>' : '') + '<b>' + campo.rotulo + ':</b> ' +
+                            (codigo < 0 ? 'N/A' : escapar(campo.categorias[codigo]));
+                    }
+                    return html + '</div>';
+                };
+            }
+            {% if this.agrupar %}
+            // Um grupo de clusters por cor: a bolha mostra a contagem na cor da situação
+            function icone(cor) {
+                return function(cluster) {
+                    var n = cluster.getChildCount();
+                    var tamanho = n < 100 ? 30 : (n < 1000 ? 38 : 46);
+                    return L.divIcon({
+                        html: '<div style="background-color: ' + cor + '; width: ' + tamanho + 'px; height: ' + tamanho +
+                            'px; line-height: ' + tamanho + 'px; border-radius: 50%; border: 2px solid #FFFFFF; ' +
+                            'color: #FFFFFF; text-shadow: 0 0 2px #000000; font: bold 11px Arial; text-align: center; ' +
+                            'opacity: 0.85;">' + n + '</div>',
+                        className: 'cluster-barragens',
+                        iconSize: L.point(tamanho, tamanho)
+                    });
+                };
+            }
+            var marcadores = dados.paleta.map(function() { return []; });
+            for (var i = 0; i < dados.lat.length; i++) {
+                marcadores[dados.cor[i]].push(
+                    L.circleMarker([dados.lat[i], dados.lon[i]], estilo(i)).bindPopup(popup(i), {maxWidth: 250})
+                );
+            }
+            dados.paleta.forEach(function(cor, k) {
+                if (!marcadores[k].length) {
+                    return;
+                }
+                L.markerClusterGroup({
+                    iconCreateFunction: icone(cor),
+                    disableClusteringAtZoom: {{ this.zoom_sem_agrupamento }},
+                    showCoverageOnHover: false,
+                    chunkedLoading: true
+                }).addLayers(marcadores[k]).addTo(grupo);
+            });
+            {% else %}
+            for (var i = 0; i < dados.lat.length; i++) {
+                L.circleMarker([dados.lat[i], dados.lon[i]], estilo(i))
+                    .bindPopup(popup(i), {maxWidth: 250})
+                    .addTo(grupo);
+            }
+            {% endif %}
+            return grupo;
+        })({{ this.dados }}, L.featureGroup().addTo({{ this._parent.get_name() }}));
+        {% endmacro %}
+    """)
+
+    agrupar = False
+
+    def __init__(self, dados_json, zoom_sem_agrupamento=None):
+        super().__init__()
+        self._name = 'CamadaPontos'
+        self.dados = _json_para_script(dados_json)
+        self.zoom_sem_agrupamento = zoom_sem_agrupamento
+
+
+class RecursosAgrupamento(JSCSSMixin, MacroElement):
+    """Só carrega o JS/CSS do Leaflet.markercluster no mapa base.
+
+    No modo viewport as camadas chegam depois da montagem do mapa, e os
+    scripts externos só são carregados na montagem.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        {% endmacro %}
+    """)
+
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    def __init__(self):
+        super().__init__()
+        self._name = 'RecursosAgrupamento'
+
+
+class CamadaPontosAgrupados(JSCSSMixin, CamadaPontos):
+    """CamadaPontos com agrupamento no navegador (Leaflet.markercluster).
+
+    Os pontos são agrupados por cor de situação em bolhas com a contagem;
+    marcadores individuais (e seus popups) só aparecem a partir de
+    `zoom_sem_agrupamento`.
+    """
+
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    agrupar = True
+
+    def __init__(self, dados_json, zoom_sem_agrupamento):
+        super().__init__(dados_json, zoom_sem_agrupamento)
+        self._name = 'CamadaPontosAgrupados'
+
+
+class CamadaTilesVetoriais(JSCSSMixin, MacroElement):
+    """Camada de tiles vetoriais (MVT) do servidor local, via Leaflet.VectorGrid.
+
+    O HTML do mapa guarda só a URL dos tiles: o tamanho não depende da
+    quantidade de polígonos e pontos filtrados. Na camada de barragens a cor
+    vem da propriedade `cor` e o popup é montado no clique.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.vectorGrid.protobuf({{ this.url|tojson }}, {
+            rendererFactory: L.canvas.tile,
+            interactive: {{ this.interativo }},
+            maxNativeZoom: 18,
+            vectorTileLayerStyles: {
+                {% if this.camada == 'barragens' %}
+                barragens: function(propriedades) {
+                    return {
+                        radius: 5,
+                        color: '#FFFFFF',
+                        weight: 1,
+                        fill: true,
+                        fillColor: propriedades.cor,
+                        fillOpacity: 0.7
+                    };
+                }
+                {% else %}
+                {{ this.camada }}: {{ this.estilo }}
+                {% endif %}
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {% if this.camada == 'barragens' %}
+        {{ this.get_name() }}.on('click', function(e) {
+            var campos = {{ this.campos }};
+            var propriedades = e.layer.properties;
+            var html = "<div style='font-family: Arial; font-size: 11px; min-width: 200px;'>";
+            campos.forEach(function(campo, j) {
+                var valor = propriedades[campo[0]];
+                html += (j ? '<br>' : '') + '<b>' + campo[1] + ':</b> ' + (valor === undefined ? 'N/A' :
+                    String(valor).replace(/[&<>"']/g, function(c) {
+                        return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+                    }));
+            });
+            L.popup({maxWidth: 250}).setLatLng(e.latlng).setContent(html + '</div>').openOn(e.target._map);
+        });
+        {% endif %}
+        {% endmacro %}
+    """)
+
+    default_js = [
+        ('leaflet.vectorgrid', 'https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.min.js'),
+    ]
+
+    def __init__(self, url, camada, estilo=None):
+        super().__init__()
+        self._name = 'CamadaTilesVetoriais'
+        self.url = url
+        self.camada = camada
+        self.estilo = json.dumps(estilo or {})
+        self.interativo = 'true' if camada == 'barragens' else 'false'
+        self.campos = json.dumps(CAMPOS_POPUP, ensure_ascii=False)
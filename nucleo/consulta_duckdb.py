@@ -0,0 +1,129 @@
+"""Motor analítico embutido (DuckDB) sobre o snapshot Arrow.
+
+Com ``SIOUT_FONTE=duckdb`` os filtros viram um único predicado SQL
+executado pelo DuckDB diretamente sobre a tabela Arrow do snapshot
+(memory-map, sem cópia para um DataFrame por sessão), com varredura
+vetorizada em várias threads. Só a página exibida, os pontos do mapa e os
+lotes da exportação são materializados em pandas.
+
+O DuckDB é opcional: sem o pacote instalado, esta fonte não fica disponível.
+"""
+import queue
+import weakref
+from contextlib import contextmanager
+
+import numpy as np
+import pyarrow as pa
+
+from nucleo.config import CONEXOES_DUCKDB
+from nucleo.consultas import COLUNA_LINHA, FonteSQL
+from nucleo.snapshot import DIRETORIO_SNAPSHOT, ler_poligonos, ler_tabela
+
+try:
+    import duckdb
+except ImportError:  # fonte opcional
+    duckdb = None
+
+NOME_TABELA = 'relatorio'
+
+
+class FonteDuckDB(FonteSQL):
+    """Fonte consultada pelo DuckDB sobre a tabela Arrow do snapshot"""
+
+    marcador = '${}'
+
+    def __init__(self, destino=DIRETORIO_SNAPSHOT, versao=None, conexoes=CONEXOES_DUCKDB):
+        if duckdb is None:
+            raise ImportError("Instale o pacote duckdb para usar SIOUT_FONTE=duckdb")
+        super().__init__()
+        tabela = ler_tabela(destino, versao)
+        self._colunas = list(tabela.column_names)
+        self._tabela_arrow = tabela.append_column(
+            COLUNA_LINHA, pa.array(np.arange(tabela.num_rows, dtype=np.int64))
+        )
+        self.tabela = self.citar(NOME_TABELA)
+        self.poligonos = ler_poligonos(destino, versao)
+        # Conexões ociosas, reaproveitadas entre sessões (cada sessão roda numa thread própria)
+        self._livres = queue.LifoQueue(maxsize=max(conexoes, 1))
+        weakref.finalize(self, _fechar_todas, self._livres)
+
+    def _nova_conexao(self):
+        # Banco em memória; a tabela Arrow registrada é lida sem cópia
+        conexao = duckdb.connect()
+        conexao.register(NOME_TABELA, self._tabela_arrow)
+        return conexao
+
+    @contextmanager
+    def _conexao(self):
+        """Conexão emprestada do pool (a tabela registrada só é visível na própria conexão)"""
+        try:
+            conexao = self._livres.get_nowait()
+        except queue.Empty:
+            conexao = self._nova_conexao()
+        try:
+            yield conexao
+        finally:
+            try:
+                self._livres.put_nowait(conexao)
+            except queue.Full:
+                conexao.close()
+
+    def fechar(self):
+        """Fecha as conexões ociosas"""
+        _fechar_todas(self._livres)
+
+    def citar(self, nome):
+        return '"' + nome.replace('"', '""') + '"'
+
+    def condicao_linhas(self, nome):
+        # A lista chega como um único parâmetro LIST
+        return f'{self.citar(COLUNA_LINHA)} IN (SELECT UNNEST({self.marcador.format(nome)}))'
+
+    def ler(self, sql, parametros, tamanho_lote=None):
+        """DataFrame (ou iterador de lotes) da consulta parametrizada"""
+        if tamanho_lote is None:
+            with self._conexao() as conexao:
+                return conexao.execute(sql, parametros).to_arrow_table().to_pandas()
+        return self._ler_lotes(sql, parametros, tamanho_lote)
+
+    def _ler_lotes(self, sql, parametros, tamanho_lote):
+        # Conexão própria: o streaming não prende uma conexão do pool até o fim dos lotes
+        conexao = self._nova_conexao()
+        try:
+            for lote in conexao.execute(sql, parametros).to_arrow_reader(tamanho_lote):
+                yield lote.to_pandas()
+        finally:
+            conexao.close()
+
+    def escalar(self, sql, parametros=None):
+        """Primeiro valor da primeira linha da consulta"""
+        with self._conexao() as conexao:
+            return conexao.execute(sql, parametros or {}).fetchone()[0]
+
+    def linhas(self, sql, parametros=None):
+        """Todas as linhas da consulta, como tuplas"""
+        with self._conexao() as conexao:
+            return conexao.execute(sql, parametros or {}).fetchall()
+
+    def vetor(self, sql, parametros=None):
+        """Primeira coluna (inteira) da consulta como array"""
+        with self._conexao() as conexao:
+            resultado = conexao.execute(sql, parametros or {}).fetchnumpy()
+        return np.asarray(next(iter(resultado.values())), dtype=np.int64)
+
+    def ler_linhas(self, linhas, colunas):
+        # LINHA é a posição na tabela Arrow: a página sai dela direto, sem consulta
+        return self._tabela_arrow.select(colunas).take(pa.array(linhas, type=pa.int64())).to_pandas()
+
+    @property
+    def colunas(self):
+        return self._colunas
+
+
+def _fechar_todas(livres):
+    """Fecha as conexões da fila (também quando a fonte é descartada)"""
+    while True:
+        try:
+            livres.get_nowait().close()
+        except queue.Empty:
+            return
@@ -0,0 +1,263 @@
+"""Base comum das fontes consultadas em SQL (banco de dados e DuckDB).
+
+Os filtros da tabela viram um único predicado parametrizado, com a mesma
+semântica do índice em memória; contagem, página, pontos do mapa e lotes
+da exportação são consultas sobre esse predicado, na ordem original das
+linhas (coluna LINHA). As LINHA do resultado são lidas uma vez por estado
+dos filtros, e cada página busca só as suas (sem OFFSET, que percorre
+todas as linhas anteriores).
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.config import TAMANHO_CACHE_FILTROS
+from nucleo.espacial import IndiceEspacial
+from nucleo.busca import IndiceBusca
+from nucleo.filtros import COLUNA_DATA, COLUNAS_FILTRO, COLUNAS_TEXTO, CacheFiltros, chave_filtros, sem_coluna
+from nucleo.poligonos import COLUNA_CHAVE
+from nucleo.viewport import COLUNA_LATITUDE, COLUNA_LONGITUDE
+
+# Ordem original das linhas (a paginação segue a ordem do relatório)
+COLUNA_LINHA = 'LINHA'
+
+
+def predicado_filtros(selecoes, intervalo_datas, citar, marcador, valores=None):
+    """Cláusula WHERE parametrizada para os filtros da tabela.
+
+    OU dentro de cada filtro, E entre filtros e intervalo de datas inclusivo.
+    `marcador` formata o nome de um parâmetro no dialeto (':{}' ou '${}');
+    `valores(coluna, selecionados)` converte as opções escolhidas (texto, nas
+    COLUNAS_TEXTO) para os valores gravados. Retorna (sql, parametros).
+    """
+    clausulas = []
+    parametros = {}
+    if intervalo_datas is not None:
+        clausulas.append(
+            f'{citar(COLUNA_DATA)} BETWEEN {marcador.format("data_inicio")} AND {marcador.format("data_fim")}'
+        )
+        parametros['data_inicio'] = pd.Timestamp(intervalo_datas[0]).to_pydatetime()
+        parametros['data_fim'] = pd.Timestamp(intervalo_datas[1]).to_pydatetime()
+    for numero, coluna in enumerate(COLUNAS_FILTRO):
+        selecionados = selecoes.get(coluna)
+        if not selecionados:
+            continue
+        convertidos = valores(coluna, selecionados) if valores else list(selecionados)
+        if not convertidos:
+            # Nenhuma opção existe nos dados: o filtro não deixa passar nada
+            clausulas.append('1 = 0')
+            continue
+        nomes = [f'filtro_{numero}_{i}' for i in range(len(convertidos))]
+        clausulas.append(f'{citar(coluna)} IN ({", ".join(marcador.format(n) for n in nomes)})')
+        parametros.update(zip(nomes, convertidos))
+    sql = (' WHERE ' + ' AND '.join(clausulas)) if clausulas else ''
+    return sql, parametros
+
+
+class ResultadoSQL:
+    """Linhas filtradas, consultadas sob demanda"""
+
+    def __init__(self, fonte, selecoes, intervalo_datas=None, espaciais=()):
+        self.fonte = fonte
+        self.where, self.parametros = predicado_filtros(
+            selecoes, intervalo_datas, fonte.citar, fonte.marcador, fonte.valores_gravados
+        )
+        if espaciais:
+            # Linhas selecionadas pelo índice espacial em memória, passadas ao banco em um único
+            # parâmetro (não um marcador por linha, que estoura o limite do SQLite em áreas grandes)
+            linhas = fonte.cache.obter(('espaciais', tuple(sorted(espaciais))),
+                                       lambda: fonte.indice_espacial.filtrar(espaciais))
+            if len(linhas):
+                self.where = self._onde(fonte.condicao_linhas('linhas'))
+                self.parametros['linhas'] = fonte.parametro_linhas(linhas)
+            else:
+                self.where = self._onde('1 = 0')
+        self.chave = chave_filtros(selecoes, intervalo_datas, espaciais)
+        self.total = fonte.cache.obter(
+            ('contagem', self.chave),
+            lambda: fonte.escalar(f'SELECT COUNT(*) FROM {fonte.tabela}{self.where}', self.parametros)
+        )
+
+    def __len__(self):
+        return self.total
+
+    def _onde(self, condicao=None):
+        """WHERE dos filtros acrescido de uma condição extra"""
+        if condicao is None:
+            return self.where
+        return f'{self.where} AND {condicao}' if self.where else f' WHERE {condicao}'
+
+    def _selecionar(self, colunas, sufixo='', parametros=None, condicao=None):
+        lista = ', '.join(self.fonte.citar(c) for c in colunas)
+        sql = (f'SELECT {lista} FROM {self.fonte.tabela}{self._onde(condicao)} '
+               f'ORDER BY {self.fonte.citar(COLUNA_LINHA)}{sufixo}')
+        return sql, {**self.parametros, **(parametros or {})}
+
+    def posicoes(self):
+        """LINHA (ordenadas) das linhas do resultado, lidas uma vez por estado dos filtros"""
+        def calcular():
+            linha = self.fonte.citar(COLUNA_LINHA)
+            return self.fonte.vetor(f'SELECT {linha} FROM {self.fonte.tabela}{self.where} ORDER BY {linha}', self.parametros)
+        return self.fonte.cache.obter(('posicoes', self.chave), calcular)
+
+    def pagina(self, inicio, fim):
+        """Linhas [inicio, fim) do resultado, lidas pelas LINHA da página (sem OFFSET)"""
+        if not self.where:
+            # Sem filtros a página é um intervalo contíguo de LINHA
+            linhas = np.arange(inicio, max(min(fim, self.total), inicio), dtype=np.int64)
+        else:
+            linhas = self.posicoes()[inicio:fim]
+        return self.fonte.ler_linhas(linhas, self.fonte.colunas)
+
+    def pontos(self, colunas, caixa=None):
+        """Somente as colunas pedidas (para o mapa).
+
+        caixa: (oeste, sul, leste, norte) opcional; só as linhas com coordenadas dentro dela.
+        """
+        if caixa is None:
+            return self.fonte.ler(*self._selecionar(colunas))
+        citar, marcador = self.fonte.citar, self.fonte.marcador
+        condicao = (
+            f'{citar(COLUNA_LATITUDE)} BETWEEN {marcador.format("sul")} AND {marcador.format("norte")} AND '
+            f'{citar(COLUNA_LONGITUDE)} BETWEEN {marcador.format("oeste")} AND {marcador.format("leste")}'
+        )
+        parametros = dict(zip(('oeste', 'sul', 'leste', 'norte'), map(float, caixa)))
+        return self.fonte.ler(*self._selecionar(colunas, parametros=parametros, condicao=condicao))
+
+    def chaves_poligonos(self):
+        """Chaves ID_POLIGONO_ANA distintas das linhas do resultado"""
+        if COLUNA_CHAVE not in self.fonte.colunas:
+            return np.array([], dtype=np.int64)
+
+        def calcular():
+            chave = self.fonte.citar(COLUNA_CHAVE)
+            linhas = self.fonte.linhas(f'SELECT DISTINCT {chave} FROM {self.fonte.tabela}{self.where}', self.parametros)
+            return np.sort(np.array([c for (c,) in linhas if c is not None], dtype=np.int64))
+        return self.fonte.cache.obter(('chaves_poligonos', self.chave), calcular)
+
+    def contagens(self, coluna):
+        """{texto do valor: registros} da coluna nas linhas do resultado (uma consulta agrupada)"""
+        citado = self.fonte.citar(coluna)
+        linhas = self.fonte.linhas(
+            f'SELECT {citado}, COUNT(*) FROM {self.fonte.tabela}{self._onde(f"{citado} IS NOT NULL")} '
+            f'GROUP BY {citado}', self.parametros
+        )
+        return {str(v): n for v, n in linhas}
+
+    def lotes(self, tamanho):
+        """Lotes lidos em streaming (ao menos um, mesmo vazio)"""
+        sql, parametros = self._selecionar(self.fonte.colunas)
+        vazio = True
+        for lote in self.fonte.ler(sql, parametros, tamanho_lote=tamanho):
+            vazio = False
+            yield lote
+        if vazio:
+            yield self.pagina(0, 0)
+
+
+class FonteSQL:
+    """Parte comum das fontes SQL: opções, intervalo de datas, total e filtros.
+
+    As subclasses definem `tabela`, `marcador`, `citar`, `ler`, `escalar`,
+    `linhas`, `colunas` e `poligonos`.
+    """
+
+    marcador = ':{}'
+
+    def __init__(self):
+        self.cache = CacheFiltros(TAMANHO_CACHE_FILTROS)
+        self._memoria = {}
+
+    def _memorizar(self, chave, calcular):
+        """Valores estáveis enquanto os dados não mudam (colunas, total, opções)"""
+        if chave not in self._memoria:
+            self._memoria[chave] = calcular()
+        return self._memoria[chave]
+
+    def _invalidar(self):
+        """Descarta os valores memorizados e o cache de contagens"""
+        self._memoria = {}
+        self.cache = CacheFiltros(TAMANHO_CACHE_FILTROS)
+
+    @property
+    def total(self):
+        return self._memorizar('total', lambda: self.escalar(f'SELECT COUNT(*) FROM {self.tabela}'))
+
+    def _distintos(self, coluna):
+        """{texto: valor gravado} dos valores distintos (não nulos) da coluna"""
+        def calcular():
+            sql = f'SELECT DISTINCT {self.citar(coluna)} FROM {self.tabela} WHERE {self.citar(coluna)} IS NOT NULL'
+            return {str(v): v for (v,) in self.linhas(sql)}
+        return self._memorizar(('distintos', coluna), calcular)
+
+    def opcoes(self, coluna):
+        """Valores distintos (não nulos) da coluna, ordenados"""
+        def calcular():
+            distintos = self._distintos(coluna)
+            return sorted(distintos) if coluna in COLUNAS_TEXTO else sorted(distintos.values())
+        return self._memorizar(('opcoes', coluna), calcular)
+
+    def contagens(self, coluna, selecoes=None, intervalo_datas=None, espaciais=()):
+        """Registros de cada opção (alinhados a ``opcoes(coluna)``) sob os demais filtros"""
+        outras = sem_coluna(selecoes or {}, coluna)
+
+        def calcular():
+            contagens = self.filtrar(outras, intervalo_datas, espaciais).contagens(coluna)
+            return np.array([contagens.get(str(opcao), 0) for opcao in self.opcoes(coluna)], dtype=np.int64)
+
+        return self.cache.obter(('contagens', coluna, chave_filtros(outras, intervalo_datas, espaciais)), calcular)
+
+    def busca(self, coluna):
+        """Índice de busca por prefixo/trigramas das opções da coluna (montado uma vez)"""
+        return self._memorizar(('busca', coluna), lambda: IndiceBusca(self.opcoes(coluna)))
+
+    def valores_gravados(self, coluna, selecionados):
+        """Opções selecionadas convertidas para os valores gravados"""
+        if coluna not in COLUNAS_TEXTO:
+            return list(selecionados)
+        distintos = self._distintos(coluna)
+        return [distintos[str(v)] for v in selecionados if str(v) in distintos]
+
+    def intervalo_datas(self):
+        """(menor, maior) data de cadastro"""
+        def calcular():
+            data = self.citar(COLUNA_DATA)
+            menor, maior = self.linhas(f'SELECT MIN({data}), MAX({data}) FROM {self.tabela}')[0]
+            return pd.Timestamp(menor), pd.Timestamp(maior)
+        return self._memorizar('intervalo_datas', calcular)
+
+    def condicao_linhas(self, nome):
+        """Condição LINHA entre as posições passadas no parâmetro `nome` (ver parametro_linhas)"""
+        return f'{self.citar(COLUNA_LINHA)} IN {self.marcador.format(nome)}'
+
+    def parametro_linhas(self, linhas):
+        """Valor do parâmetro de condicao_linhas para as posições dadas"""
+        return [int(linha) for linha in linhas]
+
+    def vetor(self, sql, parametros=None):
+        """Primeira coluna (inteira) da consulta como array"""
+        return np.array([valor for (valor,) in self.linhas(sql, parametros)], dtype=np.int64)
+
+    def ler_linhas(self, linhas, colunas):
+        """Colunas das linhas com as LINHA dadas (ordenadas), na ordem original"""
+        lista = ', '.join(self.citar(c) for c in colunas)
+        sql = (f'SELECT {lista} FROM {self.tabela} WHERE {self.condicao_linhas("linhas")} '
+               f'ORDER BY {self.citar(COLUNA_LINHA)}')
+        return self.ler(sql, {'linhas': self.parametro_linhas(linhas)})
+
+    @property
+    def indice_espacial(self):
+        """Índice espacial das coordenadas (lidas uma vez, na ordem de LINHA)"""
+        def calcular():
+            sql = (f'SELECT {self.citar(COLUNA_LATITUDE)}, {self.citar(COLUNA_LONGITUDE)} '
+                   f'FROM {self.tabela} ORDER BY {self.citar(COLUNA_LINHA)}')
+            coordenadas = self.ler(sql, {})
+            return IndiceEspacial(
+                pd.to_numeric(coordenadas[COLUNA_LATITUDE], errors='coerce'),
+                pd.to_numeric(coordenadas[COLUNA_LONGITUDE], errors='coerce'),
+                self.poligonos
+            )
+        return self._memorizar('indice_espacial', calcular)
+
+    def filtrar(self, selecoes, intervalo_datas=None, espaciais=()):
+        """Resultado dos filtros, com a contagem em cache por estado dos filtros"""
+        return ResultadoSQL(self, selecoes, intervalo_datas, espaciais)
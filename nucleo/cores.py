@@ -0,0 +1,97 @@
+"""Classificação vetorizada das situações em cores do mapa e da tabela."""
+import numpy as np
+import pandas as pd
+
+# Hierarquia de cores dos pontos (a primeira regra que casar define a cor)
+COR_DESCARTADO = '#DC143C'
+COR_TOTALMENTE = '#28A745'
+COR_PARCIALMENTE = '#FFC107'
+COR_GEOGRAFICAMENTE = '#FF8C00'
+COR_INCOMPATIVEL = '#8B0000'
+COR_SELECIONADO = '#007BFF'
+COR_PADRAO = '#808080'
+
+PALETA_MAPA = [
+    COR_DESCARTADO,
+    COR_TOTALMENTE,
+    COR_PARCIALMENTE,
+    COR_GEOGRAFICAMENTE,
+    COR_INCOMPATIVEL,
+    COR_SELECIONADO,
+    COR_PADRAO,
+]
+INDICE_PADRAO = PALETA_MAPA.index(COR_PADRAO)
+
+# Colunas de situação coloridas na tabela
+COLUNAS_SITUACAO = ['SITUACAO_CADASTRO_SNISB', 'SITUACAO_MASSA_DAGUA', 'SITUACAO_COMPARACAO_SIOUT']
+
+CSS_POSITIVO = 'background-color: #d4edda; color: #155724'
+CSS_INTERMEDIARIO = 'background-color: #fff3cd; color: #856404'
+CSS_NEGATIVO = 'background-color: #f8d7da; color: #721c24'
+
+
+def contem(serie, termo):
+    """Máscara booleana de `termo` contido no texto em minúsculas de cada valor.
+
+    Em colunas categóricas a busca roda só sobre as categorias distintas.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = serie.cat.categories.astype(str).str.lower().str.contains(termo, regex=False)
+        # Valor extra False no final: o código -1 (nulo) aponta para ele
+        por_categoria = np.append(np.asarray(categorias, dtype=bool), False)
+        return por_categoria[serie.cat.codes.to_numpy()]
+    return serie.astype(str).str.lower().str.contains(termo, regex=False).to_numpy(dtype=bool)
+
+
+def classificar_cores_mapa(df):
+    """Índice em PALETA_MAPA para cada linha, seguindo a hierarquia de cores"""
+    vazio = pd.Series([''] * len(df), index=df.index)
+    cadastro = df['SITUACAO_CADASTRO_SNISB'] if 'SITUACAO_CADASTRO_SNISB' in df.columns else vazio
+    comparacao = df['SITUACAO_COMPARACAO_SIOUT'] if 'SITUACAO_COMPARACAO_SIOUT' in df.columns else vazio
+
+    condicoes = [
+        contem(cadastro, 'descartado'),
+        contem(comparacao, 'totalmente compatível'),
+        contem(comparacao, 'compatível parcialmente'),
+        contem(comparacao, 'compatível apenas geograficamente'),
+        contem(comparacao, 'incompatível'),
+        contem(cadastro, 'selecionado para validação'),
+    ]
+    return np.select(condicoes, list(range(len(condicoes))), default=INDICE_PADRAO).astype(np.int8)
+
+
+def css_situacao(valor):
+    """Estilo CSS da célula de acordo com o texto da situação"""
+    if pd.isna(valor):
+        return ''
+    texto = str(valor).lower()
+    if 'totalmente compatível' in texto or 'selecionado' in texto or 'compatível com polígono' in texto:
+        return CSS_POSITIVO
+    elif 'parcialmente' in texto or 'apenas geograficamente' in texto:
+        return CSS_INTERMEDIARIO
+    elif 'incompatível' in texto or 'descartado' in texto:
+        return CSS_NEGATIVO
+    return ''
+
+
+def mapa_css_tabela(opcoes_por_coluna):
+    """{coluna: {valor: css}} calculado uma vez por valor distinto das colunas de situação.
+
+    opcoes_por_coluna: {coluna: valores distintos} (colunas ausentes são ignoradas).
+    """
+    return {
+        coluna: {valor: css_situacao(valor) for valor in opcoes_por_coluna[coluna]}
+        for coluna in COLUNAS_SITUACAO
+        if coluna in opcoes_por_coluna
+    }
+
+
+def estilizar_pagina(df_pagina, css_por_coluna):
+    """Styler da página que apenas consulta as cores pré-calculadas das linhas visíveis"""
+    colunas = [c for c in css_por_coluna if c in df_pagina.columns]
+    if not colunas:
+        return df_pagina
+    return df_pagina.style.apply(
+        lambda serie: serie.astype(object).map(css_por_coluna[serie.name]).fillna(''),
+        subset=colunas
+    )
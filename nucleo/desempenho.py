@@ -0,0 +1,77 @@
+"""Instrumentação dos reruns: tempo por etapa, contagens e tamanhos de payload.
+
+Cada rerun do app cria um `Medicoes`; as etapas do caminho quente (carga,
+filtros, tabela, exportações, polígonos, pontos, mapa) são medidas com
+`etapa()`, que devolve o registro da etapa para que contagens e tamanhos
+(linhas, feições, bytes) sejam anotados durante a medição. Ao fim do rerun
+o registro completo vai para o log como uma linha JSON (logger
+``siout.desempenho``) e, com o painel ligado, para a barra lateral. Um
+fragmento reexecutado sozinho (``st.fragment``) tem um registro próprio.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('siout.desempenho')
+
+
+def configurar_log():
+    """Uma linha JSON por rerun na saída de erro, sem passar pelo formato do log do Streamlit"""
+    if not logger.handlers:
+        manipulador = logging.StreamHandler()
+        manipulador.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(manipulador)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+class Medicoes:
+    """Etapas medidas em um rerun, na ordem em que terminaram"""
+
+    def __init__(self, **contexto):
+        self.contexto = contexto
+        self.etapas = []
+        self.encerrado = False
+        self._inicio = time.perf_counter()
+
+    @contextmanager
+    def etapa(self, nome, **metricas):
+        """Mede o bloco; o dicionário devolvido recebe as métricas conhecidas só ao final"""
+        registro = {'etapa': nome, 'ms': 0.0, **metricas}
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+            self.etapas.append(registro)
+
+    def registro(self, **extras):
+        """Registro do rerun (contexto, tempo total e etapas)"""
+        self.encerrado = True
+        return {
+            'evento': 'rerun',
+            **self.contexto,
+            **extras,
+            'total_ms': round((time.perf_counter() - self._inicio) * 1000, 2),
+            'etapas': self.etapas,
+        }
+
+    def emitir(self, **extras):
+        """Grava o registro do rerun no log (uma linha JSON) e o devolve"""
+        registro = self.registro(**extras)
+        logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+        return registro
+
+
+@contextmanager
+def medicoes_do_fragmento(medicoes, nome, emitir=True):
+    """Medições do rerun em curso ou, se ele já terminou (rerun só do fragmento), um registro
+    novo, gravado no log ao fim do fragmento"""
+    if not medicoes.encerrado:
+        yield medicoes
+        return
+    proprias = Medicoes(**medicoes.contexto, fragmento=nome)
+    yield proprias
+    if emitir:
+        proprias.emitir()
@@ -0,0 +1,132 @@
+"""Índice espacial (STRtree) das barragens para os filtros espaciais.
+
+Construído uma vez por versão dos dados sobre as coordenadas das linhas;
+os polígonos ANA vêm do provedor de polígonos da fonte. Cada filtro
+consulta a árvore pela caixa envolvente e só os candidatos passam pelo
+teste exato, em vez de percorrer todas as linhas.
+
+Os filtros são tuplas (comparáveis e usadas na chave de cache):
+
+- ``('area', wkt)``: barragens dentro do retângulo/polígono desenhado;
+- ``('raio', latitude, longitude, km)``: barragens a até `km` do ponto;
+- ``('poligono', chave, km)``: barragens a até `km` do polígono ANA `chave`.
+
+Vários filtros se combinam por E, como os demais filtros da tabela.
+"""
+import math
+
+import numpy as np
+import shapely
+
+from nucleo.poligonos import COLUNA_CHAVE, SEM_POLIGONO
+
+# Quilômetros por grau de latitude (e de longitude no equador)
+KM_POR_GRAU = 111.32
+RAIO_TERRA_KM = 6371.0088
+
+
+def filtro_area(geometria):
+    """Filtro de área a partir de uma geometria GeoJSON (dict) desenhada no mapa"""
+    return ('area', shapely.to_wkt(shapely.geometry.shape(geometria), rounding_precision=6))
+
+
+def filtro_raio(latitude, longitude, km):
+    """Filtro de raio em torno de um ponto"""
+    return ('raio', round(float(latitude), 6), round(float(longitude), 6), float(km))
+
+
+def filtro_poligono(chave, km):
+    """Filtro de distância até um polígono ANA (chave ID_POLIGONO_ANA)"""
+    return ('poligono', int(chave), float(km))
+
+
+def chave_poligono_da_barragem(fonte, codigo):
+    """Chave do polígono ANA da barragem `codigo` (SEM_POLIGONO se ela não tem polígono)"""
+    chaves = fonte.filtrar({'CODIGO_SNISB': [codigo]}).pontos([COLUNA_CHAVE])[COLUNA_CHAVE]
+    chaves = chaves[chaves != SEM_POLIGONO]
+    return int(chaves.iloc[0]) if len(chaves) else SEM_POLIGONO
+
+
+def _caixa_em_km(latitude, longitude, km):
+    """Caixa (oeste, sul, leste, norte) que contém o círculo de `km` em torno do ponto"""
+    dlat = km / KM_POR_GRAU
+    # Na borda polar do círculo um grau de longitude é mais curto que no centro
+    dlon = km / (KM_POR_GRAU * max(math.cos(math.radians(min(abs(latitude) + dlat, 90.0))), 1e-6))
+    return longitude - dlon, latitude - dlat, longitude + dlon, latitude + dlat
+
+
+def _projetar(geometrias, latitude_referencia):
+    """Projeção equirretangular local em km (erro desprezível na escala de um estado)"""
+    escala = np.array([KM_POR_GRAU * math.cos(math.radians(latitude_referencia)), KM_POR_GRAU])
+    return shapely.transform(geometrias, lambda coordenadas: coordenadas * escala)
+
+
+class IndiceEspacial:
+    """STRtree sobre os pontos das barragens, com posições alinhadas às linhas"""
+
+    def __init__(self, latitudes, longitudes, poligonos):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.total = len(latitudes)
+        validas = np.isfinite(latitudes) & np.isfinite(longitudes)
+        # Posição da linha de cada ponto da árvore
+        self.posicoes = np.flatnonzero(validas)
+        self.latitudes = latitudes[validas]
+        self.longitudes = longitudes[validas]
+        self.pontos = shapely.points(self.longitudes, self.latitudes)
+        self.arvore = shapely.STRtree(self.pontos)
+        self.poligonos = poligonos
+
+    def __len__(self):
+        return len(self.pontos)
+
+    def _linhas(self, indices):
+        return np.sort(self.posicoes[indices])
+
+    def na_area(self, geometria):
+        """Linhas cujo ponto está dentro (ou na borda) da geometria"""
+        return self._linhas(self.arvore.query(geometria, predicate='intersects'))
+
+    def no_raio(self, latitude, longitude, km):
+        """Linhas a até `km` do ponto (distância de haversine)"""
+        candidatos = self.arvore.query(shapely.box(*_caixa_em_km(latitude, longitude, km)))
+        lat1, lon1 = math.radians(latitude), math.radians(longitude)
+        lat2 = np.radians(self.latitudes[candidatos])
+        lon2 = np.radians(self.longitudes[candidatos])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distancias = 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(a))
+        return self._linhas(candidatos[distancias <= km])
+
+    def perto_de(self, geometria, km):
+        """Linhas a até `km` da geometria (polígono ANA)"""
+        oeste, sul, leste, norte = shapely.bounds(geometria)
+        referencia = (sul + norte) / 2
+        # Margem em graus na latitude mais afastada do equador (a maior em longitude)
+        dlat = km / KM_POR_GRAU
+        dlon = km / (KM_POR_GRAU * max(math.cos(math.radians(max(abs(sul), abs(norte)))), 1e-6))
+        candidatos = self.arvore.query(shapely.box(oeste - dlon, sul - dlat, leste + dlon, norte + dlat))
+        if len(candidatos) == 0:
+            return self._linhas(candidatos)
+        dentro = shapely.dwithin(
+            _projetar(self.pontos[candidatos], referencia), _projetar(geometria, referencia), km
+        )
+        return self._linhas(candidatos[dentro])
+
+    def filtrar(self, filtros):
+        """Posições (ordenadas) das linhas que atendem a todos os filtros espaciais"""
+        posicoes = None
+        for filtro in filtros:
+            tipo = filtro[0]
+            if tipo == 'area':
+                parcial = self.na_area(shapely.from_wkt(filtro[1]))
+            elif tipo == 'raio':
+                parcial = self.no_raio(*filtro[1:])
+            elif tipo == 'poligono':
+                geometria = self.poligonos.geometria(filtro[1])
+                parcial = self.perto_de(geometria, filtro[2]) if geometria is not None else np.array([], dtype=np.int64)
+            else:
+                raise ValueError(f"Filtro espacial desconhecido: {tipo}")
+            posicoes = parcial if posicoes is None else np.intersect1d(posicoes, parcial, assume_unique=True)
+        if posicoes is None:
+            return np.arange(self.total)
+        return posicoes
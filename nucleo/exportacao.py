@@ -0,0 +1,308 @@
+"""Geração sob demanda dos arquivos de exportação (XLSX, CSV, JSON e Parquet).
+
+Os arquivos são escritos em lotes de linhas em um diretório temporário,
+reanexando o WKT dos polígonos lote a lote, e ficam em um cache limitado
+por (estado dos filtros, formato): baixar de novo o mesmo recorte não gera
+o arquivo outra vez.
+
+No XLSX as linhas são gravadas em modo de memória constante (XlsxWriter
+`constant_memory`, ou openpyxl `write_only` se o XlsxWriter não estiver
+instalado). Os polígonos vão para a planilha 'Poligonos', ligada à
+'Dados' pela chave ID_POLIGONO_ANA, com o WKT dividido em partes de até
+32.767 caracteres (limite de uma célula do Excel).
+
+Medição de tempo e pico de memória de uma exportação completa:
+
+    python -m nucleo.exportacao [xlsx|csv|json|parquet]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from nucleo.poligonos import COLUNA_CHAVE, SEM_POLIGONO, anexar_wkt
+
+try:
+    import xlsxwriter
+except ImportError:  # fallback para o openpyxl (já é dependência)
+    xlsxwriter = None
+
+TAMANHO_LOTE = 5000
+
+FORMATOS = {
+    'xlsx': {
+        'rotulo': 'Excel (.xlsx)',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    },
+    'csv': {
+        'rotulo': 'CSV (.csv)',
+        'mime': 'text/csv',
+    },
+    'json': {
+        'rotulo': 'JSON (.json)',
+        'mime': 'application/json',
+    },
+    'parquet': {
+        'rotulo': 'Parquet (.parquet)',
+        'mime': 'application/vnd.apache.parquet',
+    },
+}
+
+
+def _lotes(resultado, armazem, tamanho_lote=TAMANHO_LOTE):
+    """Lotes do resultado filtrado já com a coluna POLIGONO_ANA em WKT"""
+    for lote in resultado.lotes(tamanho_lote):
+        yield anexar_wkt(lote, armazem)
+
+
+def exportar_csv(resultado, armazem, caminho):
+    """CSV separado por ';' com BOM UTF-8 (abre corretamente no Excel)"""
+    with open(caminho, 'w', encoding='utf-8-sig', newline='') as arquivo:
+        for numero, lote in enumerate(_lotes(resultado, armazem)):
+            lote.to_csv(arquivo, index=False, sep=';', header=(numero == 0))
+
+
+def exportar_json(resultado, armazem, caminho):
+    """Lista de registros JSON, escrita lote a lote"""
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        if len(resultado) == 0:
+            arquivo.write('[]')
+            return
+        arquivo.write('[\n')
+        for numero, lote in enumerate(_lotes(resultado, armazem)):
+            texto = lote.to_json(orient='records', force_ascii=False, indent=2, date_format='iso')
+            # Remover os colchetes de cada lote para emendar em uma única lista
+            if numero > 0:
+                arquivo.write(',\n')
+            arquivo.write(texto.strip()[1:-1].strip('\n'))
+        arquivo.write('\n]')
+
+
+def _esquema_parquet(lote):
+    """Esquema Arrow do lote; colunas só com nulos viram texto (para servir aos lotes seguintes)"""
+    esquema = pa.Schema.from_pandas(lote, preserve_index=False)
+    for posicao, campo in enumerate(esquema):
+        if pa.types.is_null(campo.type):
+            esquema = esquema.set(posicao, campo.with_type(pa.string()))
+    return esquema
+
+
+def exportar_parquet(resultado, armazem, caminho):
+    """Parquet (zstd) com o WKT em POLIGONO_ANA, um row group por lote"""
+    escritor = None
+    try:
+        for lote in _lotes(resultado, armazem):
+            if escritor is None:
+                esquema = _esquema_parquet(lote)
+                escritor = pq.ParquetWriter(caminho, esquema, compression='zstd')
+            escritor.write_table(pa.Table.from_pandas(lote, schema=esquema, preserve_index=False))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+LIMITE_CELULA_EXCEL = 32767
+
+
+def _linhas_excel(lote):
+    """Tuplas de valores Python por linha, com nulos como None"""
+    valores = lote.astype(object)
+    return valores.where(lote.notna(), None).itertuples(index=False, name=None)
+
+
+def _partes_wkt(wkt):
+    """Divide o WKT em pedaços que cabem em uma célula do Excel"""
+    return [wkt[i:i + LIMITE_CELULA_EXCEL] for i in range(0, len(wkt), LIMITE_CELULA_EXCEL)] or ['']
+
+
+def _linhas_poligonos(chaves, armazem):
+    """Cabeçalho e linhas da planilha 'Poligonos' (apenas os polígonos exportados)"""
+    chaves = np.unique(np.asarray(chaves, dtype=np.int64))
+    chaves = chaves[chaves != SEM_POLIGONO]
+    partes = [_partes_wkt(wkt or '') for wkt in armazem.wkt_por_linha(chaves)]
+    maximo = max((len(p) for p in partes), default=1)
+    cabecalho = [COLUNA_CHAVE, 'POLIGONO_ANA'] + [f'POLIGONO_ANA_{n}' for n in range(2, maximo + 1)]
+    linhas = ([int(chave)] + p for chave, p in zip(chaves, partes))
+    return cabecalho, linhas, len(chaves)
+
+
+def _linhas_dados(resultado):
+    """Cabeçalho e linhas da planilha 'Dados', mais as chaves de polígono vistas"""
+    chaves = []
+
+    def linhas():
+        for lote in resultado.lotes(TAMANHO_LOTE):
+            if COLUNA_CHAVE in lote.columns:
+                chaves.append(np.unique(lote[COLUNA_CHAVE].to_numpy(dtype=np.int64)))
+            yield from _linhas_excel(lote)
+
+    return linhas(), chaves
+
+
+def _xlsx_xlsxwriter(resultado, armazem, caminho, colunas):
+    livro = xlsxwriter.Workbook(caminho, {
+        'constant_memory': True,
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+        'default_date_format': 'dd/mm/yyyy hh:mm:ss',
+    })
+    negrito = livro.add_format({'bold': True})
+
+    dados = livro.add_worksheet('Dados')
+    dados.write_row(0, 0, colunas, negrito)
+    linhas, chaves = _linhas_dados(resultado)
+    for numero, valores in enumerate(linhas, start=1):
+        dados.write_row(numero, 0, valores)
+
+    cabecalho, linhas, total = _linhas_poligonos(np.concatenate(chaves or [[]]), armazem)
+    poligonos = livro.add_worksheet('Poligonos')
+    poligonos.write_row(0, 0, cabecalho, negrito)
+    for numero, valores in enumerate(linhas, start=1):
+        poligonos.write_row(numero, 0, valores)
+
+    livro.close()
+    return total
+
+
+def _xlsx_openpyxl(resultado, armazem, caminho, colunas):
+    from openpyxl import Workbook
+
+    livro = Workbook(write_only=True)
+    dados = livro.create_sheet('Dados')
+    dados.append(colunas)
+    linhas, chaves = _linhas_dados(resultado)
+    for valores in linhas:
+        dados.append(valores)
+
+    cabecalho, linhas, total = _linhas_poligonos(np.concatenate(chaves or [[]]), armazem)
+    poligonos = livro.create_sheet('Poligonos')
+    poligonos.append(cabecalho)
+    for valores in linhas:
+        poligonos.append(valores)
+
+    livro.save(caminho)
+    return total
+
+
+def exportar_xlsx(resultado, armazem, caminho):
+    """Planilhas 'Dados' (com a chave do polígono) e 'Poligonos', em memória constante"""
+    colunas = list(resultado.pagina(0, 0).columns)
+    if xlsxwriter is not None:
+        return _xlsx_xlsxwriter(resultado, armazem, caminho, colunas)
+    return _xlsx_openpyxl(resultado, armazem, caminho, colunas)
+
+
+EXPORTADORES = {
+    'xlsx': exportar_xlsx,
+    'csv': exportar_csv,
+    'json': exportar_json,
+    'parquet': exportar_parquet,
+}
+
+
+class CacheExportacoes:
+    """Arquivos exportados em disco por (chave dos filtros, formato), com limite LRU"""
+
+    def __init__(self, tamanho_maximo=16):
+        self.tamanho_maximo = tamanho_maximo
+        self.diretorio = tempfile.mkdtemp(prefix='siout_exportacao_')
+        # O diretório some com o cache (ex.: descartado pelo st.cache_resource numa nova versão)
+        weakref.finalize(self, shutil.rmtree, self.diretorio, True)
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+        self._contador = 0
+        # caminho do arquivo -> tempo de geração, tamanho e linhas
+        self.metricas = {}
+
+    def caminho(self, chave, formato):
+        """Caminho do arquivo já gerado, ou None"""
+        with self._trava:
+            caminho = self._itens.get((chave, formato))
+            if caminho is not None and os.path.exists(caminho):
+                self._itens.move_to_end((chave, formato))
+                return caminho
+            return None
+
+    def gerar(self, chave, formato, resultado, armazem):
+        """Gera o arquivo do formato (se ainda não existir) e retorna o caminho"""
+        existente = self.caminho(chave, formato)
+        if existente is not None:
+            return existente
+
+        with self._trava:
+            self._contador += 1
+            destino = os.path.join(self.diretorio, f'exportacao_{self._contador}.{formato}')
+        temporario = destino + '.parcial'
+        inicio = time.perf_counter()
+        EXPORTADORES[formato](resultado, armazem, temporario)
+        os.replace(temporario, destino)
+        metricas = {
+            'segundos': time.perf_counter() - inicio,
+            'bytes': os.path.getsize(destino),
+            'linhas': len(resultado),
+        }
+
+        with self._trava:
+            # Outra sessão pode ter gerado o mesmo arquivo ao mesmo tempo: fica o mais novo
+            anterior = self._itens.pop((chave, formato), None)
+            if anterior is not None:
+                self._descartar(anterior)
+            self._itens[(chave, formato)] = destino
+            self.metricas[destino] = metricas
+            while len(self._itens) > self.tamanho_maximo:
+                _, antigo = self._itens.popitem(last=False)
+                self._descartar(antigo)
+        return destino
+
+    def _descartar(self, caminho):
+        """Remove o arquivo e suas métricas (chamado com a trava)"""
+        self.metricas.pop(caminho, None)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def medir_exportacao(formato, resultado, armazem, caminho):
+    """Tempo (s) e pico de memória alocada (MB) de uma exportação.
+
+    Usa tracemalloc, que deixa o processo todo mais lento: não usar no app.
+    """
+    tracemalloc.start()
+    try:
+        inicio = time.perf_counter()
+        EXPORTADORES[formato](resultado, armazem, caminho)
+        segundos = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'formato': formato,
+        'linhas': len(resultado),
+        'segundos': round(segundos, 3),
+        'pico_memoria_mb': round(pico / 2 ** 20, 2),
+        'bytes': os.path.getsize(caminho),
+    }
+
+
+if __name__ == '__main__':
+    from nucleo.fontes import ResultadoArquivo
+    from nucleo.snapshot import carregar_poligonos, carregar_snapshot
+
+    df_completo = carregar_snapshot()
+    if df_completo is None:
+        sys.exit("Dados não encontrados")
+    armazem_poligonos = carregar_poligonos()
+    formatos = sys.argv[1:] or list(EXPORTADORES)
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome in formatos:
+            resultado = medir_exportacao(nome, ResultadoArquivo(df_completo), armazem_poligonos, os.path.join(diretorio, f'dados.{nome}'))
+            print(resultado)
@@ -0,0 +1,224 @@
+"""Índice pré-computado para os filtros da tabela.
+
+Para cada coluna filtrável guarda, por valor distinto, o conjunto de linhas
+que o contém: um bitmap compactado (np.packbits) para valores frequentes ou
+a lista ordenada de posições para valores raros, como nos contêineres do
+Roaring. Bitmaps densos para todos os valores de colunas quase únicas
+(CODIGO_SNISB) custariam O(linhas²) de memória.
+
+Aplicar uma combinação de filtros é um OU dentro de cada filtro e um E
+entre filtros; só as posições finais são materializadas. O código de cada
+linha na coluna (``codigos``, posição do valor em ``categorias``) dá, numa
+única contagem vetorizada, quantos registros cada opção tem sob os demais
+filtros.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+COLUNA_DATA = 'DATA_DO_CADASTRO'
+COLUNAS_FILTRO = [
+    'CODIGO_SNISB',
+    'SITUACAO_CADASTRO_SNISB',
+    'SITUACAO_MASSA_DAGUA',
+    'SITUACAO_COMPARACAO_SIOUT',
+    'USO_SNISB',
+    'TIPO_DE_MATERIAL',
+    'EMPREENDEDOR_SNISB',
+]
+# Colunas comparadas pelo texto (as opções do filtro são montadas com astype(str))
+COLUNAS_TEXTO = {'CODIGO_SNISB', 'EMPREENDEDOR_SNISB'}
+
+# Um valor vira bitmap denso quando ocupa mais de 1/32 das linhas
+# (a partir daí a lista de posições int32 fica maior que o bitmap)
+FRACAO_DENSA = 1 / 32
+
+
+class IndiceFiltros:
+    """Bitmaps/listas de posições por valor e datas ordenadas para filtros por intervalo"""
+
+    def __init__(self, df):
+        self.total = len(df)
+        self.valores = {}
+        self.codigos = {}
+        self.categorias = {}
+
+        for coluna in COLUNAS_FILTRO:
+            if coluna not in df.columns:
+                continue
+            serie = df[coluna]
+            if coluna in COLUNAS_TEXTO:
+                # Nulos continuam nulos (no pandas 2 o astype(str) os transforma no texto 'nan')
+                serie = serie.astype(str).where(serie.notna())
+            self.valores[coluna] = self._indexar_coluna(coluna, serie)
+
+        self.datas_ordenadas = None
+        self.ordem_datas = None
+        if COLUNA_DATA in df.columns:
+            datas = pd.to_datetime(df[COLUNA_DATA], errors='coerce').to_numpy(dtype='datetime64[ns]')
+            validas = np.flatnonzero(~np.isnat(datas))
+            ordem = np.argsort(datas[validas], kind='stable')
+            self.ordem_datas = validas[ordem].astype(np.int64)
+            self.datas_ordenadas = datas[self.ordem_datas]
+
+    def _indexar_coluna(self, coluna, serie):
+        """valor -> bitmap compactado (uint8) ou posições ordenadas (int32)"""
+        codigos, valores = pd.factorize(serie, use_na_sentinel=True)
+        self.codigos[coluna] = codigos.astype(np.int32)
+        self.categorias[coluna] = valores
+        ordem = np.argsort(codigos, kind='stable')
+        limites = np.searchsorted(codigos[ordem], np.arange(len(valores) + 1))
+        limiar = self.total * FRACAO_DENSA
+
+        indice = {}
+        for k, valor in enumerate(valores):
+            posicoes = ordem[limites[k]:limites[k + 1]].astype(np.int32)
+            if len(posicoes) > limiar:
+                bitmap = np.zeros(self.total, dtype=bool)
+                bitmap[posicoes] = True
+                indice[valor] = np.packbits(bitmap)
+            else:
+                indice[valor] = posicoes
+        return indice
+
+    def _mascara_valores(self, coluna, selecionados):
+        """OU dos conjuntos de linhas dos valores selecionados em uma coluna"""
+        mascara = np.zeros(self.total, dtype=bool)
+        for valor in selecionados:
+            conjunto = self.valores[coluna].get(valor)
+            if conjunto is None:
+                continue
+            if conjunto.dtype == np.uint8:
+                mascara |= np.unpackbits(conjunto, count=self.total).view(bool)
+            else:
+                mascara[conjunto] = True
+        return mascara
+
+    def _mascara_datas(self, inicio, fim):
+        """Linhas com data em [inicio, fim] via busca binária nas datas ordenadas"""
+        mascara = np.zeros(self.total, dtype=bool)
+        if self.datas_ordenadas is None:
+            return mascara
+        inicio = np.datetime64(pd.Timestamp(inicio), 'ns')
+        fim = np.datetime64(pd.Timestamp(fim), 'ns')
+        de = np.searchsorted(self.datas_ordenadas, inicio, side='left')
+        ate = np.searchsorted(self.datas_ordenadas, fim, side='right')
+        mascara[self.ordem_datas[de:ate]] = True
+        return mascara
+
+    def mascara(self, selecoes, intervalo_datas=None):
+        """Máscara booleana das linhas que atendem a todos os filtros.
+
+        selecoes: {coluna: valores selecionados}; listas vazias são ignoradas.
+        intervalo_datas: (inicio, fim) inclusivo, ou None para não filtrar.
+        """
+        mascara = None
+        if intervalo_datas is not None:
+            mascara = self._mascara_datas(*intervalo_datas)
+        for coluna, selecionados in selecoes.items():
+            if not selecionados or coluna not in self.valores:
+                continue
+            parcial = self._mascara_valores(coluna, selecionados)
+            mascara = parcial if mascara is None else (mascara & parcial)
+        if mascara is None:
+            mascara = np.ones(self.total, dtype=bool)
+        return mascara
+
+    def filtrar(self, selecoes, intervalo_datas=None):
+        """Posições (ordenadas) das linhas que atendem a todos os filtros"""
+        return np.flatnonzero(self.mascara(selecoes, intervalo_datas))
+
+    def contagens(self, coluna, posicoes=None):
+        """Registros de cada valor (alinhados a ``categorias[coluna]``) entre as linhas dadas"""
+        codigos = self.codigos[coluna] if posicoes is None else self.codigos[coluna][posicoes]
+        return np.bincount(codigos[codigos >= 0], minlength=len(self.categorias[coluna]))
+
+
+def selecoes_ativas(escolhas, colunas):
+    """Seleções dos filtros de múltipla escolha com algum valor, só das colunas existentes.
+
+    escolhas: {coluna: valores escolhidos}, na ordem em que os filtros aparecem.
+    """
+    return {coluna: list(valores) for coluna, valores in escolhas.items() if valores and coluna in colunas}
+
+
+def sem_coluna(selecoes, coluna):
+    """Seleções dos demais filtros (as opções de um filtro não se restringem por ele mesmo)"""
+    return {c: valores for c, valores in selecoes.items() if c != coluna}
+
+
+def contagem_da_opcao(opcoes, contagens, valor):
+    """Contagem de `valor` (busca binária nas opções ordenadas); 0 se ele não é uma das opções"""
+    posicao = bisect.bisect_left(opcoes, valor)
+    return int(contagens[posicao]) if posicao < len(opcoes) and opcoes[posicao] == valor else 0
+
+
+def intervalo_ativo(inicio, fim, data_min, data_max):
+    """(inicio, fim) como Timestamp, ou None se o período escolhido cobre todas as datas"""
+    inicio, fim = pd.to_datetime(inicio), pd.to_datetime(fim)
+    if inicio > data_min or fim < data_max:
+        return inicio, fim
+    return None
+
+
+def chave_filtros(selecoes, intervalo_datas=None, espaciais=()):
+    """Chave canônica do estado dos filtros: seleções ordenadas por coluna + intervalo + filtros espaciais.
+
+    Seleções vazias são descartadas, de modo que estados equivalentes
+    (mesmos valores em outra ordem, filtros limpos) geram a mesma chave.
+    """
+    itens = tuple(sorted(
+        (coluna, tuple(sorted({str(v) for v in selecionados})))
+        for coluna, selecionados in selecoes.items()
+        if selecionados
+    ))
+    if intervalo_datas is not None:
+        intervalo_datas = tuple(pd.Timestamp(d).isoformat() for d in intervalo_datas)
+    return itens, intervalo_datas, tuple(sorted(espaciais))
+
+
+class CacheFiltros:
+    """Cache LRU limitado de resultados dos filtros (posições ou contagens), compartilhado entre sessões"""
+
+    def __init__(self, tamanho_maximo=128):
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, calcular):
+        """Retorna o valor em cache para a chave ou o calcula com `calcular()`"""
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+
+        valor = calcular()
+        # Arrays compartilhados entre sessões: somente leitura
+        if isinstance(valor, np.ndarray):
+            valor.setflags(write=False)
+
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+        return valor
+
+    def estatisticas(self):
+        """Contadores de acertos/falhas, taxa de acertos e ocupação do cache"""
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acertos': round(self.acertos / consultas, 3) if consultas else None,
+                'itens': len(self._itens),
+                'tamanho_maximo': self.tamanho_maximo,
+            }
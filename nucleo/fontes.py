@@ -0,0 +1,205 @@
+"""Fonte de dados do app a partir do snapshot local (DataFrame em memória).
+
+O app conversa com a fonte apenas por esta interface, implementada também
+pela fonte em banco de dados (``nucleo.banco.FonteBanco``):
+
+- ``colunas``, ``total``, ``opcoes(coluna)`` e ``intervalo_datas()``;
+- ``contagens(coluna, selecoes, intervalo_datas, espaciais)``: registros de
+  cada opção sob os demais filtros, e ``busca(coluna)``: índice de busca
+  (``nucleo.busca``) das opções;
+- ``filtrar(selecoes, intervalo_datas, espaciais)``: resultado com ``len()``,
+  ``pagina(inicio, fim)``, ``pontos(colunas, caixa)``, ``chaves_poligonos()``
+  e ``lotes(tamanho)``;
+- ``poligonos``: provedor com ``chaves_unicas``, ``feature_collection`` e
+  ``wkt_por_linha`` (o ``ArmazemPoligonos`` no caso do snapshot).
+
+A fonte do snapshot é carregada uma vez por processo (``abrir_fonte_arquivo``)
+e compartilhada por todas as sessões: as conversões acontecem na carga, os
+resultados são posições e visões (Copy-on-Write do pandas) e os arrays dos
+índices e do armazém ficam somente leitura, então uma sessão nova não copia
+nada.
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.busca import COLUNAS_BUSCA, IndiceBusca
+from nucleo.config import DIRETORIO_SNAPSHOT, TAMANHO_CACHE_FILTROS
+from nucleo.espacial import IndiceEspacial
+from nucleo.filtros import COLUNA_DATA, COLUNAS_FILTRO, COLUNAS_TEXTO, CacheFiltros, IndiceFiltros, chave_filtros, sem_coluna
+from nucleo.poligonos import COLUNA_CHAVE
+from nucleo.snapshot import ler_poligonos, ler_snapshot
+from nucleo.viewport import COLUNA_LATITUDE, COLUNA_LONGITUDE, dentro_da_caixa
+
+# O DataFrame é compartilhado entre as sessões: sem Copy-on-Write (padrão só a partir do
+# pandas 3), uma escrita em um recorte poderia alterar os dados de todas
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
+
+class ResultadoArquivo:
+    """Linhas filtradas do DataFrame, guardadas apenas como posições"""
+
+    def __init__(self, df, posicoes=None):
+        self.df = df
+        # None: todas as linhas (sem filtros)
+        self.posicoes = posicoes
+
+    def __len__(self):
+        return len(self.df) if self.posicoes is None else len(self.posicoes)
+
+    def pagina(self, inicio, fim):
+        """Linhas [inicio, fim) do resultado"""
+        if self.posicoes is None:
+            return self.df.iloc[inicio:fim]
+        return self.df.iloc[self.posicoes[inicio:fim]]
+
+    def pontos(self, colunas, caixa=None):
+        """Somente as colunas pedidas (para o mapa), sem copiar as demais.
+
+        caixa: (oeste, sul, leste, norte) opcional; só as linhas com coordenadas dentro dela.
+        """
+        indices = self.df.columns.get_indexer(colunas)
+        if caixa is None:
+            if self.posicoes is None:
+                return self.df.iloc[:, indices]
+            return self.df.iloc[self.posicoes, indices]
+        posicoes = np.arange(len(self.df)) if self.posicoes is None else self.posicoes
+        latitudes = self.df[COLUNA_LATITUDE].to_numpy(np.float64, na_value=np.nan)[posicoes]
+        longitudes = self.df[COLUNA_LONGITUDE].to_numpy(np.float64, na_value=np.nan)[posicoes]
+        return self.df.iloc[posicoes[dentro_da_caixa(latitudes, longitudes, caixa)], indices]
+
+    def chaves_poligonos(self):
+        """Chaves ID_POLIGONO_ANA distintas das linhas do resultado"""
+        if COLUNA_CHAVE not in self.df.columns:
+            return np.array([], dtype=np.int64)
+        chaves = self.df[COLUNA_CHAVE].to_numpy()
+        return np.unique(chaves if self.posicoes is None else chaves[self.posicoes])
+
+    def lotes(self, tamanho):
+        """Fatias sucessivas do resultado (ao menos uma, mesmo vazia)"""
+        if len(self) == 0:
+            yield self.df.iloc[:0]
+            return
+        for inicio in range(0, len(self), tamanho):
+            yield self.pagina(inicio, inicio + tamanho)
+
+
+class FonteArquivo:
+    """Fonte sobre o DataFrame do snapshot, com índice e cache de filtros"""
+
+    def __init__(self, df, poligonos, indice, cache, indice_espacial=None):
+        self.df = df
+        self.poligonos = poligonos
+        self.indice = indice
+        self.cache = cache
+        self.indice_espacial = indice_espacial
+        self._intervalo_datas = None
+        # Por coluna: opções ordenadas e, nas indexadas, a ordem das categorias do índice
+        self._opcoes = {}
+        self._ordem_opcoes = {}
+        self._buscas = {}
+
+    @property
+    def colunas(self):
+        return list(self.df.columns)
+
+    @property
+    def total(self):
+        return len(self.df)
+
+    def opcoes(self, coluna):
+        """Valores distintos (não nulos) da coluna, ordenados (calculados uma vez)"""
+        if coluna not in self._opcoes:
+            if coluna in self.indice.categorias:
+                categorias = self.indice.categorias[coluna].tolist()
+                ordem = sorted(range(len(categorias)), key=categorias.__getitem__)
+                self._ordem_opcoes[coluna] = np.array(ordem, dtype=np.int64)
+                self._opcoes[coluna] = [categorias[i] for i in ordem]
+            else:
+                serie = self.df[coluna].dropna()
+                if coluna in COLUNAS_TEXTO:
+                    serie = serie.astype(str)
+                self._opcoes[coluna] = sorted(serie.unique().tolist())
+        return self._opcoes[coluna]
+
+    def contagens(self, coluna, selecoes=None, intervalo_datas=None, espaciais=()):
+        """Registros de cada opção (alinhados a ``opcoes(coluna)``) sob os demais filtros.
+
+        Só para as colunas do índice de filtros; a seleção da própria coluna é ignorada.
+        """
+        outras = sem_coluna(selecoes or {}, coluna)
+        self.opcoes(coluna)
+
+        def calcular():
+            posicoes = self.filtrar(outras, intervalo_datas, espaciais).posicoes
+            return self.indice.contagens(coluna, posicoes)[self._ordem_opcoes[coluna]]
+
+        return self.cache.obter(('contagens', coluna, chave_filtros(outras, intervalo_datas, espaciais)), calcular)
+
+    def busca(self, coluna):
+        """Índice de busca por prefixo/trigramas das opções da coluna (montado uma vez)"""
+        if coluna not in self._buscas:
+            self._buscas[coluna] = IndiceBusca(self.opcoes(coluna))
+        return self._buscas[coluna]
+
+    def intervalo_datas(self):
+        """(menor, maior) data de cadastro (a coluna já vem tipada do snapshot)"""
+        if self._intervalo_datas is None:
+            datas = pd.to_datetime(self.df[COLUNA_DATA], errors='coerce')
+            self._intervalo_datas = (datas.min(), datas.max())
+        return self._intervalo_datas
+
+    def filtrar(self, selecoes, intervalo_datas=None, espaciais=()):
+        """Resultado dos filtros; reruns com o mesmo estado reutilizam o cache.
+
+        espaciais: filtros de ``nucleo.espacial``, combinados por E com os demais.
+        """
+        if not any(selecoes.values()) and intervalo_datas is None and not espaciais:
+            return ResultadoArquivo(self.df)
+
+        def calcular():
+            posicoes = self.indice.filtrar(selecoes, intervalo_datas)
+            if espaciais:
+                posicoes = np.intersect1d(posicoes, self.indice_espacial.filtrar(espaciais), assume_unique=True)
+            return posicoes
+
+        posicoes = self.cache.obter(chave_filtros(selecoes, intervalo_datas, espaciais), calcular)
+        return ResultadoArquivo(self.df, posicoes)
+
+
+def _somente_leitura(arrays):
+    """Impede escritas acidentais nos arrays compartilhados entre sessões"""
+    for array in arrays:
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False
+
+
+def abrir_fonte_arquivo(versao=None, destino=DIRETORIO_SNAPSHOT, tamanho_cache=TAMANHO_CACHE_FILTROS):
+    """Fonte completa de uma versão do snapshot: DataFrame, polígonos, índices e cache de filtros"""
+    df = ler_snapshot(destino, versao)
+    poligonos = ler_poligonos(destino, versao)
+    indice = IndiceFiltros(df)
+    # Sem coordenadas os filtros espaciais ficam indisponíveis
+    indice_espacial = None
+    if COLUNA_LATITUDE in df.columns and COLUNA_LONGITUDE in df.columns:
+        indice_espacial = IndiceEspacial(df[COLUNA_LATITUDE], df[COLUNA_LONGITUDE], poligonos)
+    fonte = FonteArquivo(df, poligonos, indice, CacheFiltros(tamanho_cache), indice_espacial)
+    if COLUNA_DATA in df.columns:
+        fonte.intervalo_datas()
+    for coluna in COLUNAS_FILTRO:
+        if coluna in df.columns:
+            fonte.opcoes(coluna)
+    for coluna in COLUNAS_BUSCA:
+        if coluna in df.columns:
+            fonte.busca(coluna)
+
+    if indice_espacial is not None:
+        _somente_leitura([
+            indice_espacial.posicoes, indice_espacial.latitudes, indice_espacial.longitudes, indice_espacial.pontos
+        ])
+    _somente_leitura([
+        poligonos.wkt, poligonos.wkb, poligonos.validos, indice.ordem_datas, indice.datas_ordenadas,
+        *(conjunto for valores in indice.valores.values() for conjunto in valores.values()),
+        *indice.codigos.values(),
+    ])
+    return fonte
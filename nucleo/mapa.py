@@ -0,0 +1,173 @@
+"""Montagem do mapa (Folium) sem depender do Streamlit.
+
+O app decide apenas o que exibir (área visível, filtros, modo de tiles) e
+entrega ao ``st_folium`` o que sai daqui: o mapa base e os grupos de
+camadas. As funções que preenchem os grupos devolvem contagens e tamanhos
+dos dados enviados ao navegador, usados pela instrumentação e pelos
+benchmarks, que montam o mesmo mapa fora do navegador.
+"""
+import folium
+import shapely
+from folium.plugins import Draw
+
+from nucleo.camadas import (
+    CAMPOS_POPUP, CamadaGeoJSON, CamadaPontos, CamadaPontosAgrupados, CamadaTilesVetoriais, dados_pontos
+)
+from nucleo.config import LIMIAR_AGRUPAMENTO, ZOOM_SEM_AGRUPAMENTO
+from nucleo.cores import PALETA_MAPA, classificar_cores_mapa
+from nucleo.poligonos import COLUNA_CHAVE, tolerancia_para_zoom
+from nucleo.tiles import ConteudoTiles
+from nucleo.viewport import COLUNA_LATITUDE, COLUNA_LONGITUDE, coordenadas_validas
+
+# Zoom com que o mapa é aberto
+ZOOM_INICIAL = 7
+
+URL_SATELITE = 'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}'
+
+ESTILO_POLIGONOS = {
+    'fillColor': '#4A90E2',
+    'color': '#2E5C8A',
+    'weight': 1,
+    'fillOpacity': 0.45
+}
+
+# Contorno dos filtros espaciais de área e de raio
+ESTILO_AREA = {'color': '#FFFFFF', 'weight': 2, 'dashArray': '6 4', 'fill': False}
+
+# Controle de camadas mais transparente
+CSS_CONTROLE_CAMADAS = """
+<style>
+.leaflet-control-layers {
+    background-color: rgba(255, 255, 255, 0.85) !important;
+    border: 1px solid grey !important;
+    border-radius: 5px !important;
+}
+.leaflet-control-layers-expanded {
+    padding: 6px 8px 6px 6px !important;
+}
+</style>
+"""
+
+LEGENDA_HTML = """
+<div style="position: fixed;
+            bottom: 30px; right: 30px; width: 200px;
+            background-color: rgba(255, 255, 255, 0.9); z-index:9999;
+            border:1px solid grey; border-radius: 5px;
+            padding: 8px; font-size: 10px;
+            font-family: Arial;">
+    <h4 style="margin: 0 0 6px 0; text-align: center; font-size: 11px;">Legenda</h4>
+    <p style="margin: 3px 0;"><span style="background-color: #28A745; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Totalmente Compatível</p>
+    <p style="margin: 3px 0;"><span style="background-color: #FFC107; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Parcialmente Compatível</p>
+    <p style="margin: 3px 0;"><span style="background-color: #FF8C00; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Compatível Geo</p>
+    <p style="margin: 3px 0;"><span style="background-color: #8B0000; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Incompatível</p>
+    <p style="margin: 3px 0;"><span style="background-color: #DC143C; width: 12px; height: 12px; display: inline-block; border-radius: 50%; border: 1px solid white;"></span> Descartado</p>
+    <hr style="margin: 6px 0; border: 0; border-top: 1px solid #ccc;">
+    <p style="margin: 3px 0;"><span style="background-color: #4A90E2; width: 12px; height: 12px; display: inline-block; border: 1px solid #2E5C8A;"></span> Polígonos ANA</p>
+</div>
+"""
+
+
+def colunas_mapa(colunas):
+    """Colunas lidas para o mapa: coordenadas, campos do popup e chave do polígono ANA"""
+    return [COLUNA_LATITUDE, COLUNA_LONGITUDE] + [
+        coluna for coluna, _ in CAMPOS_POPUP + [(COLUNA_CHAVE, None)] if coluna in colunas
+    ]
+
+
+def pontos_mapa(resultado, colunas, caixa=None):
+    """Pontos do resultado com coordenadas válidas (colunas latitude/longitude em minúsculas)"""
+    return coordenadas_validas(resultado.pontos(colunas, caixa=caixa))
+
+
+def centro_pontos(df_mapa):
+    """(latitude, longitude) média dos pontos, ou None se não há pontos"""
+    if len(df_mapa) == 0:
+        return None
+    return df_mapa['latitude'].mean(), df_mapa['longitude'].mean()
+
+
+def mapa_base(centro, zoom=ZOOM_INICIAL):
+    """Mapa com satélite Esri (base fixa, fora do controle), legenda e ferramenta de desenho"""
+    mapa = folium.Map(location=list(centro), zoom_start=zoom, tiles=None)
+    folium.TileLayer(
+        tiles=URL_SATELITE,
+        attr='Esri World Imagery',
+        name='Satélite Esri',
+        overlay=False,
+        control=False
+    ).add_to(mapa)
+
+    # Ferramenta de desenho (retângulo/polígono) para o filtro de área
+    Draw(
+        draw_options={
+            'polyline': False,
+            'circle': False,
+            'marker': False,
+            'circlemarker': False,
+            'rectangle': True,
+            'polygon': True
+        },
+        edit_options={'edit': False}
+    ).add_to(mapa)
+
+    mapa.get_root().html.add_child(folium.Element(CSS_CONTROLE_CAMADAS))
+    mapa.get_root().html.add_child(folium.Element(LEGENDA_HTML))
+    return mapa
+
+
+def grupos_camadas():
+    """Grupos controláveis do mapa: (polígonos ANA, pontos das barragens)"""
+    return (
+        folium.FeatureGroup(name='🗺️ Polígonos ANA', show=True),
+        folium.FeatureGroup(name='🔵 Pontos das Barragens', show=True),
+    )
+
+
+def adicionar_poligonos(grupo, poligonos, chaves, zoom, caixa=None):
+    """Polígonos das chaves como GeoJSON já simplificado para o zoom (só os da caixa, se houver)"""
+    if len(chaves) == 0:
+        return {'bytes_geojson': 0}
+    geojson = poligonos.feature_collection(chaves, tolerancia_para_zoom(zoom), caixa)
+    CamadaGeoJSON(geojson, estilo=ESTILO_POLIGONOS).add_to(grupo)
+    return {'bytes_geojson': len(geojson)}
+
+
+def adicionar_pontos(grupo, df_mapa):
+    """Pontos coloridos pela hierarquia de situações; agrupados por cor acima do limiar"""
+    if len(df_mapa) == 0:
+        return {'bytes_json': 0}
+    dados_json = dados_pontos(df_mapa, classificar_cores_mapa(df_mapa), PALETA_MAPA)
+    if len(df_mapa) > LIMIAR_AGRUPAMENTO:
+        CamadaPontosAgrupados(dados_json, ZOOM_SEM_AGRUPAMENTO).add_to(grupo)
+    else:
+        CamadaPontos(dados_json).add_to(grupo)
+    return {'bytes_json': len(dados_json)}
+
+
+def conteudo_tiles(poligonos, chaves, df_mapa):
+    """Conteúdo dos tiles vetoriais de um estado de filtros (polígonos e pontos coloridos)"""
+    return ConteudoTiles.de_mapa(
+        poligonos, chaves, df_mapa, classificar_cores_mapa(df_mapa), PALETA_MAPA, [coluna for coluna, _ in CAMPOS_POPUP]
+    )
+
+
+def adicionar_tiles(grupo_poligonos, grupo_pontos, url_poligonos, url_pontos):
+    """Camadas de tiles vetoriais (o HTML leva só as URLs)"""
+    CamadaTilesVetoriais(url_poligonos, 'poligonos', estilo={'fill': True, **ESTILO_POLIGONOS}).add_to(grupo_poligonos)
+    CamadaTilesVetoriais(url_pontos, 'barragens').add_to(grupo_pontos)
+
+
+def grupo_area(filtro_area=None, raio=None):
+    """Contorno da área desenhada e do círculo do filtro de raio, ou None se não há nenhum.
+
+    raio: (latitude, longitude, km) opcional.
+    """
+    if not filtro_area and raio is None:
+        return None
+    grupo = folium.FeatureGroup(name='✏️ Área selecionada', show=True)
+    if filtro_area:
+        CamadaGeoJSON(shapely.to_geojson(shapely.from_wkt(filtro_area[1])), estilo=ESTILO_AREA).add_to(grupo)
+    if raio is not None:
+        latitude, longitude, km = raio
+        folium.Circle(location=[latitude, longitude], radius=km * 1000, **ESTILO_AREA).add_to(grupo)
+    return grupo
@@ -0,0 +1,166 @@
+"""Codificação de Mapbox Vector Tiles (especificação 2.1) sem dependências.
+
+Só o necessário para as camadas do mapa: pontos e polígonos com
+propriedades texto/inteiro. As geometrias chegam já nas coordenadas do
+tile (0..extent, eixo y para baixo) e são arredondadas para inteiros.
+O protobuf é escrito à mão (varints e campos delimitados).
+"""
+import math
+
+import numpy as np
+import shapely
+
+EXTENT = 4096
+
+# Tipos de geometria do MVT
+PONTO = 1
+POLIGONO = 3
+
+# Comandos de geometria
+MOVER = 1
+LINHA = 2
+FECHAR = 7
+
+
+def _varint(valor):
+    saida = bytearray()
+    while True:
+        byte = valor & 0x7F
+        valor >>= 7
+        if valor:
+            saida.append(byte | 0x80)
+        else:
+            saida.append(byte)
+            return bytes(saida)
+
+
+def _zigzag(valor):
+    return (valor << 1) ^ (valor >> 63)
+
+
+def _chave(campo, tipo):
+    return _varint((campo << 3) | tipo)
+
+
+def _campo_varint(campo, valor):
+    return _chave(campo, 0) + _varint(valor)
+
+
+def _campo_bytes(campo, dados):
+    return _chave(campo, 2) + _varint(len(dados)) + dados
+
+
+def _empacotado(campo, valores):
+    return _campo_bytes(campo, b''.join(_varint(v) for v in valores))
+
+
+def limites_tile(z, x, y):
+    """(oeste, sul, leste, norte) em graus do tile z/x/y (Web Mercator)"""
+    n = 2 ** z
+
+    def latitude(linha):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * linha / n))))
+
+    return x / n * 360.0 - 180.0, latitude(y + 1), (x + 1) / n * 360.0 - 180.0, latitude(y)
+
+
+def para_tile(geometrias, z, x, y, extent=EXTENT):
+    """Projeta geometrias em graus para as coordenadas do tile z/x/y"""
+    escala = 2 ** z * extent
+
+    def projetar(coordenadas):
+        longitudes = coordenadas[:, 0]
+        latitudes = np.radians(np.clip(coordenadas[:, 1], -85.0511, 85.0511))
+        px = (longitudes + 180.0) / 360.0 * escala - x * extent
+        py = (1.0 - np.arcsinh(np.tan(latitudes)) / math.pi) / 2.0 * escala - y * extent
+        return np.column_stack([px, py])
+
+    return shapely.transform(geometrias, projetar)
+
+
+def _comandos_pontos(coordenadas):
+    comandos = [(MOVER & 0x7) | (len(coordenadas) << 3)]
+    cx = cy = 0
+    for px, py in coordenadas:
+        comandos += [_zigzag(px - cx), _zigzag(py - cy)]
+        cx, cy = px, py
+    return comandos
+
+
+def _anel(coordenadas, exterior, cursor):
+    """Comandos de um anel, orientado pela área (positiva no exterior, no sistema do tile)"""
+    pontos = np.rint(np.asarray(coordenadas)[:-1]).astype(np.int64)
+    # Remove vértices repetidos pelo arredondamento
+    if len(pontos) > 1:
+        manter = np.any(pontos != np.roll(pontos, 1, axis=0), axis=1)
+        pontos = pontos[manter]
+    if len(pontos) < 3:
+        return []
+    area = np.sum(pontos[:, 0] * np.roll(pontos[:, 1], -1) - np.roll(pontos[:, 0], -1) * pontos[:, 1])
+    if area == 0:
+        return []
+    if (area > 0) != exterior:
+        pontos = pontos[::-1]
+    cx, cy = cursor
+    comandos = [MOVER | (1 << 3), _zigzag(int(pontos[0, 0]) - cx), _zigzag(int(pontos[0, 1]) - cy)]
+    comandos.append(LINHA | ((len(pontos) - 1) << 3))
+    for (ax, ay), (bx, by) in zip(pontos[:-1], pontos[1:]):
+        comandos += [_zigzag(int(bx - ax)), _zigzag(int(by - ay))]
+    comandos.append(FECHAR | (1 << 3))
+    cursor[:] = [int(pontos[-1, 0]), int(pontos[-1, 1])]
+    return comandos
+
+
+def _comandos_poligono(geometria):
+    comandos = []
+    cursor = [0, 0]
+    # Só as partes poligonais: o recorte pode devolver coleções com linhas ou pontos
+    partes = shapely.get_parts(shapely.get_parts(geometria))
+    for poligono in partes[shapely.get_type_id(partes) == shapely.GeometryType.POLYGON]:
+        exterior = _anel(poligono.exterior.coords, True, cursor)
+        if not exterior:
+            continue
+        comandos += exterior
+        for interior in poligono.interiors:
+            comandos += _anel(interior.coords, False, cursor)
+    return comandos
+
+
+def codificar_camada(nome, tipo, geometrias, propriedades=None, ids=None, extent=EXTENT):
+    """Camada MVT (bytes) com uma feição por geometria não vazia.
+
+    propriedades: {nome: sequência de valores (texto ou None)} alinhada às geometrias.
+    """
+    propriedades = propriedades or {}
+    chaves = list(propriedades)
+    valores = {}
+    feicoes = []
+    for i, geometria in enumerate(geometrias):
+        if geometria is None or shapely.is_empty(geometria):
+            continue
+        if tipo == PONTO:
+            comandos = _comandos_pontos(np.rint(shapely.get_coordinates(geometria)).astype(np.int64).tolist())
+        else:
+            comandos = _comandos_poligono(geometria)
+        if not comandos:
+            continue
+        tags = []
+        for k, chave in enumerate(chaves):
+            valor = propriedades[chave][i]
+            if valor is None:
+                continue
+            tags += [k, valores.setdefault(str(valor), len(valores))]
+        feicao = b''
+        if ids is not None:
+            feicao += _campo_varint(1, int(ids[i]))
+        feicao += _empacotado(2, tags) + _campo_varint(3, tipo) + _empacotado(4, comandos)
+        feicoes.append(feicao)
+    if not feicoes:
+        return b''
+
+    camada = _campo_varint(15, 2) + _campo_bytes(1, nome.encode('utf-8'))
+    camada += b''.join(_campo_bytes(2, f) for f in feicoes)
+    camada += b''.join(_campo_bytes(3, c.encode('utf-8')) for c in chaves)
+    camada += b''.join(_campo_bytes(4, _campo_bytes(1, v.encode('utf-8'))) for v in valores)
+    camada += _campo_varint(5, extent)
+    return _campo_bytes(3, camada)
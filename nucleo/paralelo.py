@@ -0,0 +1,43 @@
+"""Execução de funções vetorizadas em blocos, num pool de processos.
+
+As etapas caras sobre polígonos (parse do WKT, simplificação e GeoJSON)
+operam sobre arrays e são independentes entre polígonos, então o array é
+dividido em blocos contíguos, cada bloco vai para um processo e os
+resultados são concatenados na ordem original. A função precisa ser
+importável pelo processo filho (definida no nível do módulo, ou um
+``functools.partial`` dela), e os valores trafegam serializados (WKT/WKB,
+nunca geometrias Shapely).
+
+Os processos são criados com ``spawn``: o pool também é usado pela thread de
+atualização do snapshot, dentro do servidor do Streamlit, e um ``fork`` de
+um processo com várias threads pode herdar travas presas (log, imports).
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from nucleo.config import PROCESSOS_POLIGONOS
+
+# Abaixo disto por bloco, o custo de serializar e subir processos supera o ganho
+TAMANHO_MINIMO_BLOCO = 5000
+
+
+def usar_processos(quantidade, processos=PROCESSOS_POLIGONOS, tamanho_minimo=TAMANHO_MINIMO_BLOCO):
+    """Se vale dividir ``quantidade`` valores entre processos"""
+    return processos > 1 and quantidade >= 2 * tamanho_minimo
+
+
+def mapear_em_blocos(funcao, valores, processos=PROCESSOS_POLIGONOS, tamanho_minimo=TAMANHO_MINIMO_BLOCO):
+    """Aplica ``funcao`` (array -> array do mesmo tamanho) por blocos em paralelo.
+
+    Sem processos suficientes ou com poucos valores, chama a função direto.
+    """
+    valores = np.asarray(valores, dtype=object)
+    if not usar_processos(len(valores), processos, tamanho_minimo):
+        return funcao(valores)
+    blocos = np.array_split(valores, min(processos, len(valores) // tamanho_minimo))
+    trabalhadores = min(len(blocos), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=trabalhadores, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return np.concatenate([np.asarray(parte, dtype=object) for parte in executor.map(funcao, blocos)])
@@ -0,0 +1,246 @@
+"""Armazém deduplicado dos polígonos ANA.
+
+Cada massa d'água é guardada uma única vez (WKT original + WKB) e as linhas
+do relatório referenciam o polígono por uma chave inteira
+(``ID_POLIGONO_ANA``, -1 quando não há polígono).
+
+O armazém também mantém, para algumas tolerâncias de simplificação, cada
+polígono já serializado como fragmento GeoJSON (Feature). O mapa só
+escolhe a tolerância do zoom e concatena os fragmentos do conjunto filtrado.
+"""
+import json
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from nucleo.paralelo import mapear_em_blocos, usar_processos
+
+COLUNA_CHAVE = 'ID_POLIGONO_ANA'
+SEM_POLIGONO = -1
+
+# Tolerâncias de simplificação (em graus), da mais detalhada à mais grosseira
+TOLERANCIAS = (0.0005, 0.002, 0.008)
+PROPRIEDADES_FEATURE = json.dumps({"tipo": "Polígono ANA"})
+
+
+def tolerancia_para_zoom(zoom):
+    """Escolhe a tolerância de simplificação adequada ao nível de zoom"""
+    if zoom >= 11:
+        return TOLERANCIAS[0]
+    if zoom >= 7:
+        return TOLERANCIAS[1]
+    return TOLERANCIAS[2]
+
+
+def simplificar(geometrias, tolerancia):
+    """Simplificação vetorizada de um array de geometrias.
+
+    O Douglas-Peucker simples é várias vezes mais rápido que a versão que
+    preserva a topologia; esta só é aplicada às geometrias que ele deixa
+    inválidas ou vazias (polígonos pequenos nas tolerâncias maiores).
+    """
+    simplificadas = shapely.simplify(geometrias, tolerancia, preserve_topology=False)
+    refazer = shapely.is_empty(simplificadas) | ~shapely.is_valid(simplificadas)
+    if refazer.any():
+        simplificadas[refazer] = shapely.simplify(geometrias[refazer], tolerancia, preserve_topology=True)
+    return simplificadas
+
+
+def gerar_fragmentos(geometrias, tolerancia):
+    """Simplifica as geometrias e serializa cada uma como Feature GeoJSON.
+
+    Posições sem geometria válida ficam como None.
+    """
+    fragmentos = np.full(len(geometrias), None, dtype=object)
+    presentes = ~shapely.is_missing(geometrias)
+    if presentes.any():
+        simplificadas = simplificar(geometrias[presentes], tolerancia)
+        geometrias_json = shapely.to_geojson(simplificadas)
+        fragmentos[presentes] = [
+            '{"type": "Feature", "geometry": ' + g + ', "properties": ' + PROPRIEDADES_FEATURE + '}'
+            for g in geometrias_json
+        ]
+    return fragmentos
+
+
+def wkt_completos(textos):
+    """Máscara dos WKT presentes e completos.
+
+    Polígonos truncados pelo Excel (32.767 caracteres) não terminam com )).
+    """
+    textos = pd.Series(textos, dtype=object)
+    return (textos.notna() & textos.astype(str).str.rstrip().str.endswith('))')).to_numpy()
+
+
+def _parsear_wkt(textos):
+    """Converte WKT em geometrias; polígonos truncados ou inválidos viram None"""
+    textos = pd.Series(textos, dtype=object)
+    completos = wkt_completos(textos)
+    geometrias = np.full(len(textos), None, dtype=object)
+    if completos.any():
+        geometrias[completos] = shapely.from_wkt(
+            textos[completos].to_numpy(), on_invalid='ignore'
+        )
+    return geometrias
+
+
+def _wkt_para_wkb(textos):
+    """Bloco de WKT -> WKB (None nos truncados/inválidos), executado num processo do pool"""
+    return shapely.to_wkb(_parsear_wkt(textos))
+
+
+def _fragmentos_de_wkb(wkb, tolerancia):
+    """Bloco de WKB -> fragmentos GeoJSON, executado num processo do pool"""
+    return gerar_fragmentos(shapely.from_wkb(wkb), tolerancia)
+
+
+class ArmazemPoligonos:
+    """Tabela de polígonos únicos indexada pela chave ID_POLIGONO_ANA"""
+
+    def __init__(self, wkt, wkb, fragmentos=None):
+        self.wkt = np.asarray(wkt, dtype=object)
+        self.wkb = np.asarray(wkb, dtype=object)
+        self.validos = pd.notna(self.wkb)
+        self._geometrias = None
+        self._arvore = None
+        # tolerância -> array de fragmentos GeoJSON (um por polígono)
+        self._fragmentos = dict(fragmentos or {})
+        # Polígonos trazidos de uma versão anterior sem novo parse (ver de_wkt)
+        self.reaproveitados = 0
+
+    def __len__(self):
+        return len(self.wkt)
+
+    @classmethod
+    def _ler_wkt(cls, unicos):
+        """Armazém dos WKT já deduplicados (parse vetorizado, em blocos se houver pool)"""
+        if usar_processos(len(unicos)):
+            # As geometrias voltam do WKB sob demanda
+            return cls(unicos, mapear_em_blocos(_wkt_para_wkb, unicos))
+        geometrias = _parsear_wkt(unicos)
+        armazem = cls(unicos, shapely.to_wkb(geometrias))
+        armazem._geometrias = geometrias
+        return armazem
+
+    @classmethod
+    def de_wkt(cls, poligonos, anterior=None):
+        """Deduplica uma sequência de WKT por linha.
+
+        Com ``anterior`` (armazém da versão anterior dos dados), os polígonos
+        cujo WKT já estava nele reaproveitam o WKB e os fragmentos GeoJSON;
+        só os novos são lidos e simplificados.
+
+        Retorna (armazem, chaves), com chaves int32 alinhadas às linhas.
+        """
+        chaves, unicos = pd.factorize(pd.Series(poligonos, dtype=object), use_na_sentinel=True)
+        unicos = np.asarray(unicos, dtype=object)
+        if anterior is None or len(anterior) == 0:
+            return cls._ler_wkt(unicos), chaves.astype(np.int32)
+
+        posicoes = pd.Index(anterior.wkt).get_indexer(unicos)
+        novos = posicoes < 0
+        reaproveitados = posicoes[~novos]
+        lidos = cls._ler_wkt(unicos[novos])
+
+        wkb = np.empty(len(unicos), dtype=object)
+        wkb[~novos] = anterior.wkb[reaproveitados]
+        wkb[novos] = lidos.wkb
+        fragmentos = {}
+        for tolerancia, anteriores in anterior._fragmentos.items():
+            fragmentos[tolerancia] = np.empty(len(unicos), dtype=object)
+            fragmentos[tolerancia][~novos] = anteriores[reaproveitados]
+            fragmentos[tolerancia][novos] = lidos.fragmentos(tolerancia)
+        armazem = cls(unicos, wkb, fragmentos)
+        armazem.reaproveitados = len(reaproveitados)
+        return armazem, chaves.astype(np.int32)
+
+    def resumo(self):
+        """Contagem dos polígonos únicos: válidos, truncados (WKT incompleto) e com WKT inválido"""
+        presentes = pd.notna(self.wkt)
+        truncados = presentes & ~wkt_completos(self.wkt)
+        return {
+            'validos': int(self.validos.sum()),
+            'truncados': int(truncados.sum()),
+            'invalidos': int((presentes & ~truncados & ~self.validos).sum()),
+        }
+
+    @property
+    def geometrias(self):
+        """Geometrias Shapely, decodificadas do WKB uma única vez"""
+        if self._geometrias is None:
+            self._geometrias = shapely.from_wkb(self.wkb)
+        return self._geometrias
+
+    @property
+    def arvore(self):
+        """STRtree dos polígonos (os inválidos ficam de fora), construída uma única vez"""
+        if self._arvore is None:
+            self._arvore = shapely.STRtree(self.geometrias)
+        return self._arvore
+
+    def geometria(self, chave):
+        """Geometria do polígono, ou None se a chave não tem polígono válido"""
+        chave = int(chave)
+        if not 0 <= chave < len(self) or not self.validos[chave]:
+            return None
+        return self.geometrias[chave]
+
+    def na_caixa(self, chaves, caixa):
+        """Chaves cujos polígonos intersectam a caixa (consulta na STRtree)"""
+        chaves = np.asarray(chaves, dtype=np.int64)
+        na_area = self.arvore.query(shapely.box(*caixa), predicate='intersects')
+        return chaves[np.isin(chaves, na_area)]
+
+    def geometrias_na_caixa(self, chaves, caixa):
+        """(chaves, geometrias) dos polígonos das chaves que intersectam a caixa"""
+        chaves = self.na_caixa(chaves, caixa)
+        return chaves, self.geometrias[chaves]
+
+    def fragmentos(self, tolerancia):
+        """Fragmentos GeoJSON de todos os polígonos, gerados uma vez por tolerância"""
+        if tolerancia not in self._fragmentos:
+            if usar_processos(len(self)):
+                fragmentos = mapear_em_blocos(partial(_fragmentos_de_wkb, tolerancia=tolerancia), self.wkb)
+            else:
+                fragmentos = gerar_fragmentos(self.geometrias, tolerancia)
+            self._fragmentos[tolerancia] = fragmentos
+        return self._fragmentos[tolerancia]
+
+    def feature_collection(self, chaves, tolerancia, caixa=None):
+        """FeatureCollection (texto JSON) com os polígonos das chaves informadas.
+
+        caixa: (oeste, sul, leste, norte) opcional; só entram os polígonos que a intersectam.
+        """
+        chaves = np.asarray(chaves, dtype=np.int64)
+        if caixa is not None:
+            chaves = self.na_caixa(chaves, caixa)
+        fragmentos = self.fragmentos(tolerancia)[chaves]
+        return '{"type": "FeatureCollection", "features": [' + ', '.join(f for f in fragmentos if f is not None) + ']}'
+
+    def chaves_unicas(self, chaves):
+        """Chaves distintas presentes nas linhas, separadas em (válidas, inválidas)"""
+        chaves = np.unique(np.asarray(chaves, dtype=np.int64))
+        chaves = chaves[chaves != SEM_POLIGONO]
+        mascara = self.validos[chaves]
+        return chaves[mascara], chaves[~mascara]
+
+    def wkt_por_linha(self, chaves):
+        """WKT original para cada linha (None quando não há polígono)"""
+        chaves = np.asarray(chaves)
+        resultado = np.full(len(chaves), None, dtype=object)
+        tem_poligono = chaves != SEM_POLIGONO
+        resultado[tem_poligono] = self.wkt[chaves[tem_poligono]]
+        return resultado
+
+
+def anexar_wkt(df, armazem):
+    """Substitui a coluna de chave pelo WKT original (POLIGONO_ANA), na mesma posição"""
+    if COLUNA_CHAVE not in df.columns:
+        return df
+    df = df.copy()
+    posicao = df.columns.get_loc(COLUNA_CHAVE)
+    chaves = df.pop(COLUNA_CHAVE).to_numpy()
+    df.insert(posicao, 'POLIGONO_ANA', armazem.wkt_por_linha(chaves))
+    return df
@@ -0,0 +1,487 @@
+"""Snapshot colunar (Arrow/Feather) do relatório SNISB x SIOUT.
+
+O CSV/XLSX passa a ser apenas fonte de importação: ele é convertido uma única
+vez em arquivos Arrow tipados, lidos depois via memory-map. A conversão só é
+refeita quando o arquivo de origem muda (mtime e, em seguida, hash SHA-256).
+
+Cada conversão grava uma versão em um subdiretório próprio; o ``meta.json``
+aponta para a versão atual e é gravado por último, de modo que a troca é
+atômica e quem ainda lê a versão anterior não é afetado. A conversão é
+incremental: as linhas são comparadas com a versão anterior pelo
+CODIGO_SNISB/GID e os polígonos já conhecidos (mesmo WKT) reaproveitam o
+WKB e os fragmentos GeoJSON, sem novo parse nem simplificação.
+
+Etapa de build (opcional, a carga também gera o snapshot se necessário):
+
+    python -m nucleo.snapshot [caminho_do_csv_ou_xlsx]
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from nucleo.config import DIRETORIO_BASE, DIRETORIO_SNAPSHOT
+from nucleo.poligonos import COLUNA_CHAVE, TOLERANCIAS, ArmazemPoligonos
+
+NOME_RELATORIO = "RELATORIO_FINAL_SNISB_SIOUT"
+
+# Incrementar quando o layout dos arquivos do snapshot mudar
+VERSAO_FORMATO = 5
+
+ARQUIVO_DADOS = "dados.arrow"
+ARQUIVO_POLIGONOS = "poligonos.arrow"
+ARQUIVO_LINHAS = "linhas.arrow"
+ARQUIVO_META = "meta.json"
+
+# Identificação de cada registro entre versões do relatório
+COLUNAS_IDENTIDADE = ['CODIGO_SNISB', 'GID']
+
+COLUNAS_CATEGORICAS = [
+    'SITUACAO_CADASTRO_SNISB',
+    'SITUACAO_MASSA_DAGUA',
+    'SITUACAO_COMPARACAO_SIOUT',
+    'USO_SNISB',
+    'USO_SIOUT',
+    'TIPO_DE_MATERIAL',
+]
+COLUNAS_COORDENADAS = ['LATITUDE', 'LONGITUDE']
+COLUNA_DATA = 'DATA_DO_CADASTRO'
+COLUNA_POLIGONO = 'POLIGONO_ANA'
+
+
+def localizar_origem(diretorio=DIRETORIO_BASE):
+    """Retorna o caminho do CSV (preferencial) ou do XLSX de origem, ou None"""
+    for extensao in ('.csv', '.xlsx'):
+        caminho = os.path.join(diretorio, NOME_RELATORIO + extensao)
+        if os.path.exists(caminho):
+            return caminho
+    return None
+
+
+def ler_origem(caminho):
+    """Lê o CSV/XLSX de origem sem nenhuma conversão de tipos"""
+    if caminho.lower().endswith('.csv'):
+        # CSV preferencial - sem limite de 32.767 caracteres
+        return pd.read_csv(caminho, dtype={COLUNA_POLIGONO: str}, encoding='utf-8-sig')
+    # Fallback para Excel (pode ter polígonos truncados)
+    return pd.read_excel(caminho, dtype={COLUNA_POLIGONO: str})
+
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """Calcula o SHA-256 do arquivo lendo em blocos"""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _arrow_seguro(df):
+    """Converte colunas object com tipos mistos para texto (o Arrow exige tipo único)"""
+    for col in df.columns:
+        if df[col].dtype == object:
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def tipar_dados(df, poligonos_anteriores=None):
+    """Aplica os tipos do snapshot e separa a coluna de polígonos.
+
+    Retorna (df_tipado, armazem): o WKT de cada linha é deduplicado em um
+    ArmazemPoligonos e substituído pela chave inteira ID_POLIGONO_ANA.
+    poligonos_anteriores: armazém da versão anterior, reaproveitado pelo WKT.
+    """
+    df = df.copy()
+
+    if COLUNA_POLIGONO in df.columns:
+        posicao = df.columns.get_loc(COLUNA_POLIGONO)
+        poligonos = df.pop(COLUNA_POLIGONO)
+    else:
+        posicao = len(df.columns)
+        poligonos = pd.Series([None] * len(df), dtype=object)
+    poligonos = poligonos.astype(object).where(poligonos.notna(), None).reset_index(drop=True)
+    armazem, chaves = ArmazemPoligonos.de_wkt(poligonos, poligonos_anteriores)
+    df.insert(posicao, COLUNA_CHAVE, chaves)
+
+    if COLUNA_DATA in df.columns:
+        df[COLUNA_DATA] = pd.to_datetime(df[COLUNA_DATA], errors='coerce')
+
+    for col in COLUNAS_COORDENADAS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    return _arrow_seguro(df.reset_index(drop=True)), armazem
+
+
+def _coluna_geojson(tolerancia):
+    return f'GEOJSON_{tolerancia:g}'
+
+
+def _gravar_atomico(caminho, escrever):
+    """Grava em arquivo temporário e substitui o destino de uma vez"""
+    temporario = caminho + '.tmp'
+    escrever(temporario)
+    os.replace(temporario, caminho)
+
+
+def _ler_meta(destino):
+    caminho = os.path.join(destino, ARQUIVO_META)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_meta(destino, meta):
+    def escrever(caminho):
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    _gravar_atomico(os.path.join(destino, ARQUIVO_META), escrever)
+
+
+def _numerica(serie):
+    return pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+
+
+def _texto_identificador(serie):
+    """Texto do identificador independente do tipo inferido na leitura (123 e 123.0 viram '123')"""
+    texto = serie.astype(str).fillna('').to_numpy(dtype=object)
+    if _numerica(serie):
+        valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+        inteiros = np.isfinite(valores) & (valores == np.round(valores))
+        texto[inteiros] = valores[inteiros].astype(np.int64).astype(str)
+    return texto
+
+
+def identificadores(df):
+    """Identificador de cada linha (CODIGO_SNISB|GID), ou None sem essas colunas"""
+    colunas = [coluna for coluna in COLUNAS_IDENTIDADE if coluna in df.columns]
+    if not colunas:
+        return None
+    identificador = _texto_identificador(df[colunas[0]])
+    for coluna in colunas[1:]:
+        identificador = identificador + '|' + _texto_identificador(df[coluna])
+    return identificador
+
+
+def hash_linhas(df):
+    """Hash (uint64) do conteúdo de cada linha da origem, para comparar versões.
+
+    Colunas numéricas entram como float64: uma célula vazia nova faz o pandas
+    ler a coluna inteira como float, o que não deve contar como alteração.
+    """
+    normalizado = pd.DataFrame({
+        coluna: df[coluna].astype(np.float64) if _numerica(df[coluna]) else df[coluna] for coluna in df.columns
+    })
+    return pd.util.hash_pandas_object(normalizado, index=False).to_numpy()
+
+
+def comparar_linhas(anteriores, hashes_anteriores, atuais, hashes_atuais):
+    """Registros novos, removidos e alterados entre duas versões, pelo identificador"""
+    anteriores = pd.Series(hashes_anteriores, index=anteriores)
+    atuais = pd.Series(hashes_atuais, index=atuais)
+    # Identificadores repetidos: vale a primeira ocorrência
+    anteriores = anteriores[~anteriores.index.duplicated()]
+    atuais = atuais[~atuais.index.duplicated()]
+    posicoes = anteriores.index.get_indexer(atuais.index)
+    existentes = posicoes >= 0
+    alteradas = anteriores.to_numpy()[posicoes[existentes]] != atuais.to_numpy()[existentes]
+    return {
+        'novas': int((~existentes).sum()),
+        'removidas': int(len(anteriores) - existentes.sum()),
+        'alteradas': int(alteradas.sum()),
+    }
+
+
+def _diretorio_versao(destino, versao=None):
+    """Subdiretório da versão (a atual, apontada pelo meta.json, se versao=None)"""
+    if versao is None:
+        meta = _ler_meta(destino) or {}
+        versao = meta.get('versao')
+        if versao is None:
+            raise FileNotFoundError(f"Snapshot não encontrado em {destino}")
+    return os.path.join(destino, versao)
+
+
+def versao_snapshot(destino=DIRETORIO_SNAPSHOT):
+    """Versão atual do snapshot pronta para leitura, ou None se não há nenhuma"""
+    meta = _ler_meta(destino)
+    if not meta or meta.get('versao_formato') != VERSAO_FORMATO or not meta.get('versao'):
+        return None
+    if not os.path.exists(os.path.join(destino, meta['versao'], ARQUIVO_DADOS)):
+        return None
+    return meta['versao']
+
+
+def _ler_linhas(destino, versao):
+    """(identificadores, hashes) das linhas da versão, ou None se não foram gravados"""
+    caminho = os.path.join(_diretorio_versao(destino, versao), ARQUIVO_LINHAS)
+    if not os.path.exists(caminho):
+        return None
+    tabela = feather.read_table(caminho, memory_map=True)
+    return tabela.column('IDENTIFICADOR').to_numpy(zero_copy_only=False), tabela.column('HASH').to_numpy()
+
+
+def _remover_versoes(destino, manter):
+    """Apaga as versões fora de ``manter`` (leitores antigos ainda mapeados não são afetados)"""
+    for nome in os.listdir(destino):
+        caminho = os.path.join(destino, nome)
+        if nome not in manter and os.path.isdir(caminho):
+            shutil.rmtree(caminho, ignore_errors=True)
+        elif nome in (ARQUIVO_DADOS, ARQUIVO_POLIGONOS):
+            # Arquivos do formato anterior, gravados direto no diretório
+            os.remove(caminho)
+
+
+def construir_snapshot(origem, destino=DIRETORIO_SNAPSHOT):
+    """Converte o CSV/XLSX de origem em uma nova versão do snapshot.
+
+    Havendo uma versão anterior, as linhas são comparadas pelo identificador
+    e os polígonos já conhecidos são reaproveitados; se nenhuma linha mudou
+    (nem de posição), só a assinatura da origem é atualizada.
+    """
+    os.makedirs(destino, exist_ok=True)
+    info = os.stat(origem)
+    sha256 = hash_arquivo(origem)
+    assinatura = {
+        'origem': os.path.abspath(origem),
+        'mtime_ns': info.st_mtime_ns,
+        'tamanho': info.st_size,
+        'sha256': sha256,
+    }
+
+    df_origem = ler_origem(origem)
+    ids = identificadores(df_origem)
+    hashes = hash_linhas(df_origem)
+
+    versao_anterior = versao_snapshot(destino)
+    linhas_anteriores = _ler_linhas(destino, versao_anterior) if versao_anterior else None
+    alteracoes = None
+    if linhas_anteriores is not None:
+        if ids is not None and np.array_equal(hashes, linhas_anteriores[1]) and \
+                np.array_equal(ids, linhas_anteriores[0]):
+            # Mesmo conteúdo (origem regravada): a versão atual continua valendo
+            meta = {**_ler_meta(destino), **assinatura, 'alteracoes': {'novas': 0, 'removidas': 0, 'alteradas': 0}}
+            _gravar_meta(destino, meta)
+            return meta
+        if ids is not None:
+            alteracoes = comparar_linhas(*linhas_anteriores, ids, hashes)
+
+    poligonos_anteriores = ler_poligonos(destino, versao_anterior) if versao_anterior else None
+    df, armazem = tipar_dados(df_origem, poligonos_anteriores)
+    del df_origem
+
+    # Nova versão gravada à parte e publicada pelo meta.json
+    versao = f"v{info.st_mtime_ns}_{sha256[:12]}"
+    diretorio = os.path.join(destino, versao)
+    temporario = diretorio + '.tmp'
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    # Sem compressão para permitir memory-map direto dos buffers
+    feather.write_feather(df, os.path.join(temporario, ARQUIVO_DADOS), compression='uncompressed')
+    # Um registro por polígono único; WKB nulo para polígonos truncados/inválidos.
+    # Os fragmentos GeoJSON simplificados também são gerados aqui, uma vez por versão.
+    colunas_poligonos = {
+        COLUNA_CHAVE: pa.array(np.arange(len(armazem), dtype=np.int32)),
+        'WKT': pa.array(armazem.wkt.tolist(), type=pa.large_string()),
+        'WKB': pa.array(armazem.wkb.tolist(), type=pa.large_binary()),
+    }
+    for tolerancia in TOLERANCIAS:
+        colunas_poligonos[_coluna_geojson(tolerancia)] = pa.array(
+            armazem.fragmentos(tolerancia).tolist(), type=pa.large_string()
+        )
+    feather.write_feather(
+        pa.table(colunas_poligonos), os.path.join(temporario, ARQUIVO_POLIGONOS), compression='uncompressed'
+    )
+    if ids is not None:
+        feather.write_feather(
+            pa.table({'IDENTIFICADOR': pa.array(ids, type=pa.string()), 'HASH': pa.array(hashes, type=pa.uint64())}),
+            os.path.join(temporario, ARQUIVO_LINHAS)
+        )
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.replace(temporario, diretorio)
+
+    meta = {
+        'versao_formato': VERSAO_FORMATO,
+        'versao': versao,
+        **assinatura,
+        'linhas': len(df),
+        # Registros novos, removidos e alterados em relação à versão anterior (None na primeira)
+        'alteracoes': alteracoes,
+        'poligonos_unicos': len(armazem),
+        'poligonos_reaproveitados': armazem.reaproveitados,
+        # Válidos, truncados pelo Excel e com WKT que não pôde ser lido
+        **{f'poligonos_{situacao}': quantidade for situacao, quantidade in armazem.resumo().items()},
+    }
+    _gravar_meta(destino, meta)
+    # A versão anterior fica até a próxima troca (sessões abertas ainda podem lê-la)
+    _remover_versoes(destino, {versao, versao_anterior})
+    return meta
+
+
+def snapshot_atualizado(origem, destino=DIRETORIO_SNAPSHOT):
+    """Indica se o snapshot em disco corresponde ao arquivo de origem.
+
+    Compara primeiro mtime/tamanho; se apenas o mtime mudou, confere o hash
+    e, sendo igual, só atualiza o mtime registrado (sem reconverter).
+    """
+    if versao_snapshot(destino) is None:
+        return False
+    meta = _ler_meta(destino)
+    if meta.get('origem') != os.path.abspath(origem):
+        return False
+
+    info = os.stat(origem)
+    if info.st_mtime_ns == meta.get('mtime_ns') and info.st_size == meta.get('tamanho'):
+        return True
+    if info.st_size != meta.get('tamanho') or hash_arquivo(origem) != meta.get('sha256'):
+        return False
+
+    meta['mtime_ns'] = info.st_mtime_ns
+    _gravar_meta(destino, meta)
+    return True
+
+
+def ler_tabela(destino=DIRETORIO_SNAPSHOT, versao=None):
+    """Tabela Arrow principal do snapshot, via memory-map (sem cópia)"""
+    return feather.read_table(os.path.join(_diretorio_versao(destino, versao), ARQUIVO_DADOS), memory_map=True)
+
+
+def ler_snapshot(destino=DIRETORIO_SNAPSHOT, versao=None):
+    """Lê a tabela principal do snapshot via memory-map"""
+    return ler_tabela(destino, versao).to_pandas()
+
+
+def ler_poligonos(destino=DIRETORIO_SNAPSHOT, versao=None):
+    """Lê a tabela de polígonos únicos do snapshot"""
+    tabela = feather.read_table(
+        os.path.join(_diretorio_versao(destino, versao), ARQUIVO_POLIGONOS), memory_map=True
+    )
+    fragmentos = {
+        tolerancia: tabela.column(_coluna_geojson(tolerancia)).to_numpy(zero_copy_only=False)
+        for tolerancia in TOLERANCIAS
+        if _coluna_geojson(tolerancia) in tabela.column_names
+    }
+    return ArmazemPoligonos(
+        tabela.column('WKT').to_numpy(zero_copy_only=False),
+        tabela.column('WKB').to_numpy(zero_copy_only=False),
+        fragmentos,
+    )
+
+
+def garantir_snapshot(origem=None, destino=DIRETORIO_SNAPSHOT):
+    """Reconstrói o snapshot se a origem mudou; retorna False se não há dados"""
+    origem = origem or localizar_origem()
+    if origem is None:
+        # Sem a origem, ainda é possível servir um snapshot já construído
+        return versao_snapshot(destino) is not None
+
+    if not snapshot_atualizado(origem, destino):
+        construir_snapshot(origem, destino)
+    return True
+
+
+def carregar_snapshot(origem=None, destino=DIRETORIO_SNAPSHOT):
+    """Carrega a tabela principal, reconstruindo o snapshot antes se a origem mudou.
+
+    Retorna None se não houver arquivo de origem nem snapshot disponível.
+    """
+    if not garantir_snapshot(origem, destino):
+        return None
+    return ler_snapshot(destino)
+
+
+def carregar_poligonos(origem=None, destino=DIRETORIO_SNAPSHOT):
+    """Carrega o armazém de polígonos únicos (None se não há dados)"""
+    if not garantir_snapshot(origem, destino):
+        return None
+    return ler_poligonos(destino)
+
+
+class AtualizadorSnapshot:
+    """Mantém o snapshot em dia com a origem sem bloquear as sessões abertas.
+
+    Quando a origem muda, a nova versão é construída numa thread em segundo
+    plano; enquanto isso ``versao()`` continua devolvendo a versão anterior,
+    e a troca acontece de uma vez, quando o meta.json passa a apontar para a
+    nova. Só a primeira carga (sem snapshot algum) espera a construção.
+    """
+
+    def __init__(self, destino=DIRETORIO_SNAPSHOT):
+        self.destino = destino
+        self.erro = None
+        # meta da última versão construída por este atualizador (com as alterações)
+        self.ultima_atualizacao = None
+        self._verificada = None
+        self._thread = None
+        self._trava = threading.Lock()
+
+    @property
+    def atualizando(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def versao(self):
+        """Versão atual do snapshot (None sem dados); dispara a atualização se a origem mudou"""
+        assinatura = versao_origem()
+        with self._trava:
+            if assinatura is not None and assinatura != self._verificada and not self.atualizando:
+                self._verificada = assinatura
+                self._thread = threading.Thread(
+                    target=self._atualizar, args=(assinatura[0],), name='atualizacao-snapshot', daemon=True
+                )
+                self._thread.start()
+            thread = self._thread
+
+        versao = versao_snapshot(self.destino)
+        if versao is None and thread is not None:
+            thread.join()
+            versao = versao_snapshot(self.destino)
+        return versao
+
+    def _atualizar(self, origem):
+        try:
+            if not snapshot_atualizado(origem, self.destino):
+                self.ultima_atualizacao = construir_snapshot(origem, self.destino)
+            self.erro = None
+        except Exception as e:
+            self.erro = e
+
+
+def versao_origem(origem=None):
+    """Assinatura (caminho, mtime, tamanho) usada como chave de cache da carga"""
+    origem = origem or localizar_origem()
+    if origem is None:
+        return None
+    info = os.stat(origem)
+    return (os.path.abspath(origem), info.st_mtime_ns, info.st_size)
+
+
+if __name__ == '__main__':
+    caminho_origem = sys.argv[1] if len(sys.argv) > 1 else localizar_origem()
+    if caminho_origem is None:
+        sys.exit(f"Arquivo de origem não encontrado ({NOME_RELATORIO}.csv ou .xlsx)")
+    resultado = construir_snapshot(caminho_origem)
+    print(f"Snapshot gerado em {DIRETORIO_SNAPSHOT}: {resultado['linhas']:,} registros")
+    if resultado['alteracoes'] is not None:
+        print("Em relação à versão anterior: {novas:,} registros novos, {alteradas:,} alterados, "
+              "{removidas:,} removidos".format(**resultado['alteracoes']))
+    print(f"Polígonos ANA: {resultado['poligonos_unicos']:,} únicos, {resultado['poligonos_validos']:,} válidos, "
+          f"{resultado['poligonos_truncados']:,} truncados, {resultado['poligonos_invalidos']:,} com WKT inválido")
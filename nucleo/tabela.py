@@ -0,0 +1,41 @@
+"""Paginação da tabela de registros filtrados.
+
+Só a página exibida é lida da fonte e estilizada; os botões de navegação
+mostram a primeira e a última página e as vizinhas da atual, com
+reticências entre elas.
+"""
+from nucleo.cores import estilizar_pagina
+
+REGISTROS_POR_PAGINA = 50
+
+
+def total_paginas(total, por_pagina=REGISTROS_POR_PAGINA):
+    """Número de páginas para `total` registros (ao menos uma)"""
+    return max((total - 1) // por_pagina + 1, 1)
+
+
+def limites_pagina(pagina, total, por_pagina=REGISTROS_POR_PAGINA):
+    """(inicio, fim) dos registros da página (numerada a partir de 1)"""
+    inicio = (pagina - 1) * por_pagina
+    return inicio, min(inicio + por_pagina, total)
+
+
+def pagina_estilizada(resultado, inicio, fim, css_por_coluna):
+    """(DataFrame da página, Styler com as cores das situações)"""
+    df_pagina = resultado.pagina(inicio, fim)
+    return df_pagina, estilizar_pagina(df_pagina, css_por_coluna)
+
+
+def paginas_visiveis(pagina_atual, total):
+    """Números das páginas exibidas nos botões, com '...' nos intervalos omitidos"""
+    paginas = [1]
+    inicio = max(2, pagina_atual - 2)
+    fim = min(total - 1, pagina_atual + 2)
+    if inicio > 2:
+        paginas.append('...')
+    paginas.extend(range(inicio, fim + 1))
+    if fim < total - 1:
+        paginas.append('...')
+    if total > 1:
+        paginas.append(total)
+    return paginas
@@ -0,0 +1,187 @@
+"""Tiles vetoriais (MVT) dos polígonos ANA e das barragens filtradas.
+
+Cada estado de filtros (na versão dos dados) vira um token; o mapa
+consome ``{URL_TILES}/{token}/{camada}/{z}/{x}/{y}.pbf`` com o
+Leaflet.VectorGrid, de modo que o HTML do mapa não cresce com o número de
+polígonos selecionados. Os tiles são gerados sob demanda por um servidor
+HTTP local (uma thread por processo) e gravados em disco; pedidos
+seguintes, inclusive após reiniciar o app, são lidos do cache. O disco
+guarda só as pastas dos estados mais recentes (TAMANHO_REGISTRO).
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import shapely
+
+from nucleo.config import DIRETORIO_TILES, HOST_TILES, PORTA_TILES, URL_TILES
+from nucleo.mvt import EXTENT, POLIGONO, PONTO, codificar_camada, limites_tile, para_tile
+from nucleo.poligonos import simplificar
+from nucleo.viewport import dentro_da_caixa
+
+logger = logging.getLogger(__name__)
+
+CAMADAS = ('poligonos', 'barragens')
+
+# Margem de cada tile (em unidades do tile) para as bordas não aparecerem cortadas
+MARGEM_TILE = 64
+
+# Tolerância de simplificação nas coordenadas do tile (1/8 de pixel em tiles de 256 px)
+TOLERANCIA_TILE = EXTENT / 256 / 8
+
+# Estados de filtros mantidos pelo servidor, em memória e com os tiles gerados em disco
+TAMANHO_REGISTRO = 32
+
+_CAMINHO = re.compile(r'^/([0-9a-f]+)/(' + '|'.join(CAMADAS) + r')/(\d+)/(\d+)/(\d+)\.pbf$')
+
+
+def token_tiles(versao, chave):
+    """Token do estado de filtros na versão dos dados (nome da pasta no cache)"""
+    return hashlib.sha1(repr((versao, chave)).encode('utf-8')).hexdigest()[:20]
+
+
+class ConteudoTiles:
+    """Polígonos e pontos de um estado de filtros, recortados por tile"""
+
+    def __init__(self, poligonos, chaves, latitudes, longitudes, propriedades):
+        self.poligonos = poligonos
+        self.chaves = np.asarray(chaves, dtype=np.int64)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        # {nome: array de textos (ou None)} alinhado aos pontos
+        self.propriedades = {nome: np.asarray(valores, dtype=object) for nome, valores in propriedades.items()}
+
+    @classmethod
+    def de_mapa(cls, poligonos, chaves, df_mapa, indices_cor, paleta, colunas):
+        """Conteúdo a partir dos pontos do mapa (latitude/longitude), suas cores e colunas do popup"""
+        propriedades = {'cor': np.asarray(paleta, dtype=object)[np.asarray(indices_cor)]}
+        for coluna in colunas:
+            if coluna in df_mapa.columns:
+                valores = df_mapa[coluna].astype(object)
+                propriedades[coluna] = np.where(valores.notna(), valores.astype(str), None)
+        return cls(poligonos, chaves, df_mapa['latitude'], df_mapa['longitude'], propriedades)
+
+    def gerar(self, camada, z, x, y):
+        """Bytes do tile MVT da camada (vazio se não há feições)"""
+        oeste, sul, leste, norte = limites_tile(z, x, y)
+        margem_x = (leste - oeste) * MARGEM_TILE / EXTENT
+        margem_y = (norte - sul) * MARGEM_TILE / EXTENT
+        caixa = (oeste - margem_x, sul - margem_y, leste + margem_x, norte + margem_y)
+
+        if camada == 'poligonos':
+            chaves, geometrias = self.poligonos.geometrias_na_caixa(self.chaves, caixa)
+            if len(chaves) == 0:
+                return b''
+            geometrias = simplificar(para_tile(geometrias, z, x, y), TOLERANCIA_TILE)
+            geometrias = shapely.clip_by_rect(geometrias, -MARGEM_TILE, -MARGEM_TILE,
+                                              EXTENT + MARGEM_TILE, EXTENT + MARGEM_TILE)
+            return codificar_camada('poligonos', POLIGONO, geometrias, ids=chaves)
+
+        dentro = dentro_da_caixa(self.latitudes, self.longitudes, caixa)
+        if not dentro.any():
+            return b''
+        pontos = para_tile(shapely.points(self.longitudes[dentro], self.latitudes[dentro]), z, x, y)
+        return codificar_camada(
+            'barragens', PONTO, pontos, {nome: valores[dentro] for nome, valores in self.propriedades.items()}
+        )
+
+
+class ServidorTiles:
+    """Servidor HTTP local dos tiles, com cache em disco por token"""
+
+    def __init__(self, diretorio=DIRETORIO_TILES, host=HOST_TILES, porta=PORTA_TILES, url=URL_TILES):
+        self.diretorio = diretorio
+        self.host = host
+        self.porta = porta
+        self.url = url.rstrip('/')
+        self._conteudos = OrderedDict()
+        self._trava = threading.Lock()
+        self._servidor = None
+
+    def registrar(self, token, criar):
+        """Associa o token ao conteúdo (criado por `criar()` só se ainda não registrado)"""
+        with self._trava:
+            if token in self._conteudos:
+                self._conteudos.move_to_end(token)
+                return
+        conteudo = criar()
+        with self._trava:
+            self._conteudos[token] = conteudo
+            while len(self._conteudos) > TAMANHO_REGISTRO:
+                self._conteudos.popitem(last=False)
+            registrados = set(self._conteudos)
+        self._podar_disco(registrados)
+
+    def _podar_disco(self, registrados):
+        """Apaga as pastas de tiles dos tokens fora do registro, além das TAMANHO_REGISTRO mais recentes"""
+        try:
+            pastas = [p for p in os.scandir(self.diretorio) if p.is_dir() and p.name not in registrados]
+        except FileNotFoundError:
+            return
+        pastas.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        for pasta in pastas[max(TAMANHO_REGISTRO - len(registrados), 0):]:
+            shutil.rmtree(pasta.path, ignore_errors=True)
+
+    def url_camada(self, token, camada):
+        """Modelo de URL da camada para o Leaflet ({z}/{x}/{y})"""
+        return f'{self.url}/{token}/{camada}/{{z}}/{{x}}/{{y}}.pbf'
+
+    def tile(self, token, camada, z, x, y):
+        """Bytes do tile (do disco ou gerado agora), ou None se o token é desconhecido"""
+        caminho = os.path.join(self.diretorio, token, camada, str(z), str(x), f'{y}.pbf')
+        if os.path.exists(caminho):
+            with open(caminho, 'rb') as arquivo:
+                return arquivo.read()
+        with self._trava:
+            conteudo = self._conteudos.get(token)
+        if conteudo is None:
+            return None
+        dados = conteudo.gerar(camada, z, x, y)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # Gravação atômica: pedidos simultâneos do mesmo tile não leem arquivos pela metade
+        temporario = f'{caminho}.{threading.get_ident()}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(dados)
+        os.replace(temporario, caminho)
+        return dados
+
+    def iniciar(self):
+        """Sobe o servidor HTTP em uma thread daemon"""
+        servidor_tiles = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                encontrado = _CAMINHO.match(self.path.split('?')[0])
+                dados = None
+                if encontrado:
+                    token, camada, z, x, y = encontrado.groups()
+                    try:
+                        dados = servidor_tiles.tile(token, camada, int(z), int(x), int(y))
+                    except Exception:
+                        logger.exception("Erro ao gerar o tile %s", self.path)
+                        self.send_error(500)
+                        return
+                if dados is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/vnd.mapbox-vector-tile')
+                self.send_header('Content-Length', str(len(dados)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.send_header('Cache-Control', 'public, max-age=86400')
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, formato, *args):
+                logger.debug(formato, *args)
+
+        self._servidor = ThreadingHTTPServer((self.host, self.porta), Manipulador)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name='servidor-tiles', daemon=True).start()
+        return self
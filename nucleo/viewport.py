@@ -0,0 +1,72 @@
+"""Área visível do mapa (modo viewport).
+
+O mapa devolve os limites e o zoom a cada movimento; o app consulta só os
+pontos e polígonos que intersectam essa área (com uma margem, para que
+pequenos deslocamentos não mostrem bordas vazias) e escolhe a tolerância
+de simplificação pelo zoom. Caixas são tuplas (oeste, sul, leste, norte).
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+COLUNA_LATITUDE = 'LATITUDE'
+COLUNA_LONGITUDE = 'LONGITUDE'
+
+# Tamanho de um tile em pixels na projeção Web Mercator
+TAMANHO_TILE = 256
+
+# Caixa aproximada do Brasil: coordenadas fora dela são descartadas do mapa
+CAIXA_BRASIL = (-74.0, -34.0, -28.0, 6.0)
+
+
+def caixa_de_limites(limites):
+    """Converte os `bounds` devolvidos pelo st_folium em caixa, ou None se ausentes"""
+    if not limites:
+        return None
+    try:
+        sudoeste, nordeste = limites['_southWest'], limites['_northEast']
+        caixa = (sudoeste['lng'], sudoeste['lat'], nordeste['lng'], nordeste['lat'])
+    except (KeyError, TypeError):
+        return None
+    if any(v is None for v in caixa):
+        return None
+    return tuple(float(v) for v in caixa)
+
+
+def caixa_estimada(centro, zoom, largura_px=1400, altura_px=650):
+    """Área aproximada visível em torno de `centro` (lat, lon) no zoom dado.
+
+    Usada antes de o mapa informar os limites reais (primeira renderização
+    ou filtros recém-alterados).
+    """
+    latitude, longitude = centro
+    graus_por_pixel = 360.0 / (TAMANHO_TILE * 2 ** zoom)
+    meia_largura = largura_px / 2 * graus_por_pixel
+    meia_altura = altura_px / 2 * graus_por_pixel * math.cos(math.radians(latitude))
+    return (longitude - meia_largura, latitude - meia_altura, longitude + meia_largura, latitude + meia_altura)
+
+
+def expandir_caixa(caixa, fracao):
+    """Amplia a caixa em `fracao` da largura/altura para cada lado"""
+    oeste, sul, leste, norte = caixa
+    dx = (leste - oeste) * fracao
+    dy = (norte - sul) * fracao
+    return (oeste - dx, max(sul - dy, -90.0), leste + dx, min(norte + dy, 90.0))
+
+
+def coordenadas_validas(df_mapa):
+    """Renomeia LATITUDE/LONGITUDE para minúsculas e mantém só coordenadas numéricas no Brasil"""
+    df_mapa = df_mapa.rename(columns={COLUNA_LATITUDE: 'latitude', COLUNA_LONGITUDE: 'longitude'})
+    latitudes = pd.to_numeric(df_mapa['latitude'], errors='coerce')
+    longitudes = pd.to_numeric(df_mapa['longitude'], errors='coerce')
+    df_mapa = df_mapa.assign(latitude=latitudes, longitude=longitudes)
+    return df_mapa[dentro_da_caixa(latitudes, longitudes, CAIXA_BRASIL)]
+
+
+def dentro_da_caixa(latitudes, longitudes, caixa):
+    """Máscara booleana das coordenadas contidas na caixa (nulos ficam de fora)"""
+    oeste, sul, leste, norte = caixa
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    return (latitudes >= sul) & (latitudes <= norte) & (longitudes >= oeste) & (longitudes <= leste)
@@ -0,0 +1,43 @@
+"""Fonte em banco (SQLite) com filtros espaciais sobre muitas linhas."""
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event
+
+from nucleo.banco import TABELA_DADOS, FonteBanco
+from nucleo.consultas import COLUNA_LINHA
+from nucleo.espacial import filtro_raio
+from nucleo.viewport import COLUNA_LATITUDE, COLUNA_LONGITUDE
+
+# Limite padrão de variáveis por consulta do SQLite (algumas builds usam um maior)
+LIMITE_VARIAVEIS = 32766
+LINHAS = 50000
+
+
+def _fonte(tmp_path):
+    motor = create_engine(f'sqlite:///{tmp_path / "dados.db"}')
+    event.listen(motor, 'connect', lambda conexao, _: conexao.setlimit(
+        sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, LIMITE_VARIAVEIS
+    ))
+    posicoes = np.arange(LINHAS, dtype=np.int64)
+    pd.DataFrame({
+        COLUNA_LINHA: posicoes,
+        'CODIGO_SNISB': posicoes.astype(str),
+        # Uma linha em cada quatro fica longe do ponto do filtro de raio
+        COLUNA_LATITUDE: np.where(posicoes % 4 == 0, -10.0, -30.0),
+        COLUNA_LONGITUDE: -53.0 + (posicoes % 100) * 1e-4,
+    }).to_sql(TABELA_DADOS, motor, index=False)
+    return FonteBanco(motor)
+
+
+def test_filtro_espacial_com_mais_linhas_que_o_limite_do_sqlite(tmp_path):
+    fonte = _fonte(tmp_path)
+    resultado = fonte.filtrar({}, None, (filtro_raio(-30.0, -53.0, 5),))
+
+    esperadas = np.flatnonzero(np.arange(LINHAS) % 4 != 0)
+    assert len(resultado) == len(esperadas) > LIMITE_VARIAVEIS
+    np.testing.assert_array_equal(resultado.posicoes(), esperadas)
+    assert resultado.pagina(0, 3)['CODIGO_SNISB'].tolist() == ['1', '2', '3']
+    assert len(resultado.pontos([COLUNA_LATITUDE, COLUNA_LONGITUDE])) == len(esperadas)
+    assert sum(len(lote) for lote in resultado.lotes(10000)) == len(esperadas)